@@ -1,22 +1,28 @@
 import asyncio
 import datetime
+import json
 import logging
 import os
 import time
+import multiprocessing
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
 import aiohttp
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from fastapi import FastAPI, Depends, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from open_webui.apps.filter.wordsSearch import wordsSearch
-from open_webui.apps.socket.utils import RedisDict
+from open_webui.apps.filter.wordsSearch import (
+    load_cached_words_search,
+    load_words_search,
+)
 from open_webui.apps.webui.routers.chats import (
     request_share_chat_by_id,
     request_get_chat_by_id,
 )
 from open_webui.config import (
     AppConfig,
+    CACHE_DIR,
     ENABLE_MESSAGE_FILTER,
     CHAT_FILTER_WORDS_FILE,
     CHAT_FILTER_WORDS,
@@ -39,6 +45,7 @@ from open_webui.env import (
 from open_webui.utils.utils import (
     get_admin_user,
 )
+from open_webui.socket.utils import RedisCounter
 from pydantic import BaseModel
 
 log = logging.getLogger(__name__)
@@ -68,22 +75,132 @@ app.state.config.SEND_FILTER_MESSAGE_TYPE = SEND_FILTER_MESSAGE_TYPE
 app.state.config.WECHAT_NOTICE_SUFFIX = WECHAT_NOTICE_SUFFIX
 
 file_path = os.path.join(DATA_DIR, app.state.config.CHAT_FILTER_WORDS_FILE)
+search_cache_dir = os.path.join(CACHE_DIR, "filter")
 user_usage = defaultdict(lambda: defaultdict(int))
 redis_client = None
 if WEBSOCKET_REDIS_URL and WEBSOCKET_MANAGER == "redis":
-    user_usage = RedisDict("open-webui:user_usage", redis_url=WEBSOCKET_REDIS_URL)
-usage_lock = asyncio.Lock()
+    # Shared by all workers, increments are buffered and flushed every few seconds
+    user_usage = RedisCounter(
+        "open-webui:user_usage_counts", redis_url=WEBSOCKET_REDIS_URL
+    )
+USAGE_FLUSH_INTERVAL = 5
+usage_flush_task = None
+
 search = None
+# Incremented every time a new `search` is swapped in
+search_version = 0
+# Incremented for every requested rebuild, so a slow rebuild can't replace a newer one
+search_generation = 0
+search_rebuild_task = None
+search_executor = None
+
+
+def get_search_executor():
+    global search_executor
+    if search_executor is None:
+        # A separate process keeps building large dictionaries off the event loop and the GIL
+        search_executor = ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        )
+    return search_executor
+
+
+async def rebuild_search(keywords: list[str]):
+    """
+    Loads (or, in a worker process, builds) the search for `keywords` and swaps it in
+    once it is ready; requests keep using the current one in the meantime.
+    """
+    global search, search_version, search_generation
+
+    search_generation += 1
+    generation = search_generation
+
+    start_time = time.time()
+    new_search = await asyncio.to_thread(
+        load_cached_words_search, keywords, search_cache_dir
+    )
+    if new_search is None:
+        new_search = await asyncio.get_running_loop().run_in_executor(
+            get_search_executor(), load_words_search, keywords, search_cache_dir
+        )
+
+    if generation != search_generation:
+        log.info("Discarding filter words rebuild superseded by a newer one.")
+        return
+
+    search = new_search
+    search_version += 1
+    log.info(
+        f"Filter words version {search_version} ({len(keywords)} words) ready in {time.time() - start_time:.2f}s."
+    )
+
+
+def schedule_rebuild_search(keywords: list[str]):
+    global search_rebuild_task
+
+    async def run():
+        try:
+            await rebuild_search(keywords)
+        except Exception as e:
+            log.exception(f"Failed to rebuild the filter words: {e}")
+
+    search_rebuild_task = asyncio.create_task(run())
+
+
+def get_search_status():
+    return {
+        "FILTER_WORDS_VERSION": search_version,
+        "FILTER_WORDS_REBUILDING": search_rebuild_task is not None
+        and not search_rebuild_task.done(),
+    }
+
+
+async def flush_usage_periodically():
+    while True:
+        await asyncio.sleep(USAGE_FLUSH_INTERVAL)
+        try:
+            await asyncio.to_thread(user_usage.flush)
+        except Exception as e:
+            log.error(f"Failed to flush the usage counters: {e}")
+
+
+def migrate_legacy_usage():
+    # Counts kept by the `open-webui:user_usage` RedisDict (user -> JSON of model ->
+    # count) before the RedisCounter. Renamed first, so only one worker migrates them.
+    legacy_name = "open-webui:user_usage"
+    migrating_name = f"{legacy_name}:migrating"
+    try:
+        user_usage.redis.rename(legacy_name, migrating_name)
+    except Exception:
+        # No legacy counts, or another worker is migrating them
+        return
+
+    for user_name, counts in user_usage.redis.hgetall(migrating_name).items():
+        try:
+            for model_name, count in json.loads(counts).items():
+                user_usage.incr(user_name, model_name, int(count))
+        except Exception as e:
+            log.warning(f"Skipping the legacy usage of {user_name}: {e}")
+    user_usage.flush()
+    user_usage.redis.delete(migrating_name)
+    log.info("Migrated the legacy usage counters.")
 
 
 async def reset_usage():
     global user_usage
-    if isinstance(user_usage, RedisDict):
-        user_usage.clear()
+    if isinstance(user_usage, RedisCounter):
+        await asyncio.to_thread(user_usage.clear)
     else:
         user_usage = defaultdict(lambda: defaultdict(int))
 
 
+async def get_usage_items():
+    if isinstance(user_usage, RedisCounter):
+        # Flushes this worker's buffer and reads the counts of all workers
+        return await asyncio.to_thread(user_usage.items)
+    return list(user_usage.items())
+
+
 async def new_number_sign_up_notice(name, role, email):
     data = await notice_newnumber_signup_to_wechatapp(name, role, email)
     await send_message_to_wechatapp(data)
@@ -211,11 +328,18 @@ async def write_words_to_file():
 
 
 async def app_start():
-    global search
+    global search, usage_flush_task
 
     log.info("Initializing files...")
     await init_file()
 
+    if isinstance(user_usage, RedisCounter) and usage_flush_task is None:
+        try:
+            await asyncio.to_thread(migrate_legacy_usage)
+        except Exception as e:
+            log.error(f"Failed to migrate the legacy usage counters: {e}")
+        usage_flush_task = asyncio.create_task(flush_usage_periodically())
+
     if app.state.config.ENABLE_WECHAT_NOTICE:
         log.info("WeChat notice enabled.")
         scheduler.add_job(
@@ -234,11 +358,24 @@ async def app_start():
     search = None
     if app.state.config.ENABLE_MESSAGE_FILTER and app.state.config.CHAT_FILTER_WORDS:
         log.info("Message filter enabled with keywords.")
-        search = wordsSearch()
-        search.SetKeywords(app.state.config.CHAT_FILTER_WORDS.split(","))
+        await rebuild_search(app.state.config.CHAT_FILTER_WORDS.split(","))
         log.info("Keywords set for message filter.")
 
 
+async def app_stop():
+    global usage_flush_task
+
+    if usage_flush_task is not None:
+        usage_flush_task.cancel()
+        usage_flush_task = None
+
+        # Up to USAGE_FLUSH_INTERVAL of increments are still buffered
+        try:
+            await asyncio.to_thread(user_usage.flush)
+        except Exception as e:
+            log.error(f"Failed to flush the usage counters: {e}")
+
+
 class FILTERConfigForm(BaseModel):
     ENABLE_MESSAGE_FILTER: bool
     CHAT_FILTER_WORDS: str
@@ -265,6 +402,7 @@ async def get_filter_config(user=Depends(get_admin_user)):
         "ENABLE_DAILY_USAGES_NOTICE": app.state.config.ENABLE_DAILY_USAGES_NOTICE,
         "SEND_FILTER_MESSAGE_TYPE": app.state.config.SEND_FILTER_MESSAGE_TYPE,
         "WECHAT_NOTICE_SUFFIX": app.state.config.WECHAT_NOTICE_SUFFIX,
+        **get_search_status(),
     }
 
 
@@ -272,7 +410,6 @@ async def get_filter_config(user=Depends(get_admin_user)):
 async def update_filter_config(
     form_data: FILTERConfigForm, user=Depends(get_admin_user)
 ):
-    global search
     global file_path
 
     app.state.config.ENABLE_MESSAGE_FILTER = form_data.ENABLE_MESSAGE_FILTER
@@ -297,8 +434,7 @@ async def update_filter_config(
             app.state.config.CHAT_FILTER_WORDS = form_data.CHAT_FILTER_WORDS
             await write_words_to_file()
 
-    search = wordsSearch()
-    search.SetKeywords(app.state.config.CHAT_FILTER_WORDS.split(","))
+    schedule_rebuild_search(app.state.config.CHAT_FILTER_WORDS.split(","))
 
     if not app.state.config.ENABLE_DAILY_USAGES_NOTICE and scheduler.get_job(
         "daily_send_usage"
@@ -326,6 +462,7 @@ async def update_filter_config(
         "ENABLE_DAILY_USAGES_NOTICE": app.state.config.ENABLE_DAILY_USAGES_NOTICE,
         "SEND_FILTER_MESSAGE_TYPE": app.state.config.SEND_FILTER_MESSAGE_TYPE,
         "WECHAT_NOTICE_SUFFIX": app.state.config.WECHAT_NOTICE_SUFFIX,
+        **get_search_status(),
     }
 
 
@@ -336,13 +473,7 @@ async def init_markdown_usages():
     reply_text = f"### 📅 **{formatted_now}**\n\n### 🤖 **{WEBUI_NAME} 使用情况如下：**"
     usage_strings.append(reply_text)
 
-    if isinstance(user_usage, RedisDict):
-        all_users = user_usage.keys()
-        users_data = (
-            (user_name, user_usage.get(user_name, {})) for user_name in all_users
-        )
-    else:
-        users_data = user_usage.items()
+    users_data = await get_usage_items()
 
     for user_name, models in users_data:
         if not models:
@@ -364,13 +495,7 @@ async def init_usages():
     reply_text = f"📅 {formatted_now}\n\n🤖 {WEBUI_NAME}使用如下："
     usage_strings.append(reply_text)
 
-    if isinstance(user_usage, RedisDict):
-        all_users = user_usage.keys()
-        users_data = (
-            (user_name, user_usage.get(user_name, {})) for user_name in all_users
-        )
-    else:
-        users_data = user_usage.items()
+    users_data = await get_usage_items()
 
     for user_name, models in users_data:
         if not models:
@@ -390,14 +515,10 @@ async def process_user_usage(model, user):
     model_name = model.get("name", "")
     user_name = user.name
     try:
-        # 获取用户的使用数据，如果不存在则初始化
-        async with usage_lock:
-            if isinstance(user_usage, RedisDict):
-                user_data = user_usage.get(user_name, {})
-                user_data[model_name] = user_data.get(model_name, 0) + 1
-                user_usage[user_name] = user_data
-            else:
-                user_usage[user_name][model_name] += 1
+        if isinstance(user_usage, RedisCounter):
+            user_usage.incr(user_name, model_name)
+        else:
+            user_usage[user_name][model_name] += 1
     except Exception as e:
         log.error(f"处理用户使用数据时发生错误: {e}")
 
@@ -416,7 +537,9 @@ async def content_filter_message(payload: dict, content: str, user):
         if chat_id:
             log.info("chat_id: " + chat_id)
         start_time = time.time()
-        filter_condition = search.FindFirst(content)
+        # Keep using the same search even if a rebuild swaps in a new one meanwhile
+        current_search = search
+        filter_condition = current_search.FindFirst(content)
         if filter_condition:
             filter_word = filter_condition["Keyword"]
             log.info(
@@ -459,7 +582,7 @@ async def content_filter_message(payload: dict, content: str, user):
                 detail_message = f"GameTeam Chat: 您的消息包含敏感词语（`{filter_word}`）无法发送。请创建新话题并重试。"
                 raise HTTPException(status_code=503, detail=detail_message)
             else:
-                filter_text = search.Replace(
+                filter_text = current_search.Replace(
                     content, app.state.config.REPLACE_FILTER_WORDS
                 )
                 return filter_text
@@ -1,181 +1,264 @@
-from open_webui.apps.filter.hashNode import hashNode
-from open_webui.apps.filter.trieNode import trieNode
+import hashlib
+import json
+import logging
+import os
+from typing import Optional
+
+import numpy as np
+
+from open_webui.env import SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["FILTER"])
+
+# Polynomial hash of a window of code points, and the multiplier used to spread
+# (hash, length) over the filter table
+HASH_BASE = np.uint64(0x100000001B3)
+HASH_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+CACHE_VERSION = 1
 
 
 class wordsSearch:
+    """
+    Finds keywords in text, with the same results as an Aho-Corasick automaton.
+
+    Instead of walking a trie character by character, the text is scanned with NumPy:
+    for every keyword length the rolling hashes of all windows of that length are
+    computed at once and looked up in a flat table of the keyword hashes. Only the
+    (few) windows that hit the table are compared with the keywords themselves.
+    """
+
     def __init__(self):
-        self._first = {}
         self._keywords = []
         self._indexs = []
 
+        # keyword -> indexes of the keyword in `_keywords` (duplicates are allowed)
+        self._keyword_indexes = {}
+        # Keyword lengths, ascending
+        self._lengths = []
+        self._max_length = 0
+        self._table = np.zeros(1, dtype=np.bool_)
+        self._shift = np.uint64(63)
+
     def SetKeywords(self, keywords):
-        self._keywords = keywords
-        self._indexs = []
-        for i in range(len(keywords)):
-            self._indexs.append(i)
-
-        root = trieNode()
-        allNodeLayer = {}
-
-        for i in range(len(self._keywords)):
-            p = self._keywords[i]
-            nd = root
-            for j in range(len(p)):
-                nd = nd.Add(ord(p[j]))
-                if nd.Layer == 0:
-                    nd.Layer = j + 1
-                    if nd.Layer in allNodeLayer:
-                        allNodeLayer[nd.Layer].append(nd)
-                    else:
-                        allNodeLayer[nd.Layer] = []
-                        allNodeLayer[nd.Layer].append(nd)
-            nd.SetResults(i)
-
-        allNode = [root]
-        for key in allNodeLayer.keys():
-            for nd in allNodeLayer[key]:
-                allNode.append(nd)
-
-        for i in range(len(allNode)):
-            if i == 0:
+        self._keywords = list(keywords)
+        self._indexs = list(range(len(self._keywords)))
+
+        self._keyword_indexes = {}
+        for i, keyword in enumerate(self._keywords):
+            if keyword:
+                self._keyword_indexes.setdefault(keyword, []).append(i)
+
+        # ~1.5% of the windows of a text hit the table by chance
+        bits = max(16, (len(self._keyword_indexes) * 64).bit_length())
+        self._table = np.zeros(1 << bits, dtype=np.bool_)
+        self._shift = np.uint64(64 - bits)
+
+        keywords_by_length = {}
+        for keyword in self._keyword_indexes:
+            keywords_by_length.setdefault(len(keyword), []).append(keyword)
+
+        for length, words in keywords_by_length.items():
+            codes = _to_codes("".join(words)).reshape(len(words), length)
+            hashes = codes[:, 0].copy()
+            for k in range(1, length):
+                hashes = hashes * HASH_BASE + codes[:, k]
+            self._table[self._slots(hashes, length)] = True
+
+        self._lengths = sorted(keywords_by_length)
+        self._max_length = self._lengths[-1] if self._lengths else 0
+
+    def _slots(self, hashes, length):
+        return ((hashes + np.uint64(length)) * HASH_MIX) >> self._shift
+
+    def _scan(self, text):
+        """
+        Yields `(length, ends)` for every keyword length, where `ends` are the
+        (ascending) indexes of the last character of each keyword of that length.
+        """
+        if not self._lengths or not text:
+            return
+
+        codes = _to_codes(text)
+        lengths = set(self._lengths)
+
+        # hashes[i] is the hash of text[i : i + length]
+        hashes = codes
+        for length in range(1, min(self._max_length, len(codes)) + 1):
+            if length > 1:
+                hashes = hashes[:-1] * HASH_BASE + codes[length - 1 :]
+            if length not in lengths:
                 continue
-            nd = allNode[i]
-            nd.Index = i
-            r = nd.Parent.Failure
-            c = nd.Char
-            while r is not None and (c in r.m_values) == False:
-                r = r.Failure
-            if r is None:
-                nd.Failure = root
-            else:
-                nd.Failure = r.m_values[c]
-                for key2 in nd.Failure.Results:
-                    nd.SetResults(key2)
-        root.Failure = root
-
-        allNode2 = []
-        for i in range(len(allNode)):
-            allNode2.append(hashNode())
-
-        for i in range(len(allNode2)):
-            oldNode = allNode[i]
-            newNode = allNode2[i]
-
-            for key in oldNode.m_values:
-                index = oldNode.m_values[key].Index
-                newNode.Add(key, allNode2[index])
-
-            for index in range(len(oldNode.Results)):
-                item = oldNode.Results[index]
-                newNode.SetResults(item)
-
-            oldNode = oldNode.Failure
-            while oldNode != root:
-                for key in oldNode.m_values:
-                    if not newNode.HasKey(key):
-                        index = oldNode.m_values[key].Index
-                        newNode.Add(key, allNode2[index])
-                for index in range(len(oldNode.Results)):
-                    item = oldNode.Results[index]
-                    newNode.SetResults(item)
-                oldNode = oldNode.Failure
-
-        self._first = allNode2[0]
+
+            starts = np.flatnonzero(self._table[self._slots(hashes, length)])
+            ends = [
+                start + length - 1
+                for start in starts.tolist()
+                if text[start : start + length] in self._keyword_indexes
+            ]
+            if ends:
+                yield length, ends
+
+    def _matches(self, text):
+        # Ordered like the automaton reports them: by end, longest keyword first
+        matches = [(end, -length) for length, ends in self._scan(text) for end in ends]
+        matches.sort()
+        return [(end, -length) for end, length in matches]
+
+    def _match(self, item, index):
+        keyword = self._keywords[item]
+        return {
+            "Keyword": keyword,
+            "Success": True,
+            "End": index,
+            "Start": index + 1 - len(keyword),
+            "Index": self._indexs[item],
+        }
 
     def FindFirst(self, text):
-        ptr = None
-        for index in range(len(text)):
-            t = ord(text[index])
-            tn = None
-            if ptr is None:
-                tn = self._first.TryGetValue(t)
-            else:
-                tn = ptr.TryGetValue(t)
-                if tn is None:
-                    tn = self._first.TryGetValue(t)
-
-            if tn is not None:
-                if tn.End:
-                    item = tn.Results[0]
-                    keyword = self._keywords[item]
-                    return {
-                        "Keyword": keyword,
-                        "Success": True,
-                        "End": index,
-                        "Start": index + 1 - len(keyword),
-                        "Index": self._indexs[item],
-                    }
-            ptr = tn
-        return None
+        first = None
+        for length, ends in self._scan(text):
+            # Longer keywords are scanned later and win ties
+            if first is None or ends[0] <= first[0]:
+                first = (ends[0], length)
+
+        if first is None:
+            return None
+
+        end, length = first
+        keyword = text[end + 1 - length : end + 1]
+        return self._match(self._keyword_indexes[keyword][0], end)
 
     def FindAll(self, text):
-        ptr = None
         key_list = []
-
-        for index in range(len(text)):
-            t = ord(text[index])
-            tn = None
-            if ptr is None:
-                tn = self._first.TryGetValue(t)
-            else:
-                tn = ptr.TryGetValue(t)
-                if tn is None:
-                    tn = self._first.TryGetValue(t)
-
-            if tn is not None:
-                if tn.End:
-                    for j in range(len(tn.Results)):
-                        item = tn.Results[j]
-                        keyword = self._keywords[item]
-                        key_list.append(
-                            {
-                                "Keyword": keyword,
-                                "Success": True,
-                                "End": index,
-                                "Start": index + 1 - len(keyword),
-                                "Index": self._indexs[item],
-                            }
-                        )
-            ptr = tn
+        for end, length in self._matches(text):
+            keyword = text[end + 1 - length : end + 1]
+            for item in self._keyword_indexes[keyword]:
+                key_list.append(self._match(item, end))
         return key_list
 
     def ContainsAny(self, text):
-        ptr = None
-        for index in range(len(text)):
-            t = ord(text[index])
-            tn = None
-            if ptr is None:
-                tn = self._first.TryGetValue(t)
-            else:
-                tn = ptr.TryGetValue(t)
-                if tn is None:
-                    tn = self._first.TryGetValue(t)
-
-            if tn is not None:
-                if tn.End:
-                    return True
-            ptr = tn
+        for _ in self._scan(text):
+            return True
         return False
 
     def Replace(self, text, replaceChar="*"):
-        result = list(text)
+        # Length of the longest keyword ending at each index
+        longest = {}
+        for length, ends in self._scan(text):
+            for end in ends:
+                longest[end] = length
+
+        if not longest:
+            return text
 
-        ptr = None
-        for i in range(len(text)):
-            t = ord(text[i])
-            tn = None
-            if ptr is None:
-                tn = self._first.TryGetValue(t)
-            else:
-                tn = ptr.TryGetValue(t)
-                if tn is None:
-                    tn = self._first.TryGetValue(t)
-
-            if tn is not None:
-                if tn.End:
-                    maxLength = len(self._keywords[tn.Results[0]])
-                    start = i + 1 - maxLength
-                    for j in range(start, i + 1):
-                        result[j] = replaceChar
-            ptr = tn
+        result = list(text)
+        for end, length in longest.items():
+            for j in range(end + 1 - length, end + 1):
+                result[j] = replaceChar
         return "".join(result)
+
+    ####################
+    # Serialization
+    ####################
+
+    def save(self, path: str):
+        # Write to a temporary file first so readers never see a partial table
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                version=np.array(CACHE_VERSION),
+                keywords=np.array(self._keywords, dtype=np.str_),
+                table=np.packbits(self._table),
+                bits=np.array(len(self._table).bit_length() - 1),
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "wordsSearch":
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != CACHE_VERSION:
+                raise ValueError(f"Unsupported keyword table version: {path}")
+
+            bits = int(data["bits"])
+            table = np.unpackbits(data["table"], count=1 << bits).astype(np.bool_)
+            keywords = data["keywords"].tolist()
+
+        search = cls()
+        search._keywords = keywords
+        search._indexs = list(range(len(keywords)))
+        for i, keyword in enumerate(keywords):
+            if keyword:
+                search._keyword_indexes.setdefault(keyword, []).append(i)
+
+        search._lengths = sorted(
+            set(len(keyword) for keyword in search._keyword_indexes)
+        )
+        search._max_length = search._lengths[-1] if search._lengths else 0
+        search._table = table
+        search._shift = np.uint64(64 - bits)
+        return search
+
+
+def _to_codes(text: str) -> np.ndarray:
+    return np.frombuffer(
+        text.encode("utf-32-le", errors="surrogatepass"), dtype=np.uint32
+    ).astype(np.uint64)
+
+
+def get_keywords_hash(keywords: list[str]) -> str:
+    return hashlib.sha256(
+        json.dumps(keywords, ensure_ascii=False).encode("utf-8")
+    ).hexdigest()
+
+
+def get_cache_path(keywords: list[str], cache_dir: str) -> str:
+    return os.path.join(cache_dir, f"{get_keywords_hash(keywords)}.npz")
+
+
+def load_cached_words_search(
+    keywords: list[str], cache_dir: Optional[str] = None
+) -> Optional[wordsSearch]:
+    """Returns the cached search for `keywords`, or None if it has not been built yet."""
+    if not cache_dir:
+        return None
+
+    cache_path = get_cache_path(keywords, cache_dir)
+    if os.path.isfile(cache_path):
+        try:
+            return wordsSearch.load(cache_path)
+        except Exception as e:
+            log.warning(f"Failed to load keyword table {cache_path}: {e}")
+    return None
+
+
+def load_words_search(
+    keywords: list[str], cache_dir: Optional[str] = None
+) -> wordsSearch:
+    """
+    Returns the search for `keywords`, loading it from `cache_dir` if it was built
+    before and building (and caching) it otherwise.
+    """
+    search = load_cached_words_search(keywords, cache_dir)
+    if search is not None:
+        return search
+
+    search = wordsSearch()
+    search.SetKeywords(keywords)
+
+    if cache_dir:
+        cache_path = get_cache_path(keywords, cache_dir)
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            search.save(cache_path)
+
+            # Only the table of the current dictionary is worth keeping
+            for name in os.listdir(cache_dir):
+                if name.endswith(".npz") and name != os.path.basename(cache_path):
+                    os.remove(os.path.join(cache_dir, name))
+        except Exception as e:
+            log.warning(f"Failed to cache keyword table {cache_path}: {e}")
+
+    return search
@@ -700,6 +700,10 @@ AZURE_STORAGE_ENDPOINT = os.environ.get("AZURE_STORAGE_ENDPOINT", None)
 AZURE_STORAGE_CONTAINER_NAME = os.environ.get("AZURE_STORAGE_CONTAINER_NAME", None)
 AZURE_STORAGE_KEY = os.environ.get("AZURE_STORAGE_KEY", None)
 
+# Size in MB of the local copies of the files of the s3, gcs and azure providers,
+# the least recently used ones are deleted beyond it
+STORAGE_CACHE_MAX_SIZE = int(os.environ.get("STORAGE_CACHE_MAX_SIZE", "10240"))
+
 ####################################
 # File Upload DIR
 ####################################
@@ -2500,6 +2504,10 @@ AUDIO_TTS_AZURE_SPEECH_OUTPUT_FORMAT = PersistentConfig(
     ),
 )
 
+# Size in MB of the cache of synthesized speech, the least recently played clips
+# are deleted beyond it
+AUDIO_TTS_CACHE_MAX_SIZE = int(os.environ.get("AUDIO_TTS_CACHE_MAX_SIZE", "1024"))
+
 <<<<<<< HEAD
 AUDIO_SPEECH_PREVIEW_BASE_URL = PersistentConfig(
     "AUDIO_SPEECH_PREVIEW_BASE_URL",
@@ -2650,6 +2658,18 @@ OSS_BUCKET_NAME = PersistentConfig(
     os.environ.get("OSS_BUCKET_NAME", "your-bucket"),
 )
 
+# 上传图片的公开地址前缀（如 CDN 域名），为空时使用 Bucket 域名
+OSS_CDN_URL = os.environ.get("OSS_CDN_URL", "")
+
+# 后台上传线程数
+OSS_UPLOAD_MAX_WORKERS = int(os.environ.get("OSS_UPLOAD_MAX_WORKERS", "4"))
+
+# 超过该大小（MB）的文件使用分片上传
+OSS_MULTIPART_THRESHOLD = int(os.environ.get("OSS_MULTIPART_THRESHOLD", "10"))
+
+# 已上传文件的 URL 缓存条数
+OSS_URL_CACHE_SIZE = int(os.environ.get("OSS_URL_CACHE_SIZE", "1000"))
+
 ####################################
 # UI ChatType 配置
 ####################################
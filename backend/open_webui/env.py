@@ -330,6 +330,13 @@ else:
     except Exception:
         DATABASE_POOL_RECYCLE = 3600
 
+DATABASE_ENABLE_SQLITE_WAL = (
+    os.environ.get("DATABASE_ENABLE_SQLITE_WAL", "True").lower() == "true"
+)
+
+# Requires the async driver of the database (aiosqlite / asyncpg)
+DATABASE_ENABLE_ASYNC = os.environ.get("DATABASE_ENABLE_ASYNC", "False").lower() == "true"
+
 RESET_CONFIG_ON_START = (
     os.environ.get("RESET_CONFIG_ON_START", "False").lower() == "true"
 )
@@ -339,6 +346,36 @@ ENABLE_REALTIME_CHAT_SAVE = (
     os.environ.get("ENABLE_REALTIME_CHAT_SAVE", "False").lower() == "true"
 )
 
+REALTIME_CHAT_SAVE_INTERVAL = os.environ.get("REALTIME_CHAT_SAVE_INTERVAL", 0.5)
+
+if REALTIME_CHAT_SAVE_INTERVAL == "":
+    REALTIME_CHAT_SAVE_INTERVAL = 0.5
+else:
+    try:
+        REALTIME_CHAT_SAVE_INTERVAL = float(REALTIME_CHAT_SAVE_INTERVAL)
+    except Exception:
+        REALTIME_CHAT_SAVE_INTERVAL = 0.5
+
+REALTIME_CHAT_SAVE_MAX_CHUNKS = os.environ.get("REALTIME_CHAT_SAVE_MAX_CHUNKS", 64)
+
+if REALTIME_CHAT_SAVE_MAX_CHUNKS == "":
+    REALTIME_CHAT_SAVE_MAX_CHUNKS = 64
+else:
+    try:
+        REALTIME_CHAT_SAVE_MAX_CHUNKS = int(REALTIME_CHAT_SAVE_MAX_CHUNKS)
+    except Exception:
+        REALTIME_CHAT_SAVE_MAX_CHUNKS = 64
+
+CHAT_SAVE_THREAD_POOL_SIZE = os.environ.get("CHAT_SAVE_THREAD_POOL_SIZE", 8)
+
+if CHAT_SAVE_THREAD_POOL_SIZE == "":
+    CHAT_SAVE_THREAD_POOL_SIZE = 8
+else:
+    try:
+        CHAT_SAVE_THREAD_POOL_SIZE = int(CHAT_SAVE_THREAD_POOL_SIZE)
+    except Exception:
+        CHAT_SAVE_THREAD_POOL_SIZE = 8
+
 ####################################
 # REDIS
 ####################################
@@ -430,6 +467,212 @@ else:
     except Exception:
         AIOHTTP_CLIENT_TIMEOUT_OPENAI_MODEL_LIST = 5
 
+####################################
+# RAG embedding client
+####################################
+
+# Embedding requests (batches) in flight at the same time, per worker
+RAG_EMBEDDING_CONCURRENCY = os.environ.get("RAG_EMBEDDING_CONCURRENCY", "4")
+
+if RAG_EMBEDDING_CONCURRENCY == "":
+    RAG_EMBEDDING_CONCURRENCY = 4
+else:
+    try:
+        RAG_EMBEDDING_CONCURRENCY = max(int(RAG_EMBEDDING_CONCURRENCY), 1)
+    except Exception:
+        RAG_EMBEDDING_CONCURRENCY = 4
+
+# Retries of an embedding request that failed with 429, 5xx or a connection error
+RAG_EMBEDDING_MAX_RETRIES = os.environ.get("RAG_EMBEDDING_MAX_RETRIES", "3")
+
+if RAG_EMBEDDING_MAX_RETRIES == "":
+    RAG_EMBEDDING_MAX_RETRIES = 3
+else:
+    try:
+        RAG_EMBEDDING_MAX_RETRIES = max(int(RAG_EMBEDDING_MAX_RETRIES), 0)
+    except Exception:
+        RAG_EMBEDDING_MAX_RETRIES = 3
+
+RAG_EMBEDDING_TIMEOUT = os.environ.get("RAG_EMBEDDING_TIMEOUT", "")
+
+if RAG_EMBEDDING_TIMEOUT == "":
+    RAG_EMBEDDING_TIMEOUT = None
+else:
+    try:
+        RAG_EMBEDDING_TIMEOUT = int(RAG_EMBEDDING_TIMEOUT)
+    except Exception:
+        RAG_EMBEDDING_TIMEOUT = 300
+
+####################################
+# RAG embedding cache
+####################################
+
+# Embeddings of chunks and queries, by (engine, model, sha256(text))
+ENABLE_RAG_EMBEDDING_CACHE = (
+    os.environ.get("ENABLE_RAG_EMBEDDING_CACHE", "true").lower() == "true"
+)
+
+RAG_EMBEDDING_CACHE_DIR = os.environ.get(
+    "RAG_EMBEDDING_CACHE_DIR", f"{DATA_DIR}/cache/embeddings"
+)
+
+# Size of the cache in MB, least recently used embeddings are evicted beyond it
+RAG_EMBEDDING_CACHE_MAX_SIZE = os.environ.get("RAG_EMBEDDING_CACHE_MAX_SIZE", "1024")
+
+if RAG_EMBEDDING_CACHE_MAX_SIZE == "":
+    RAG_EMBEDDING_CACHE_MAX_SIZE = 1024
+else:
+    try:
+        RAG_EMBEDDING_CACHE_MAX_SIZE = int(RAG_EMBEDDING_CACHE_MAX_SIZE)
+    except Exception:
+        RAG_EMBEDDING_CACHE_MAX_SIZE = 1024
+
+####################################
+# RAG retrieval cache
+####################################
+
+# Query results kept in memory by each worker, 0 disables the cache
+RAG_RETRIEVAL_CACHE_SIZE = os.environ.get("RAG_RETRIEVAL_CACHE_SIZE", "1000")
+
+if RAG_RETRIEVAL_CACHE_SIZE == "":
+    RAG_RETRIEVAL_CACHE_SIZE = 1000
+else:
+    try:
+        RAG_RETRIEVAL_CACHE_SIZE = max(int(RAG_RETRIEVAL_CACHE_SIZE), 0)
+    except Exception:
+        RAG_RETRIEVAL_CACHE_SIZE = 1000
+
+# Seconds a result is served for, writes to its collections invalidate it earlier
+RAG_RETRIEVAL_CACHE_TTL = os.environ.get("RAG_RETRIEVAL_CACHE_TTL", "600")
+
+if RAG_RETRIEVAL_CACHE_TTL == "":
+    RAG_RETRIEVAL_CACHE_TTL = 600
+else:
+    try:
+        RAG_RETRIEVAL_CACHE_TTL = max(int(RAG_RETRIEVAL_CACHE_TTL), 0)
+    except Exception:
+        RAG_RETRIEVAL_CACHE_TTL = 600
+
+####################################
+# RAG reranking
+####################################
+
+# (query, document) pairs scored at a time by the local reranking models
+RAG_RERANKING_BATCH_SIZE = os.environ.get("RAG_RERANKING_BATCH_SIZE", "32")
+
+if RAG_RERANKING_BATCH_SIZE == "":
+    RAG_RERANKING_BATCH_SIZE = 32
+else:
+    try:
+        RAG_RERANKING_BATCH_SIZE = max(int(RAG_RERANKING_BATCH_SIZE), 1)
+    except Exception:
+        RAG_RERANKING_BATCH_SIZE = 32
+
+####################################
+# RAG ingestion
+####################################
+
+# Chunks embedded and inserted into the vector database at a time
+RAG_INGESTION_BATCH_SIZE = os.environ.get("RAG_INGESTION_BATCH_SIZE", "256")
+
+if RAG_INGESTION_BATCH_SIZE == "":
+    RAG_INGESTION_BATCH_SIZE = 256
+else:
+    try:
+        RAG_INGESTION_BATCH_SIZE = max(int(RAG_INGESTION_BATCH_SIZE), 1)
+    except Exception:
+        RAG_INGESTION_BATCH_SIZE = 256
+
+# "local" (in-process queue) or "redis" (shared by all the workers and instances).
+# Jobs of the local queue can only be polled from the worker that queued them, so
+# polling with several workers (or instances) requires "redis".
+INGESTION_JOB_QUEUE = os.environ.get("INGESTION_JOB_QUEUE", "local")
+INGESTION_JOB_REDIS_URL = os.environ.get("INGESTION_JOB_REDIS_URL", REDIS_URL)
+
+# Server worker processes (uvicorn's --workers defaults to $WEB_CONCURRENCY)
+UVICORN_WORKERS = os.environ.get(
+    "UVICORN_WORKERS", os.environ.get("WEB_CONCURRENCY", "1")
+)
+
+if UVICORN_WORKERS == "":
+    UVICORN_WORKERS = 1
+else:
+    try:
+        UVICORN_WORKERS = max(int(UVICORN_WORKERS), 1)
+    except Exception:
+        UVICORN_WORKERS = 1
+
+# Ingestion jobs run at the same time, per worker
+INGESTION_JOB_CONCURRENCY = os.environ.get("INGESTION_JOB_CONCURRENCY", "2")
+
+if INGESTION_JOB_CONCURRENCY == "":
+    INGESTION_JOB_CONCURRENCY = 2
+else:
+    try:
+        INGESTION_JOB_CONCURRENCY = max(int(INGESTION_JOB_CONCURRENCY), 1)
+    except Exception:
+        INGESTION_JOB_CONCURRENCY = 2
+
+# Processes loading and splitting documents (0 runs them in the request thread)
+RAG_INGESTION_PROCESS_POOL_SIZE = os.environ.get(
+    "RAG_INGESTION_PROCESS_POOL_SIZE", "0"
+)
+
+if RAG_INGESTION_PROCESS_POOL_SIZE == "":
+    RAG_INGESTION_PROCESS_POOL_SIZE = 0
+else:
+    try:
+        RAG_INGESTION_PROCESS_POOL_SIZE = max(int(RAG_INGESTION_PROCESS_POOL_SIZE), 0)
+    except Exception:
+        RAG_INGESTION_PROCESS_POOL_SIZE = 0
+
+####################################
+# Tika client
+####################################
+
+TIKA_CLIENT_CONNECT_TIMEOUT = os.environ.get("TIKA_CLIENT_CONNECT_TIMEOUT", "10")
+
+if TIKA_CLIENT_CONNECT_TIMEOUT == "":
+    TIKA_CLIENT_CONNECT_TIMEOUT = None
+else:
+    try:
+        TIKA_CLIENT_CONNECT_TIMEOUT = int(TIKA_CLIENT_CONNECT_TIMEOUT)
+    except Exception:
+        TIKA_CLIENT_CONNECT_TIMEOUT = 10
+
+# Time Tika may take to extract a document (or a page range of it)
+TIKA_CLIENT_TIMEOUT = os.environ.get("TIKA_CLIENT_TIMEOUT", "600")
+
+if TIKA_CLIENT_TIMEOUT == "":
+    TIKA_CLIENT_TIMEOUT = None
+else:
+    try:
+        TIKA_CLIENT_TIMEOUT = int(TIKA_CLIENT_TIMEOUT)
+    except Exception:
+        TIKA_CLIENT_TIMEOUT = 600
+
+# Requests in flight to the Tika server at the same time, per worker
+TIKA_MAX_CONCURRENT_REQUESTS = os.environ.get("TIKA_MAX_CONCURRENT_REQUESTS", "4")
+
+if TIKA_MAX_CONCURRENT_REQUESTS == "":
+    TIKA_MAX_CONCURRENT_REQUESTS = 4
+else:
+    try:
+        TIKA_MAX_CONCURRENT_REQUESTS = max(int(TIKA_MAX_CONCURRENT_REQUESTS), 1)
+    except Exception:
+        TIKA_MAX_CONCURRENT_REQUESTS = 4
+
+# PDFs with more pages are sent to Tika this many pages at a time (0 sends them whole)
+TIKA_PDF_PAGES_PER_REQUEST = os.environ.get("TIKA_PDF_PAGES_PER_REQUEST", "0")
+
+if TIKA_PDF_PAGES_PER_REQUEST == "":
+    TIKA_PDF_PAGES_PER_REQUEST = 0
+else:
+    try:
+        TIKA_PDF_PAGES_PER_REQUEST = max(int(TIKA_PDF_PAGES_PER_REQUEST), 0)
+    except Exception:
+        TIKA_PDF_PAGES_PER_REQUEST = 0
+
 ####################################
 # OFFLINE_MODE
 ####################################
@@ -1,6 +1,8 @@
 import json
 import logging
-from contextlib import contextmanager
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
 from typing import Any, Optional
 
 <<<<<<< HEAD:backend/open_webui/apps/webui/internal/db.py
@@ -15,12 +17,15 @@ from open_webui.env import (
     DATABASE_POOL_RECYCLE,
     DATABASE_POOL_SIZE,
     DATABASE_POOL_TIMEOUT,
+    DATABASE_ENABLE_ASYNC,
+    DATABASE_ENABLE_SQLITE_WAL,
 )
 >>>>>>> upstream/main:backend/open_webui/internal/db.py
 from peewee_migrate import Router
-from sqlalchemy import Dialect, create_engine, MetaData, types
+from sqlalchemy import Dialect, create_engine, event, MetaData, types
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.pool import QueuePool
 from sqlalchemy.sql.type_api import _T
 from typing_extensions import Self
 
@@ -80,13 +85,119 @@ def handle_peewee_migration(DATABASE_URL):
 
 handle_peewee_migration(DATABASE_URL)
 
+####################
+# Connection pool
+####################
+
+
+class DatabasePoolStats:
+    """
+    Checkout counts and waits of an engine's connection pool. Its events fire on
+    every thread using the engine, so the counters are updated under a lock.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked_out = 0  # connections currently in use
+        self.checked_out_max = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.wait_time_total = 0.0  # time spent waiting for a free connection
+        self.wait_time_max = 0.0
+
+    def record_checkout(self):
+        with self.lock:
+            self.checkouts += 1
+            self.checked_out += 1
+            self.checked_out_max = max(self.checked_out_max, self.checked_out)
+
+    def record_checkin(self):
+        with self.lock:
+            self.checked_out -= 1
+
+    def record_wait(self, duration: float):
+        with self.lock:
+            self.waits += 1
+            self.wait_time_total += duration
+            self.wait_time_max = max(self.wait_time_max, duration)
+
+    def to_dict(self, pool) -> dict:
+        with self.lock:
+            return {
+                "checked_out": self.checked_out,
+                "checked_out_max": self.checked_out_max,
+                "checkouts": self.checkouts,
+                "wait_time_avg": (
+                    self.wait_time_total / self.waits if self.waits else 0.0
+                ),
+                "wait_time_max": self.wait_time_max,
+                "pool": pool.status(),
+            }
+
+
+DB_POOL_STATS = DatabasePoolStats()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long checkouts wait for a connection."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            duration = time.perf_counter() - start
+            DB_POOL_STATS.record_wait(duration)
+            if duration > 1:
+                log.warning(
+                    f"Waited {duration:.2f}s for a database connection ({self.status()})"
+                )
+
+
+def get_engine_options(url: str) -> dict:
+    options = {}
+    if "sqlite" in url:
+        options["connect_args"] = {"check_same_thread": False}
+    else:
+        options["pool_pre_ping"] = True
+
+    if ":memory:" not in url and url.rstrip("/") != "sqlite:":
+        options["pool_recycle"] = DATABASE_POOL_RECYCLE
+        options["pool_timeout"] = DATABASE_POOL_TIMEOUT
+        if DATABASE_POOL_SIZE > 0:
+            options["pool_size"] = DATABASE_POOL_SIZE
+            options["max_overflow"] = DATABASE_POOL_MAX_OVERFLOW
+
+    return options
+
+
+def register_engine_events(engine, stats: DatabasePoolStats):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        if engine.dialect.name == "sqlite" and DATABASE_ENABLE_SQLITE_WAL:
+            cursor = dbapi_connection.cursor()
+            # WAL lets readers run concurrently with the writer, NORMAL only syncs on checkpoints
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA busy_timeout={DATABASE_POOL_TIMEOUT * 1000}")
+            cursor.close()
+
+    @event.listens_for(engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        stats.record_checkout()
+
+    @event.listens_for(engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        stats.record_checkin()
+
+
 SQLALCHEMY_DATABASE_URL = DATABASE_URL
-if "sqlite" in SQLALCHEMY_DATABASE_URL:
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-    )
-else:
-    engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_pre_ping=True)
+engine_options = get_engine_options(SQLALCHEMY_DATABASE_URL)
+if "pool_timeout" in engine_options:
+    engine_options["poolclass"] = TimedQueuePool
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options)
+register_engine_events(engine, DB_POOL_STATS)
 
 SessionLocal = sessionmaker(
     autocommit=False, autoflush=False, bind=engine, expire_on_commit=False
@@ -105,3 +216,53 @@ def get_session():
 
 
 get_db = contextmanager(get_session)
+
+
+####################
+# Async engine
+####################
+
+
+def get_async_database_url(url: str) -> str:
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    elif url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    return url
+
+
+async_engine = None
+AsyncSessionLocal = None
+# Counted apart from the sync engine's, its connections are pooled separately
+ASYNC_DB_POOL_STATS = DatabasePoolStats()
+
+if DATABASE_ENABLE_ASYNC:
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine_options = get_engine_options(SQLALCHEMY_DATABASE_URL)
+    async_engine_options.pop("connect_args", None)
+
+    async_engine = create_async_engine(
+        get_async_database_url(SQLALCHEMY_DATABASE_URL), **async_engine_options
+    )
+    register_engine_events(async_engine.sync_engine, ASYNC_DB_POOL_STATS)
+
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine, autoflush=False, expire_on_commit=False
+    )
+
+
+@asynccontextmanager
+async def get_async_db():
+    if AsyncSessionLocal is None:
+        raise RuntimeError("The async database engine requires DATABASE_ENABLE_ASYNC")
+
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_db_pool_stats() -> dict:
+    stats = {"sync": DB_POOL_STATS.to_dict(engine.pool)}
+    if async_engine is not None:
+        stats["async"] = ASYNC_DB_POOL_STATS.to_dict(async_engine.sync_engine.pool)
+    return stats
@@ -28,7 +28,7 @@ from cachetools import TTLCache
 
 from open_webui.apps.audio.main import app as audio_app
 from open_webui.apps.filter.main import app as filter_app
-from open_webui.apps.filter.main import filter_message, app_start
+from open_webui.apps.filter.main import filter_message, app_start, app_stop
 from open_webui.apps.images.main import app as images_app
 from open_webui.apps.ollama.main import app as ollama_app
 from open_webui.apps.ollama.main import (
@@ -127,8 +127,9 @@ from open_webui.routers.retrieval import (
     get_ef,
     get_rf,
 )
+from open_webui.utils.jobs import start_job_workers
 
-from open_webui.internal.db import Session
+from open_webui.internal.db import Session, get_db_pool_stats
 >>>>>>> upstream/main
 
 from open_webui.models.functions import Functions
@@ -468,8 +469,14 @@ async def lifespan(app: FastAPI):
         get_license_data(app, app.state.config.LICENSE_KEY)
 
     asyncio.create_task(periodic_usage_pool_cleanup())
+    job_workers = start_job_workers(app)
     yield
 
+    for task in job_workers:
+        task.cancel()
+
+    await app_stop()
+
 
 <<<<<<< HEAD
 app = FastAPI(docs_url=None, redoc_url=None, lifespan=lifespan)
@@ -3282,6 +3289,12 @@ async def healthcheck_with_db():
     return {"status": True}
 
 
+@app.get("/api/db/pool")
+async def get_db_pool_stats_by_engine(user=Depends(get_admin_user)):
+    # Connections are pooled, and counted, per worker
+    return {"status": True, **get_db_pool_stats()}
+
+
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 app.mount("/cache", StaticFiles(directory=CACHE_DIR), name="cache")
 
@@ -0,0 +1,168 @@
+"""Add chat full-text search index
+
+Revision ID: 1dbefe69fbb1
+Revises: 6348fb036646
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+import logging
+
+from open_webui.migrations.util import get_existing_tables
+
+revision = "1dbefe69fbb1"
+down_revision = "6348fb036646"
+branch_labels = None
+depends_on = None
+
+log = logging.getLogger(__name__)
+
+
+# SQLite: an FTS5 table with one row per chat title and per message. FTS rowids are
+# allocated by `chat_fts_map` (an INTEGER PRIMARY KEY, so they survive VACUUM) and
+# triggers keep both tables in sync with `chat` and `chat_message`.
+SQLITE_UPGRADE = [
+    """
+    CREATE TABLE chat_fts_map (
+        rowid INTEGER PRIMARY KEY,
+        chat_id TEXT NOT NULL,
+        message_id TEXT NOT NULL,
+        UNIQUE (chat_id, message_id)
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE chat_fts USING fts5(title, content, tokenize='trigram')
+    """,
+    """
+    CREATE TRIGGER chat_fts_chat_insert AFTER INSERT ON chat BEGIN
+        INSERT INTO chat_fts_map (chat_id, message_id) VALUES (new.id, '');
+        INSERT INTO chat_fts (rowid, title) VALUES (last_insert_rowid(), new.title);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_fts_chat_update AFTER UPDATE OF title ON chat BEGIN
+        UPDATE chat_fts SET title = new.title WHERE rowid = (
+            SELECT rowid FROM chat_fts_map WHERE chat_id = old.id AND message_id = ''
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER chat_fts_chat_delete AFTER DELETE ON chat BEGIN
+        DELETE FROM chat_fts WHERE rowid = (
+            SELECT rowid FROM chat_fts_map WHERE chat_id = old.id AND message_id = ''
+        );
+        DELETE FROM chat_fts_map WHERE chat_id = old.id AND message_id = '';
+    END
+    """,
+    """
+    CREATE TRIGGER chat_fts_message_insert AFTER INSERT ON chat_message BEGIN
+        INSERT INTO chat_fts_map (chat_id, message_id) VALUES (new.chat_id, new.id);
+        INSERT INTO chat_fts (rowid, content) VALUES (last_insert_rowid(), new.content);
+    END
+    """,
+    """
+    CREATE TRIGGER chat_fts_message_update AFTER UPDATE OF content ON chat_message BEGIN
+        UPDATE chat_fts SET content = new.content WHERE rowid = (
+            SELECT rowid FROM chat_fts_map WHERE chat_id = old.chat_id AND message_id = old.id
+        );
+    END
+    """,
+    """
+    CREATE TRIGGER chat_fts_message_delete AFTER DELETE ON chat_message BEGIN
+        DELETE FROM chat_fts WHERE rowid = (
+            SELECT rowid FROM chat_fts_map WHERE chat_id = old.chat_id AND message_id = old.id
+        );
+        DELETE FROM chat_fts_map WHERE chat_id = old.chat_id AND message_id = old.id;
+    END
+    """,
+    # Backfill
+    """
+    INSERT INTO chat_fts_map (chat_id, message_id)
+    SELECT id, '' FROM chat
+    UNION ALL
+    SELECT chat_id, id FROM chat_message
+    """,
+    """
+    INSERT INTO chat_fts (rowid, title, content)
+    SELECT chat_fts_map.rowid, chat.title, NULL
+    FROM chat_fts_map JOIN chat ON chat.id = chat_fts_map.chat_id
+    WHERE chat_fts_map.message_id = ''
+    UNION ALL
+    SELECT chat_fts_map.rowid, NULL, chat_message.content
+    FROM chat_fts_map JOIN chat_message
+        ON chat_message.chat_id = chat_fts_map.chat_id
+        AND chat_message.id = chat_fts_map.message_id
+    """,
+]
+
+SQLITE_DOWNGRADE = [
+    "DROP TRIGGER IF EXISTS chat_fts_chat_insert",
+    "DROP TRIGGER IF EXISTS chat_fts_chat_update",
+    "DROP TRIGGER IF EXISTS chat_fts_chat_delete",
+    "DROP TRIGGER IF EXISTS chat_fts_message_insert",
+    "DROP TRIGGER IF EXISTS chat_fts_message_update",
+    "DROP TRIGGER IF EXISTS chat_fts_message_delete",
+    "DROP TABLE IF EXISTS chat_fts",
+    "DROP TABLE IF EXISTS chat_fts_map",
+]
+
+# PostgreSQL: GIN expression indexes, maintained by PostgreSQL itself
+POSTGRESQL_UPGRADE = [
+    """
+    CREATE INDEX IF NOT EXISTS chat_title_fts_idx ON chat
+    USING GIN (to_tsvector('simple', coalesce(title, '')))
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS chat_message_content_fts_idx ON chat_message
+    USING GIN (to_tsvector('simple', coalesce(content, '')))
+    """,
+]
+
+POSTGRESQL_DOWNGRADE = [
+    "DROP INDEX IF EXISTS chat_title_fts_idx",
+    "DROP INDEX IF EXISTS chat_message_content_fts_idx",
+]
+
+
+def upgrade():
+    connection = op.get_bind()
+    dialect_name = connection.dialect.name
+
+    if dialect_name == "sqlite":
+        if "chat_fts" in set(get_existing_tables()):
+            return
+
+        try:
+            # Requires SQLite 3.34+ built with FTS5
+            connection.execute(
+                sa.text(
+                    "CREATE VIRTUAL TABLE temp.chat_fts_check USING fts5(content, tokenize='trigram')"
+                )
+            )
+            connection.execute(sa.text("DROP TABLE temp.chat_fts_check"))
+        except Exception as e:
+            log.warning(
+                f"SQLite FTS5 trigram tokenizer unavailable, chat search will not be indexed: {e}"
+            )
+            return
+
+        for statement in SQLITE_UPGRADE:
+            connection.execute(sa.text(statement))
+    elif dialect_name == "postgresql":
+        for statement in POSTGRESQL_UPGRADE:
+            connection.execute(sa.text(statement))
+
+
+def downgrade():
+    connection = op.get_bind()
+    dialect_name = connection.dialect.name
+
+    if dialect_name == "sqlite":
+        for statement in SQLITE_DOWNGRADE:
+            connection.execute(sa.text(statement))
+    elif dialect_name == "postgresql":
+        for statement in POSTGRESQL_DOWNGRADE:
+            connection.execute(sa.text(statement))
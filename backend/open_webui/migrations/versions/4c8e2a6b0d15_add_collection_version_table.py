@@ -0,0 +1,35 @@
+"""Add collection version table
+
+Revision ID: 4c8e2a6b0d15
+Revises: 9f4b3c2d1a7e
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+from open_webui.migrations.util import get_existing_tables
+
+revision = "4c8e2a6b0d15"
+down_revision = "9f4b3c2d1a7e"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing_tables = set(get_existing_tables())
+
+    # Collections without a row are at version 0, nothing to backfill
+    if "collection_version" not in existing_tables:
+        op.create_table(
+            "collection_version",
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("version", sa.BigInteger(), nullable=True),
+            sa.Column("updated_at", sa.BigInteger(), nullable=True),
+            sa.PrimaryKeyConstraint("name"),
+        )
+
+
+def downgrade():
+    op.drop_table("collection_version")
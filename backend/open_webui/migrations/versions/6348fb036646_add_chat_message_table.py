@@ -0,0 +1,147 @@
+"""Add chat_message table
+
+Revision ID: 6348fb036646
+Revises: 3781e22d8b01
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import table, select, column
+
+import time
+
+from open_webui.migrations.util import get_existing_tables
+
+revision = "6348fb036646"
+down_revision = "3781e22d8b01"
+branch_labels = None
+depends_on = None
+
+
+chat_table = table(
+    "chat",
+    column("id", sa.String()),
+    column("chat", sa.JSON()),
+)
+
+chat_message_table = table(
+    "chat_message",
+    column("chat_id", sa.Text()),
+    column("id", sa.Text()),
+    column("parent_id", sa.Text()),
+    column("role", sa.Text()),
+    column("content", sa.Text()),
+    column("status_history", sa.JSON()),
+    column("data", sa.JSON()),
+    column("created_at", sa.BigInteger()),
+    column("updated_at", sa.BigInteger()),
+)
+
+
+def upgrade():
+    existing_tables = set(get_existing_tables())
+
+    if "chat_message" not in existing_tables:
+        op.create_table(
+            "chat_message",
+            sa.Column("chat_id", sa.Text(), nullable=False),
+            sa.Column("id", sa.Text(), nullable=False),
+            sa.Column("parent_id", sa.Text(), nullable=True),
+            sa.Column("role", sa.Text(), nullable=True),
+            sa.Column("content", sa.Text(), nullable=True),
+            sa.Column("status_history", sa.JSON(), nullable=True),
+            sa.Column("data", sa.JSON(), nullable=True),
+            sa.Column("created_at", sa.BigInteger(), nullable=True),
+            sa.Column("updated_at", sa.BigInteger(), nullable=True),
+            sa.PrimaryKeyConstraint("chat_id", "id"),
+        )
+
+    # Backfill: move `history.messages` out of every chat blob into its own rows
+    connection = op.get_bind()
+    now = int(time.time())
+
+    results = connection.execute(select(chat_table.c.id, chat_table.c.chat))
+    for row in results.fetchall():
+        chat = row.chat or {}
+        history = chat.get("history") or {}
+        messages = history.get("messages") or {}
+        if not isinstance(messages, dict) or not messages:
+            continue
+
+        rows = []
+        for message_id, message in messages.items():
+            data = {
+                k: v
+                for k, v in message.items()
+                if k not in ("content", "statusHistory")
+            }
+
+            content = message.get("content")
+            if content is not None and not isinstance(content, str):
+                data["content"] = content
+                content = None
+
+            rows.append(
+                {
+                    "chat_id": row.id,
+                    "id": message_id,
+                    "parent_id": message.get("parentId"),
+                    "role": message.get("role"),
+                    "content": content,
+                    "status_history": message.get("statusHistory"),
+                    "data": data,
+                    "created_at": message.get("timestamp", now),
+                    "updated_at": now,
+                }
+            )
+
+        connection.execute(
+            sa.delete(chat_message_table).where(chat_message_table.c.chat_id == row.id)
+        )
+        connection.execute(sa.insert(chat_message_table), rows)
+        connection.execute(
+            sa.update(chat_table)
+            .where(chat_table.c.id == row.id)
+            .values(chat={**chat, "history": {**history, "messages": {}}})
+        )
+
+
+def downgrade():
+    # Fold the rows back into the chat blobs before dropping the table
+    connection = op.get_bind()
+
+    message_map = {}
+    results = connection.execute(select(chat_message_table))
+    for row in results.fetchall():
+        message = {**(row.data or {})}
+        if row.content is not None:
+            message["content"] = row.content
+        if row.status_history is not None:
+            message["statusHistory"] = row.status_history
+        message_map.setdefault(row.chat_id, {})[row.id] = message
+
+    for chat_id, messages in message_map.items():
+        chat = connection.execute(
+            select(chat_table.c.chat).where(chat_table.c.id == chat_id)
+        ).scalar()
+        if chat is None:
+            continue
+
+        history = chat.get("history") or {}
+        connection.execute(
+            sa.update(chat_table)
+            .where(chat_table.c.id == chat_id)
+            .values(
+                chat={
+                    **chat,
+                    "history": {
+                        **history,
+                        "messages": {**(history.get("messages") or {}), **messages},
+                    },
+                }
+            )
+        )
+
+    op.drop_table("chat_message")
@@ -0,0 +1,24 @@
+"""Add build_id to the BM25 collection table
+
+Revision ID: 7b3e5d9a1c2f
+Revises: 4c8e2a6b0d15
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "7b3e5d9a1c2f"
+down_revision = "4c8e2a6b0d15"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing indexes were built in one transaction, they are complete
+    op.add_column("bm25_collection", sa.Column("build_id", sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column("bm25_collection", "build_id")
@@ -0,0 +1,75 @@
+"""Add BM25 index tables
+
+Revision ID: 9f4b3c2d1a7e
+Revises: 1dbefe69fbb1
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+from open_webui.migrations.util import get_existing_tables
+
+revision = "9f4b3c2d1a7e"
+down_revision = "1dbefe69fbb1"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing_tables = set(get_existing_tables())
+
+    # Collections are indexed the first time they are searched, nothing to backfill
+    if "bm25_collection" not in existing_tables:
+        op.create_table(
+            "bm25_collection",
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("doc_count", sa.BigInteger(), nullable=True),
+            sa.Column("total_length", sa.BigInteger(), nullable=True),
+            sa.Column("updated_at", sa.BigInteger(), nullable=True),
+            sa.PrimaryKeyConstraint("name"),
+        )
+
+    if "bm25_segment" not in existing_tables:
+        op.create_table(
+            "bm25_segment",
+            sa.Column("id", sa.String(), nullable=False),
+            sa.Column("collection_name", sa.String(), nullable=True),
+            sa.Column("doc_count", sa.Integer(), nullable=True),
+            sa.Column("data", sa.LargeBinary(), nullable=True),
+            sa.Column("created_at", sa.BigInteger(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index(
+            "ix_bm25_segment_collection_name", "bm25_segment", ["collection_name"]
+        )
+
+    if "bm25_document" not in existing_tables:
+        op.create_table(
+            "bm25_document",
+            sa.Column("collection_name", sa.String(), nullable=False),
+            sa.Column("id", sa.String(), nullable=False),
+            sa.Column("segment_id", sa.String(), nullable=True),
+            sa.Column("length", sa.Integer(), nullable=True),
+            sa.Column("content", sa.Text(), nullable=True),
+            sa.Column("meta", sa.JSON(), nullable=True),
+            sa.PrimaryKeyConstraint("collection_name", "id"),
+        )
+
+    if "bm25_deleted" not in existing_tables:
+        op.create_table(
+            "bm25_deleted",
+            sa.Column("collection_name", sa.String(), nullable=False),
+            sa.Column("segment_id", sa.String(), nullable=False),
+            sa.Column("doc_id", sa.String(), nullable=False),
+            sa.PrimaryKeyConstraint("collection_name", "segment_id", "doc_id"),
+        )
+
+
+def downgrade():
+    op.drop_table("bm25_deleted")
+    op.drop_table("bm25_document")
+    op.drop_index("ix_bm25_segment_collection_name", table_name="bm25_segment")
+    op.drop_table("bm25_segment")
+    op.drop_table("bm25_collection")
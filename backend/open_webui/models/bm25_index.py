@@ -0,0 +1,686 @@
+import io
+import json
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict, defaultdict
+from typing import Optional
+
+import numpy as np
+
+from open_webui.internal.db import Base, get_db
+from open_webui.env import SRC_LOG_LEVELS
+
+from sqlalchemy import BigInteger, Column, Integer, JSON, LargeBinary, String, Text
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+# Same parameters as the `rank_bm25.BM25Okapi` used by `BM25Retriever`
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Longer tokens (URLs, base64 blobs, ...) are indexed by their prefix
+MAX_TERM_LENGTH = 64
+
+# Segments are merged by tiers of similar sizes (live documents within a factor of
+# SEGMENT_MERGE_FACTOR), once a tier has that many segments, so that each document
+# is re-indexed a logarithmic number of times as the collection grows
+SEGMENT_MERGE_FACTOR = 4
+
+# Segments with more than this fraction of deleted documents are rewritten
+MAX_DELETED_RATIO = 0.25
+
+# Decoded segments kept in memory by each worker
+SEGMENT_CACHE_SIZE = 32
+
+INSERT_BATCH_SIZE = 1000
+
+# Seconds after which a build that wasn't finished (the worker stopped) can be
+# taken over by another worker
+BUILD_TIMEOUT = 10 * 60
+
+####################
+# BM25 Index DB Schema
+####################
+
+
+class BM25Collection(Base):
+    __tablename__ = "bm25_collection"
+
+    name = Column(String, primary_key=True)
+    # Live documents, excluding the deleted ones that are still in a segment
+    doc_count = Column(BigInteger)
+    total_length = Column(BigInteger)
+    updated_at = Column(BigInteger)
+    # Set while the collection is being indexed, see `start_build`
+    build_id = Column(String, nullable=True)
+
+
+class BM25Segment(Base):
+    __tablename__ = "bm25_segment"
+
+    # Segments are immutable, so they can be cached by id
+    id = Column(String, primary_key=True)
+    collection_name = Column(String, index=True)
+    doc_count = Column(Integer)
+    data = Column(LargeBinary)
+    created_at = Column(BigInteger)
+
+
+class BM25Document(Base):
+    __tablename__ = "bm25_document"
+
+    collection_name = Column(String, primary_key=True)
+    id = Column(String, primary_key=True)
+    segment_id = Column(String)
+    length = Column(Integer)
+    content = Column(Text)
+    meta = Column(JSON)
+
+
+class BM25Deleted(Base):
+    __tablename__ = "bm25_deleted"
+
+    # Documents deleted from a segment, until the segment is merged
+    collection_name = Column(String, primary_key=True)
+    segment_id = Column(String, primary_key=True)
+    doc_id = Column(String, primary_key=True)
+
+
+def tokenize(text: str) -> list[str]:
+    # Whitespace tokens, like the default preprocessing of `BM25Retriever`
+    return [token[:MAX_TERM_LENGTH] for token in (text or "").split()]
+
+
+def _get_item_fields(item) -> tuple[str, str, dict]:
+    if isinstance(item, dict):
+        return item["id"], item.get("text", ""), item.get("metadata")
+    return item.id, item.text, item.metadata
+
+
+def _batched(rows: list, size: int = INSERT_BATCH_SIZE):
+    for i in range(0, len(rows), size):
+        yield rows[i : i + size]
+
+
+def _get_tier(doc_count: int) -> int:
+    tier = 0
+    while doc_count >= SEGMENT_MERGE_FACTOR:
+        doc_count //= SEGMENT_MERGE_FACTOR
+        tier += 1
+    return tier
+
+
+def _encode_strings(strings: list[str]) -> np.ndarray:
+    return np.frombuffer(json.dumps(strings).encode("utf-8"), dtype=np.uint8)
+
+
+def _decode_strings(array: np.ndarray) -> list[str]:
+    return json.loads(array.tobytes().decode("utf-8"))
+
+
+class InvertedIndex:
+    """
+    A decoded index segment. For every term of a batch of documents, the (ascending)
+    positions of the documents that contain it and the term frequencies.
+    """
+
+    def __init__(self, doc_ids, lengths, terms, offsets, docs, tfs):
+        self.doc_ids = doc_ids
+        self.lengths = lengths
+        self.terms = {term: i for i, term in enumerate(terms)}
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.positions = None
+
+    @classmethod
+    def build(cls, doc_ids: list[str], texts: list[str]) -> "InvertedIndex":
+        postings = defaultdict(list)
+        lengths = np.zeros(len(doc_ids), dtype=np.int32)
+        for position, text in enumerate(texts):
+            terms = tokenize(text)
+            lengths[position] = len(terms)
+            for term, tf in Counter(terms).items():
+                postings[term].append((position, tf))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(postings[term]) for term in terms])
+        entries = np.array(
+            [entry for term in terms for entry in postings[term]], dtype=np.int32
+        ).reshape(-1, 2)
+        return cls(
+            doc_ids, lengths, terms, offsets, entries[:, 0].copy(), entries[:, 1].copy()
+        )
+
+    def serialize(self) -> bytes:
+        f = io.BytesIO()
+        np.savez(
+            f,
+            doc_ids=_encode_strings(self.doc_ids),
+            lengths=self.lengths,
+            terms=_encode_strings(list(self.terms)),
+            offsets=self.offsets,
+            docs=self.docs,
+            tfs=self.tfs,
+        )
+        return f.getvalue()
+
+    @classmethod
+    def deserialize(cls, data: bytes) -> "InvertedIndex":
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            return cls(
+                _decode_strings(arrays["doc_ids"]),
+                arrays["lengths"],
+                _decode_strings(arrays["terms"]),
+                arrays["offsets"],
+                arrays["docs"],
+                arrays["tfs"],
+            )
+
+    def get_doc_freq(self, term: str) -> int:
+        i = self.terms.get(term)
+        return 0 if i is None else int(self.offsets[i + 1] - self.offsets[i])
+
+    def score(self, weights: dict, avgdl: float, deleted: set) -> np.ndarray:
+        scores = np.zeros(len(self.doc_ids), dtype=np.float64)
+        norms = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths / avgdl)
+        for term, weight in weights.items():
+            i = self.terms.get(term)
+            if i is None:
+                continue
+            docs = self.docs[self.offsets[i] : self.offsets[i + 1]]
+            tfs = self.tfs[self.offsets[i] : self.offsets[i + 1]]
+            scores[docs] += weight * tfs * (BM25_K1 + 1) / (tfs + norms[docs])
+
+        if deleted:
+            if self.positions is None:
+                self.positions = {id: i for i, id in enumerate(self.doc_ids)}
+            scores[[self.positions[id] for id in deleted if id in self.positions]] = 0
+        return scores
+
+
+class BM25IndexTable:
+    """
+    Persistent BM25 index of vector DB collections, so hybrid search doesn't have to
+    fetch and tokenize a whole collection on every query.
+
+    Each collection is indexed as a few immutable segments (one per write), which every
+    worker decodes once and caches. Deletes are recorded separately until segments are
+    merged. A collection is indexed the first time it is searched (`start_build` and
+    `finish_build`) and then kept up to date by the writes to the vector DB (see
+    `SparseIndexedClient`).
+    """
+
+    def __init__(self):
+        self._segments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def has_collection(self, name: str) -> bool:
+        """Whether the collection is indexed, and its index can be searched."""
+        with get_db() as db:
+            collection = db.get(BM25Collection, name)
+            return collection is not None and collection.build_id is None
+
+    ####################
+    # Writes
+    ####################
+
+    def _add_segment(self, db, name: str, ids: list, texts: list, metadatas: list):
+        segment = InvertedIndex.build(ids, texts)
+        segment_id = str(uuid.uuid4())
+        db.add(
+            BM25Segment(
+                id=segment_id,
+                collection_name=name,
+                doc_count=len(ids),
+                data=segment.serialize(),
+                created_at=int(time.time()),
+            )
+        )
+        rows = [
+            {
+                "collection_name": name,
+                "id": id,
+                "segment_id": segment_id,
+                "length": int(length),
+                "content": text,
+                "meta": metadata,
+            }
+            for id, length, text, metadata in zip(
+                ids, segment.lengths, texts, metadatas
+            )
+        ]
+        for batch in _batched(rows):
+            db.execute(insert(BM25Document), batch)
+
+        self._update_stats(db, name, len(ids), int(segment.lengths.sum()))
+
+    def _delete_ids(self, db, name: str, ids: list[str]):
+        for batch in _batched(list(ids)):
+            documents = db.execute(
+                select(BM25Document.id, BM25Document.segment_id, BM25Document.length)
+                .where(BM25Document.collection_name == name)
+                .where(BM25Document.id.in_(batch))
+            ).all()
+            if not documents:
+                continue
+
+            db.execute(
+                insert(BM25Deleted),
+                [
+                    {"collection_name": name, "segment_id": segment_id, "doc_id": id}
+                    for id, segment_id, _ in documents
+                ],
+            )
+            db.execute(
+                delete(BM25Document)
+                .where(BM25Document.collection_name == name)
+                .where(BM25Document.id.in_([id for id, _, _ in documents]))
+            )
+            self._update_stats(
+                db, name, -len(documents), -sum(length for _, _, length in documents)
+            )
+
+    def _update_stats(self, db, name: str, doc_count: int, total_length: int):
+        db.execute(
+            update(BM25Collection)
+            .where(BM25Collection.name == name)
+            .values(
+                doc_count=BM25Collection.doc_count + doc_count,
+                total_length=BM25Collection.total_length + total_length,
+                updated_at=int(time.time()),
+            )
+        )
+
+    def _merge_segments(self, db, name: str, segment_ids: list[str]) -> bool:
+        """Replaces `segment_ids` with a single segment, without their deletes."""
+        documents = db.execute(
+            select(BM25Document.id, BM25Document.content)
+            .where(BM25Document.collection_name == name)
+            .where(BM25Document.segment_id.in_(segment_ids))
+        ).all()
+        segment = InvertedIndex.build(
+            [id for id, _ in documents], [content for _, content in documents]
+        )
+        segment_id = str(uuid.uuid4())
+
+        result = db.execute(delete(BM25Segment).where(BM25Segment.id.in_(segment_ids)))
+        if result.rowcount != len(segment_ids):
+            # Merged by another worker in the meantime
+            db.rollback()
+            return False
+
+        db.execute(
+            delete(BM25Deleted)
+            .where(BM25Deleted.collection_name == name)
+            .where(BM25Deleted.segment_id.in_(segment_ids))
+        )
+        if documents:
+            db.add(
+                BM25Segment(
+                    id=segment_id,
+                    collection_name=name,
+                    doc_count=len(documents),
+                    data=segment.serialize(),
+                    created_at=int(time.time()),
+                )
+            )
+        db.execute(
+            update(BM25Document)
+            .where(BM25Document.collection_name == name)
+            .where(BM25Document.segment_id.in_(segment_ids))
+            .values(segment_id=segment_id)
+        )
+        db.commit()
+        log.info(
+            f"Merged {len(segment_ids)} BM25 index segments of {name} ({len(documents)} documents)"
+        )
+        return True
+
+    def _get_segments_to_merge(self, db, name: str) -> list[str]:
+        segments = db.execute(
+            select(BM25Segment.id, BM25Segment.doc_count).where(
+                BM25Segment.collection_name == name
+            )
+        ).all()
+        deleted_counts = dict(
+            db.execute(
+                select(BM25Deleted.segment_id, func.count())
+                .where(BM25Deleted.collection_name == name)
+                .group_by(BM25Deleted.segment_id)
+            ).all()
+        )
+
+        tiers = defaultdict(list)
+        rewrites = []
+        for segment_id, doc_count in segments:
+            deleted_count = deleted_counts.get(segment_id, 0)
+            if deleted_count > (doc_count or 0) * MAX_DELETED_RATIO:
+                rewrites.append(segment_id)
+            else:
+                tiers[_get_tier((doc_count or 0) - deleted_count)].append(segment_id)
+
+        if rewrites:
+            return rewrites
+        for tier in sorted(tiers):
+            if len(tiers[tier]) >= SEGMENT_MERGE_FACTOR:
+                return tiers[tier]
+        return []
+
+    def _maybe_merge_segments(self, db, name: str):
+        # A merge can fill up the next tier
+        while segment_ids := self._get_segments_to_merge(db, name):
+            if not self._merge_segments(db, name, segment_ids):
+                break
+
+    def start_build(self, name: str) -> Optional[str]:
+        """
+        Claims the indexing of a collection, before its documents are read from the
+        vector DB. From then on writes to the collection are applied to its index, so
+        none is missed by the build. Returns the id of the build, or None if another
+        worker is already indexing the collection.
+        """
+        build_id = str(uuid.uuid4())
+        with get_db() as db:
+            for _ in range(2):
+                try:
+                    db.add(
+                        BM25Collection(
+                            name=name,
+                            doc_count=0,
+                            total_length=0,
+                            updated_at=int(time.time()),
+                            build_id=build_id,
+                        )
+                    )
+                    db.commit()
+                    return build_id
+                except IntegrityError:
+                    db.rollback()
+
+                # Take over the build of a worker that stopped during it
+                collection = db.get(BM25Collection, name)
+                if (
+                    collection is None
+                    or collection.build_id is None
+                    or collection.updated_at > time.time() - BUILD_TIMEOUT
+                ):
+                    return None
+
+                log.warning(f"Taking over the stale BM25 index build of {name}")
+                stale_build_id = collection.build_id
+                db.expunge(collection)
+                if (
+                    db.execute(
+                        delete(BM25Collection)
+                        .where(BM25Collection.name == name)
+                        .where(BM25Collection.build_id == stale_build_id)
+                    ).rowcount
+                    > 0
+                ):
+                    self._delete_collection(db, name)
+                db.commit()
+        return None
+
+    def finish_build(self, name: str, build_id: str, items: list) -> bool:
+        """
+        Indexes `items`, read from the vector DB after `start_build`. Documents written
+        during the build are already indexed, with newer content, so they are skipped.
+        Returns False if the build was cancelled by a delete in the meantime.
+        """
+        start_time = time.time()
+        with get_db() as db:
+            try:
+                if (
+                    db.execute(
+                        update(BM25Collection)
+                        .where(BM25Collection.name == name)
+                        .where(BM25Collection.build_id == build_id)
+                        .values(build_id=None)
+                    ).rowcount
+                    == 0
+                ):
+                    db.rollback()
+                    return False
+
+                indexed_ids = set(
+                    db.scalars(
+                        select(BM25Document.id).where(
+                            BM25Document.collection_name == name
+                        )
+                    ).all()
+                )
+                fields = [
+                    item_fields
+                    for item_fields in map(_get_item_fields, items)
+                    if item_fields[0] not in indexed_ids
+                ]
+                if fields:
+                    self._add_segment(
+                        db,
+                        name,
+                        [id for id, _, _ in fields],
+                        [text for _, text, _ in fields],
+                        [metadata for _, _, metadata in fields],
+                    )
+                db.commit()
+            except Exception:
+                db.rollback()
+                self.cancel_build(name, build_id)
+                raise
+
+        log.info(
+            f"Built the BM25 index of {name} ({len(items)} documents) in {time.time() - start_time:.2f}s"
+        )
+        return True
+
+    def cancel_build(self, name: str, build_id: str):
+        with get_db() as db:
+            if (
+                db.execute(
+                    delete(BM25Collection)
+                    .where(BM25Collection.name == name)
+                    .where(BM25Collection.build_id == build_id)
+                ).rowcount
+                > 0
+            ):
+                self._delete_collection(db, name)
+            db.commit()
+
+    def build_collection(self, name: str, items: list) -> bool:
+        """Indexes all `items` of a collection that isn't indexed yet."""
+        build_id = self.start_build(name)
+        return build_id is not None and self.finish_build(name, build_id, items)
+
+    def add_items(self, name: str, items: list, replace: bool = False) -> bool:
+        """Adds `items` to the index of `name`, if the collection is indexed."""
+        if not items:
+            return False
+
+        with get_db() as db:
+            if db.get(BM25Collection, name) is None:
+                return False
+
+            fields = [_get_item_fields(item) for item in items]
+            if replace:
+                self._delete_ids(db, name, [id for id, _, _ in fields])
+
+            self._add_segment(
+                db,
+                name,
+                [id for id, _, _ in fields],
+                [text for _, text, _ in fields],
+                [metadata for _, _, metadata in fields],
+            )
+            db.commit()
+
+            self._maybe_merge_segments(db, name)
+            return True
+
+    def delete_items(
+        self,
+        name: str,
+        ids: Optional[list[str]] = None,
+        filter: Optional[dict] = None,
+    ) -> bool:
+        """Deletes the documents with `ids`, or whose metadata matches `filter`."""
+        with get_db() as db:
+            collection = db.get(BM25Collection, name)
+            if collection is None:
+                return False
+
+            if collection.build_id is not None:
+                # The deleted documents may be in the snapshot being indexed, cancel
+                # the build rather than index them. The next search starts another.
+                self._delete_collection(db, name)
+                db.commit()
+                return False
+
+            if filter:
+                ids = [
+                    id
+                    for id, meta in db.execute(
+                        select(BM25Document.id, BM25Document.meta).where(
+                            BM25Document.collection_name == name
+                        )
+                    )
+                    if all((meta or {}).get(k) == v for k, v in filter.items())
+                ]
+
+            self._delete_ids(db, name, ids or [])
+            db.commit()
+
+            self._maybe_merge_segments(db, name)
+            return True
+
+    def _delete_collection(self, db, name: str):
+        db.execute(delete(BM25Deleted).where(BM25Deleted.collection_name == name))
+        db.execute(delete(BM25Document).where(BM25Document.collection_name == name))
+        db.execute(delete(BM25Segment).where(BM25Segment.collection_name == name))
+        db.execute(delete(BM25Collection).where(BM25Collection.name == name))
+
+    def delete_collection(self, name: str):
+        with get_db() as db:
+            self._delete_collection(db, name)
+            db.commit()
+
+    def reset(self):
+        with get_db() as db:
+            db.execute(delete(BM25Deleted))
+            db.execute(delete(BM25Document))
+            db.execute(delete(BM25Segment))
+            db.execute(delete(BM25Collection))
+            db.commit()
+
+    ####################
+    # Search
+    ####################
+
+    def _get_segments(self, db, name: str) -> dict:
+        segment_ids = db.scalars(
+            select(BM25Segment.id).where(BM25Segment.collection_name == name)
+        ).all()
+
+        segments = {}
+        with self._lock:
+            for segment_id in segment_ids:
+                if segment_id in self._segments:
+                    self._segments.move_to_end(segment_id)
+                    segments[segment_id] = self._segments[segment_id]
+
+        missing_ids = [id for id in segment_ids if id not in segments]
+        if missing_ids:
+            for segment_id, data in db.execute(
+                select(BM25Segment.id, BM25Segment.data).where(
+                    BM25Segment.id.in_(missing_ids)
+                )
+            ):
+                segments[segment_id] = InvertedIndex.deserialize(data)
+
+            with self._lock:
+                for segment_id in missing_ids:
+                    if segment_id in segments:
+                        self._segments[segment_id] = segments[segment_id]
+                while len(self._segments) > SEGMENT_CACHE_SIZE:
+                    self._segments.popitem(last=False)
+
+        return segments
+
+    def search(self, name: str, query: str, k: int) -> Optional[list[dict]]:
+        """
+        Returns the `k` best matching documents (`id`, `content`, `metadata`, `score`)
+        of the collection, or None if it isn't indexed.
+        """
+        with get_db() as db:
+            collection = db.get(BM25Collection, name)
+            if collection is None or collection.build_id is not None:
+                return None
+
+            query_terms = Counter(tokenize(query))
+            if not collection.doc_count or not query_terms:
+                return []
+
+            segments = self._get_segments(db, name)
+            deleted = defaultdict(set)
+            for segment_id, doc_id in db.execute(
+                select(BM25Deleted.segment_id, BM25Deleted.doc_id).where(
+                    BM25Deleted.collection_name == name
+                )
+            ):
+                deleted[segment_id].add(doc_id)
+
+            # Deleted documents still count for the document frequencies until the
+            # segments are merged. Non-negative idf, so terms in most of the documents
+            # still count a bit.
+            n = collection.doc_count
+            weights = {}
+            for term, count in query_terms.items():
+                doc_freq = sum(
+                    segment.get_doc_freq(term) for segment in segments.values()
+                )
+                if doc_freq:
+                    weights[term] = count * math.log(
+                        1 + max(n - doc_freq + 0.5, 0.5) / (doc_freq + 0.5)
+                    )
+            if not weights:
+                return []
+
+            avgdl = max(collection.total_length / n, 1)
+            candidates = []
+            for segment_id, segment in segments.items():
+                if not segment.doc_ids:
+                    continue
+                scores = segment.score(weights, avgdl, deleted.get(segment_id))
+                top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+                candidates.extend(
+                    (float(scores[i]), segment.doc_ids[i]) for i in top if scores[i] > 0
+                )
+            candidates = sorted(candidates, reverse=True)[:k]
+
+            documents = {
+                document.id: document
+                for document in db.query(BM25Document)
+                .filter(BM25Document.collection_name == name)
+                .filter(BM25Document.id.in_([doc_id for _, doc_id in candidates]))
+            }
+
+            return [
+                {
+                    "id": doc_id,
+                    "content": documents[doc_id].content,
+                    "metadata": documents[doc_id].meta,
+                    "score": score,
+                }
+                for score, doc_id in candidates
+                if doc_id in documents
+            ]
+
+
+BM25Index = BM25IndexTable()
@@ -1,4 +1,5 @@
 import json
+import re
 import time
 import uuid
 from typing import Optional
@@ -8,7 +9,7 @@ from open_webui.models.tags import TagModel, Tag, Tags
 
 
 from pydantic import BaseModel, ConfigDict
-from sqlalchemy import BigInteger, Boolean, Column, String, Text, JSON
+from sqlalchemy import BigInteger, Boolean, Column, Float, String, Text, JSON
 from sqlalchemy import or_, func, select, and_, text
 from sqlalchemy.sql import exists
 
@@ -55,6 +56,95 @@ class ChatModel(BaseModel):
     folder_id: Optional[str] = None
 
 
+class ChatMessage(Base):
+    __tablename__ = "chat_message"
+
+    # Message ids are only unique within a chat's history (shared chats reuse them)
+    chat_id = Column(Text, primary_key=True)
+    id = Column(Text, primary_key=True)
+
+    parent_id = Column(Text, nullable=True)
+    role = Column(Text, nullable=True)
+
+    content = Column(Text, nullable=True)
+    status_history = Column(JSON, nullable=True)
+    data = Column(JSON, nullable=True)
+
+    created_at = Column(BigInteger)
+    updated_at = Column(BigInteger)
+
+
+####################
+# Message (de)normalization
+####################
+
+
+def split_chat_message(message: dict) -> dict:
+    """
+    Splits a legacy `history.messages` entry into the `chat_message` columns.
+    """
+    data = {k: v for k, v in message.items() if k not in ("content", "statusHistory")}
+
+    content = message.get("content")
+    if content is not None and not isinstance(content, str):
+        # Non-text content (e.g. multimodal parts) is kept verbatim in `data`
+        data["content"] = content
+        content = None
+
+    return {
+        "parent_id": message.get("parentId"),
+        "role": message.get("role"),
+        "content": content,
+        "status_history": message.get("statusHistory"),
+        "data": data,
+    }
+
+
+def join_chat_message(message: ChatMessage) -> dict:
+    """
+    Rebuilds the legacy `history.messages` entry from a `chat_message` row.
+    """
+    result = {**(message.data or {})}
+    if message.content is not None:
+        result["content"] = message.content
+    if message.status_history is not None:
+        result["statusHistory"] = message.status_history
+    return result
+
+
+def strip_chat_messages(chat: dict) -> dict:
+    """
+    Returns the chat blob without `history.messages`, which lives in `chat_message`.
+    """
+    if not isinstance(chat.get("history"), dict):
+        return chat
+    return {**chat, "history": {**chat["history"], "messages": {}}}
+
+
+def get_chat_messages(chat: dict) -> dict:
+    """
+    Returns the `history.messages` map of a legacy chat blob.
+    """
+    return (chat.get("history") or {}).get("messages") or {}
+
+
+def merge_chat_messages(chat: dict, messages: dict) -> dict:
+    """
+    Reassembles the legacy chat shape by merging stored messages into the blob.
+    """
+    if not messages:
+        return chat
+
+    history = chat.get("history") or {}
+    return {
+        **chat,
+        "history": {
+            **history,
+            "messages": {**(history.get("messages") or {}), **messages},
+        },
+    }
+
+
 ####################
 # Forms
 ####################
@@ -101,6 +191,150 @@ class ChatTitleIdResponse(BaseModel):
 
 
 class ChatTable:
+    _chat_fts: Optional[bool] = None
+
+    def _get_messages_by_chat_ids(self, db, chat_ids: list[str]) -> dict[str, dict]:
+        message_map = {chat_id: {} for chat_id in chat_ids}
+
+        # Chunked to stay below the bound parameter limit of SQLite
+        for i in range(0, len(chat_ids), 500):
+            for message in db.query(ChatMessage).filter(
+                ChatMessage.chat_id.in_(chat_ids[i : i + 500])
+            ):
+                message_map[message.chat_id][message.id] = join_chat_message(message)
+
+        return message_map
+
+    def _to_chat_models(self, db, chats) -> list[ChatModel]:
+        chats = list(chats)
+        message_map = self._get_messages_by_chat_ids(db, [chat.id for chat in chats])
+
+        result = []
+        for chat in chats:
+            chat_model = ChatModel.model_validate(chat)
+            chat_model.chat = merge_chat_messages(chat_model.chat, message_map[chat.id])
+            result.append(chat_model)
+        return result
+
+    def _to_chat_model(self, db, chat) -> ChatModel:
+        return self._to_chat_models(db, [chat])[0]
+
+    def _sync_messages(self, db, chat_id: str, messages: dict):
+        """
+        Makes the `chat_message` rows of a chat match `messages`, only writing the rows that changed.
+        """
+        existing = {
+            message.id: message
+            for message in db.query(ChatMessage).filter_by(chat_id=chat_id)
+        }
+        now = int(time.time())
+
+        for message_id, message in messages.items():
+            chat_message = existing.pop(message_id, None)
+            if chat_message is None:
+                db.add(
+                    ChatMessage(
+                        chat_id=chat_id,
+                        id=message_id,
+                        created_at=now,
+                        updated_at=now,
+                        **split_chat_message(message),
+                    )
+                )
+            elif join_chat_message(chat_message) != message:
+                for key, value in split_chat_message(message).items():
+                    setattr(chat_message, key, value)
+                chat_message.updated_at = now
+
+        for chat_message in existing.values():
+            db.delete(chat_message)
+
+    def _delete_messages_by_chat_filter(self, db, *criteria):
+        db.query(ChatMessage).filter(
+            ChatMessage.chat_id.in_(select(Chat.id).where(*criteria))
+        ).delete(synchronize_session=False)
+
+    def _has_chat_fts(self, db) -> bool:
+        if self._chat_fts is None:
+            # The index is skipped by the migration if FTS5 (trigram) is unavailable
+            self._chat_fts = (
+                db.execute(
+                    text(
+                        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_fts'"
+                    )
+                ).first()
+                is not None
+            )
+        return self._chat_fts
+
+    def _get_chat_search_query(self, db, user_id: str, search_text: str):
+        """
+        Returns a `(chat_id, rank)` subquery of the chats of the user whose title or
+        messages match `search_text` (lower rank is better), or None if the full-text
+        index can't answer it.
+        """
+        dialect_name = db.bind.dialect.name
+        if dialect_name == "sqlite":
+            # Trigrams match substrings of at least three characters
+            if len(search_text) < 3 or not self._has_chat_fts(db):
+                return None
+
+            search_query = '"' + search_text.replace('"', '""') + '"'
+            return (
+                text(
+                    """
+                    SELECT chat.id AS chat_id, MIN(matches.rank) AS rank
+                    FROM (
+                        SELECT rowid, rank
+                        FROM chat_fts
+                        WHERE chat_fts MATCH :search_query AND rank MATCH 'bm25(10.0, 1.0)'
+                    ) AS matches
+                    JOIN chat_fts_map ON chat_fts_map.rowid = matches.rowid
+                    JOIN chat ON chat.id = chat_fts_map.chat_id
+                    WHERE chat.user_id = :search_user_id
+                    GROUP BY chat.id
+                    """
+                )
+                .bindparams(search_query=search_query, search_user_id=user_id)
+                .columns(chat_id=Text, rank=Float)
+                .subquery("search")
+            )
+        elif dialect_name == "postgresql":
+            words = re.findall(r"\w+", search_text)
+            if not words:
+                return None
+
+            # Match the words as a phrase, with the last one as a prefix (search as you type)
+            search_query = " <-> ".join(f"'{word}'" for word in words) + ":*"
+            return (
+                text(
+                    """
+                    SELECT chat_id, MIN(rank) AS rank
+                    FROM (
+                        SELECT chat.id AS chat_id,
+                            -10 * ts_rank(to_tsvector('simple', coalesce(chat.title, '')), query) AS rank
+                        FROM chat, to_tsquery('simple', :search_query) AS query
+                        WHERE chat.user_id = :search_user_id
+                            AND to_tsvector('simple', coalesce(chat.title, '')) @@ query
+                        UNION ALL
+                        SELECT chat.id AS chat_id,
+                            -ts_rank(to_tsvector('simple', coalesce(chat_message.content, '')), query) AS rank
+                        FROM chat_message
+                        JOIN chat ON chat.id = chat_message.chat_id,
+                            to_tsquery('simple', :search_query) AS query
+                        WHERE chat.user_id = :search_user_id
+                            AND to_tsvector('simple', coalesce(chat_message.content, '')) @@ query
+                    ) AS matches
+                    GROUP BY chat_id
+                    """
+                )
+                .bindparams(search_query=search_query, search_user_id=user_id)
+                .columns(chat_id=Text, rank=Float)
+                .subquery("search")
+            )
+
+        return None
+
     def insert_new_chat(self, user_id: str, form_data: ChatForm) -> Optional[ChatModel]:
         with get_db() as db:
             id = str(uuid.uuid4())
@@ -119,11 +353,17 @@ class ChatTable:
                 }
             )
 
-            result = Chat(**chat.model_dump())
+            result = Chat(
+                **{
+                    **chat.model_dump(),
+                    "chat": strip_chat_messages(form_data.chat),
+                }
+            )
             db.add(result)
+            self._sync_messages(db, id, get_chat_messages(form_data.chat))
             db.commit()
             db.refresh(result)
-            return ChatModel.model_validate(result) if result else None
+            return self._to_chat_model(db, result) if result else None
 
     def import_chat(
         self, user_id: str, form_data: ChatImportForm
@@ -148,35 +388,46 @@ class ChatTable:
                 }
             )
 
-            result = Chat(**chat.model_dump())
+            result = Chat(
+                **{
+                    **chat.model_dump(),
+                    "chat": strip_chat_messages(form_data.chat),
+                }
+            )
             db.add(result)
+            self._sync_messages(db, id, get_chat_messages(form_data.chat))
             db.commit()
             db.refresh(result)
-            return ChatModel.model_validate(result) if result else None
+            return self._to_chat_model(db, result) if result else None
 
     def update_chat_by_id(self, id: str, chat: dict) -> Optional[ChatModel]:
         try:
             with get_db() as db:
                 chat_item = db.get(Chat, id)
-                chat_item.chat = chat
+                chat_item.chat = strip_chat_messages(chat)
                 chat_item.title = chat["title"] if "title" in chat else "New Chat"
                 chat_item.updated_at = int(time.time())
+                self._sync_messages(db, id, get_chat_messages(chat))
                 db.commit()
                 db.refresh(chat_item)
 
-                return ChatModel.model_validate(chat_item)
+                return self._to_chat_model(db, chat_item)
         except Exception:
             return None
 
     def update_chat_title_by_id(self, id: str, title: str) -> Optional[ChatModel]:
-        chat = self.get_chat_by_id(id)
-        if chat is None:
-            return None
-
-        chat = chat.chat
-        chat["title"] = title
+        try:
+            with get_db() as db:
+                chat_item = db.get(Chat, id)
+                chat_item.chat = {**chat_item.chat, "title": title}
+                chat_item.title = title
+                chat_item.updated_at = int(time.time())
+                db.commit()
+                db.refresh(chat_item)
 
-        return self.update_chat_by_id(id, chat)
+                return self._to_chat_model(db, chat_item)
+        except Exception:
+            return None
 
     def update_chat_tags_by_id(
         self, id: str, tags: list[str], user
@@ -199,68 +450,148 @@ class ChatTable:
         return self.get_chat_by_id(id)
 
     def get_chat_title_by_id(self, id: str) -> Optional[str]:
-        chat = self.get_chat_by_id(id)
-        if chat is None:
-            return None
+        with get_db() as db:
+            chat = db.query(Chat.title).filter_by(id=id).first()
+            if chat is None:
+                return None
 
-        return chat.chat.get("title", "New Chat")
+            return chat.title or "New Chat"
 
     def get_messages_by_chat_id(self, id: str) -> Optional[dict]:
-        chat = self.get_chat_by_id(id)
-        if chat is None:
-            return None
+        with get_db() as db:
+            chat = db.get(Chat, id)
+            if chat is None:
+                return None
 
-        return chat.chat.get("history", {}).get("messages", {}) or {}
+            return {
+                **get_chat_messages(chat.chat),
+                **self._get_messages_by_chat_ids(db, [id])[id],
+            }
 
     def get_message_by_id_and_message_id(
         self, id: str, message_id: str
     ) -> Optional[dict]:
-        chat = self.get_chat_by_id(id)
-        if chat is None:
-            return None
+        with get_db() as db:
+            chat_message = db.get(ChatMessage, (id, message_id))
+            if chat_message is not None:
+                return join_chat_message(chat_message)
+
+            chat = db.get(Chat, id)
+            if chat is None:
+                return None
 
-        return chat.chat.get("history", {}).get("messages", {}).get(message_id, {})
+            return get_chat_messages(chat.chat).get(message_id, {})
 
     def upsert_message_to_chat_by_id_and_message_id(
         self, id: str, message_id: str, message: dict
-    ) -> Optional[ChatModel]:
-        chat = self.get_chat_by_id(id)
-        if chat is None:
+    ) -> Optional[dict]:
+        """
+        Merges `message` into a single `chat_message` row, without rewriting the chat blob.
+        The blob is only touched to move `history.currentId` when a new message is created.
+        """
+        try:
+            with get_db() as db:
+                now = int(time.time())
+                if not db.query(Chat).filter_by(id=id).update({"updated_at": now}):
+                    return None
+
+                chat_message = db.get(ChatMessage, (id, message_id))
+                if chat_message is None:
+                    chat = db.get(Chat, id)
+                    history = chat.chat.get("history") or {}
+
+                    chat_message = ChatMessage(
+                        chat_id=id,
+                        id=message_id,
+                        created_at=now,
+                        **split_chat_message(
+                            {
+                                **get_chat_messages(chat.chat).get(message_id, {}),
+                                **message,
+                            }
+                        ),
+                    )
+                    db.add(chat_message)
+
+                    chat.chat = {
+                        **chat.chat,
+                        "history": {**history, "currentId": message_id},
+                    }
+                else:
+                    for key, value in split_chat_message(
+                        {**join_chat_message(chat_message), **message}
+                    ).items():
+                        setattr(chat_message, key, value)
+
+                chat_message.updated_at = now
+                db.commit()
+
+                return join_chat_message(chat_message)
+        except Exception:
             return None
 
-        chat = chat.chat
-        history = chat.get("history", {})
+    def append_message_content_to_chat_by_id_and_message_id(
+        self, id: str, message_id: str, content: str
+    ) -> bool:
+        """
+        Appends `content` to a message in place (`content = content || :content`).
+        """
+        try:
+            with get_db() as db:
+                now = int(time.time())
+                result = (
+                    db.query(ChatMessage)
+                    .filter_by(chat_id=id, id=message_id)
+                    .update(
+                        {
+                            "content": func.coalesce(ChatMessage.content, "") + content,
+                            "updated_at": now,
+                        },
+                        synchronize_session=False,
+                    )
+                )
 
-        if message_id in history.get("messages", {}):
-            history["messages"][message_id] = {
-                **history["messages"][message_id],
-                **message,
-            }
-        else:
-            history["messages"][message_id] = message
+                if result:
+                    db.query(Chat).filter_by(id=id).update({"updated_at": now})
+                    db.commit()
+                    return True
+        except Exception:
+            return False
 
-        history["currentId"] = message_id
+        message = self.get_message_by_id_and_message_id(id, message_id)
+        if message is None:
+            return False
 
-        chat["history"] = history
-        return self.update_chat_by_id(id, chat)
+        return (
+            self.upsert_message_to_chat_by_id_and_message_id(
+                id,
+                message_id,
+                {"content": (message.get("content") or "") + content},
+            )
+            is not None
+        )
 
     def add_message_status_to_chat_by_id_and_message_id(
         self, id: str, message_id: str, status: dict
-    ) -> Optional[ChatModel]:
-        chat = self.get_chat_by_id(id)
-        if chat is None:
-            return None
-
-        chat = chat.chat
-        history = chat.get("history", {})
+    ) -> Optional[dict]:
+        try:
+            with get_db() as db:
+                chat_message = db.get(ChatMessage, (id, message_id))
+                if chat_message is None:
+                    return None
 
-        if message_id in history.get("messages", {}):
-            status_history = history["messages"][message_id].get("statusHistory", [])
-            status_history.append(status)
-            history["messages"][message_id]["statusHistory"] = status_history
+                now = int(time.time())
+                chat_message.status_history = [
+                    *(chat_message.status_history or []),
+                    status,
+                ]
+                chat_message.updated_at = now
+                db.query(Chat).filter_by(id=id).update({"updated_at": now})
+                db.commit()
 
-        chat["history"] = history
-        return self.update_chat_by_id(id, chat)
+                return join_chat_message(chat_message)
+        except Exception:
+            return None
 
     def insert_shared_chat_by_chat_id(self, chat_id: str) -> Optional[ChatModel]:
         with get_db() as db:
@@ -282,6 +613,11 @@ class ChatTable:
             )
             shared_result = Chat(**shared_chat.model_dump())
             db.add(shared_result)
+            self._sync_messages(
+                db,
+                shared_chat.id,
+                self._get_messages_by_chat_ids(db, [chat_id])[chat_id],
+            )
             db.commit()
             db.refresh(shared_result)
 
@@ -292,7 +628,11 @@ class ChatTable:
                 .update({"share_id": shared_chat.id})
             )
             db.commit()
-            return shared_chat if (shared_result and result) else None
+            return (
+                self._to_chat_model(db, shared_result)
+                if (shared_result and result)
+                else None
+            )
 
     def update_shared_chat_by_chat_id(self, chat_id: str) -> Optional[ChatModel]:
         try:
@@ -307,18 +647,26 @@ class ChatTable:
 
                 shared_chat.title = chat.title
                 shared_chat.chat = chat.chat
+                self._sync_messages(
+                    db,
+                    shared_chat.id,
+                    self._get_messages_by_chat_ids(db, [chat_id])[chat_id],
+                )
 
                 shared_chat.updated_at = int(time.time())
                 db.commit()
                 db.refresh(shared_chat)
 
-                return ChatModel.model_validate(shared_chat)
+                return self._to_chat_model(db, shared_chat)
         except Exception:
             return None
 
     def delete_shared_chat_by_chat_id(self, chat_id: str) -> bool:
         try:
             with get_db() as db:
+                self._delete_messages_by_chat_filter(
+                    db, Chat.user_id == f"shared-{chat_id}"
+                )
                 db.query(Chat).filter_by(user_id=f"shared-{chat_id}").delete()
                 db.commit()
 
@@ -335,7 +683,7 @@ class ChatTable:
                 chat.share_id = share_id
                 db.commit()
                 db.refresh(chat)
-                return ChatModel.model_validate(chat)
+                return self._to_chat_model(db, chat)
         except Exception:
             return None
 
@@ -347,7 +695,7 @@ class ChatTable:
                 chat.updated_at = int(time.time())
                 db.commit()
                 db.refresh(chat)
-                return ChatModel.model_validate(chat)
+                return self._to_chat_model(db, chat)
         except Exception:
             return None
 
@@ -359,7 +707,7 @@ class ChatTable:
                 chat.updated_at = int(time.time())
                 db.commit()
                 db.refresh(chat)
-                return ChatModel.model_validate(chat)
+                return self._to_chat_model(db, chat)
         except Exception:
             return None
 
@@ -383,7 +731,7 @@ class ChatTable:
                 # .limit(limit).offset(skip)
                 .all()
             )
-            return [ChatModel.model_validate(chat) for chat in all_chats]
+            return self._to_chat_models(db, all_chats)
 
     def get_chat_list_by_user_id(
         self,
@@ -405,7 +753,7 @@ class ChatTable:
                 query = query.limit(limit)
 
             all_chats = query.all()
-            return [ChatModel.model_validate(chat) for chat in all_chats]
+            return self._to_chat_models(db, all_chats)
 
     def get_chat_title_id_list_by_user_id(
         self,
@@ -456,13 +804,13 @@ class ChatTable:
                 .order_by(Chat.updated_at.desc())
                 .all()
             )
-            return [ChatModel.model_validate(chat) for chat in all_chats]
+            return self._to_chat_models(db, all_chats)
 
     def get_chat_by_id(self, id: str) -> Optional[ChatModel]:
         try:
             with get_db() as db:
                 chat = db.get(Chat, id)
-                return ChatModel.model_validate(chat)
+                return self._to_chat_model(db, chat)
         except Exception:
             return None
 
@@ -484,7 +832,7 @@ class ChatTable:
         try:
             with get_db() as db:
                 chat = db.query(Chat).filter_by(id=id, user_id=user_id).first()
-                return ChatModel.model_validate(chat)
+                return self._to_chat_model(db, chat)
         except Exception:
             return None
 
@@ -495,7 +843,7 @@ class ChatTable:
                 # .limit(limit).offset(skip)
                 .order_by(Chat.updated_at.desc())
             )
-            return [ChatModel.model_validate(chat) for chat in all_chats]
+            return self._to_chat_models(db, all_chats)
 
     def get_chats_by_user_id(self, user_id: str) -> list[ChatModel]:
         with get_db() as db:
@@ -504,7 +852,7 @@ class ChatTable:
                 .filter_by(user_id=user_id)
                 .order_by(Chat.updated_at.desc())
             )
-            return [ChatModel.model_validate(chat) for chat in all_chats]
+            return self._to_chat_models(db, all_chats)
 
     def get_pinned_chats_by_user_id(self, user_id: str) -> list[ChatModel]:
         with get_db() as db:
@@ -513,7 +861,7 @@ class ChatTable:
                 .filter_by(user_id=user_id, pinned=True, archived=False)
                 .order_by(Chat.updated_at.desc())
             )
-            return [ChatModel.model_validate(chat) for chat in all_chats]
+            return self._to_chat_models(db, all_chats)
 
     def get_archived_chats_by_user_id(self, user_id: str) -> list[ChatModel]:
         with get_db() as db:
@@ -522,7 +870,7 @@ class ChatTable:
                 .filter_by(user_id=user_id, archived=True)
                 .order_by(Chat.updated_at.desc())
             )
-            return [ChatModel.model_validate(chat) for chat in all_chats]
+            return self._to_chat_models(db, all_chats)
 
     def get_chats_by_user_id_and_search_text(
         self,
@@ -533,7 +881,7 @@ class ChatTable:
         limit: int = 60,
     ) -> list[ChatModel]:
         """
-        Filters chats based on a search query using Python, allowing pagination using skip and limit.
+        Searches chat titles and message contents, ranking the best matches first, allowing pagination using skip and limit.
         """
         search_text = search_text.lower().strip()
 
@@ -553,7 +901,7 @@ class ChatTable:
             word for word in search_text_words if not word.startswith("tag:")
         ]
 
-        search_text = " ".join(search_text_words)
+        search_text = " ".join(search_text_words).strip()
 
         with get_db() as db:
             query = db.query(Chat).filter(Chat.user_id == user_id)
@@ -561,29 +909,27 @@ class ChatTable:
             if not include_archived:
                 query = query.filter(Chat.archived == False)
 
+            if search_text:
+                search = self._get_chat_search_query(db, user_id, search_text)
+                if search is not None:
+                    # Best matches first
+                    query = query.join(search, search.c.chat_id == Chat.id).order_by(
+                        search.c.rank
+                    )
+                else:
+                    query = query.filter(
+                        Chat.title.ilike(f"%{search_text}%")
+                        | exists().where(
+                            ChatMessage.chat_id == Chat.id,
+                            ChatMessage.content.ilike(f"%{search_text}%"),
+                        )
+                    )
+
             query = query.order_by(Chat.updated_at.desc())
 
             # Check if the database dialect is either 'sqlite' or 'postgresql'
             dialect_name = db.bind.dialect.name
             if dialect_name == "sqlite":
-                # SQLite case: using JSON1 extension for JSON searching
-                query = query.filter(
-                    (
-                        Chat.title.ilike(
-                            f"%{search_text}%"
-                        )  # Case-insensitive search in title
-                        | text(
-                            """
-                            EXISTS (
-                                SELECT 1 
-                                FROM json_each(Chat.chat, '$.messages') AS message 
-                                WHERE LOWER(message.value->>'content') LIKE '%' || :search_text || '%'
-                            )
-                            """
-                        )
-                    ).params(search_text=search_text)
-                )
-
                 # Check if there are any tags to filter, it should have all the tags
                 if "none" in tag_ids:
                     query = query.filter(
@@ -615,24 +961,6 @@ class ChatTable:
                     )
 
             elif dialect_name == "postgresql":
-                # PostgreSQL relies on proper JSON query for search
-                query = query.filter(
-                    (
-                        Chat.title.ilike(
-                            f"%{search_text}%"
-                        )  # Case-insensitive search in title
-                        | text(
-                            """
-                            EXISTS (
-                                SELECT 1
-                                FROM json_array_elements(Chat.chat->'messages') AS message
-                                WHERE LOWER(message->>'content') LIKE '%' || :search_text || '%'
-                            )
-                            """
-                        )
-                    ).params(search_text=search_text)
-                )
-
                 # Check if there are any tags to filter, it should have all the tags
                 if "none" in tag_ids:
                     query = query.filter(
@@ -673,7 +1001,7 @@ class ChatTable:
             print(len(all_chats))
 
             # Validate and return chats
-            return [ChatModel.model_validate(chat) for chat in all_chats]
+            return self._to_chat_models(db, all_chats)
 
     def get_chats_by_folder_id_and_user_id(
         self, folder_id: str, user_id: str
@@ -686,7 +1014,7 @@ class ChatTable:
             query = query.order_by(Chat.updated_at.desc())
 
             all_chats = query.all()
-            return [ChatModel.model_validate(chat) for chat in all_chats]
+            return self._to_chat_models(db, all_chats)
 
     def get_chats_by_folder_ids_and_user_id(
         self, folder_ids: list[str], user_id: str
@@ -701,7 +1029,7 @@ class ChatTable:
             query = query.order_by(Chat.updated_at.desc())
 
             all_chats = query.all()
-            return [ChatModel.model_validate(chat) for chat in all_chats]
+            return self._to_chat_models(db, all_chats)
 
     def update_chat_folder_id_by_id_and_user_id(
         self, id: str, user_id: str, folder_id: str
@@ -714,7 +1042,7 @@ class ChatTable:
                 chat.pinned = False
                 db.commit()
                 db.refresh(chat)
-                return ChatModel.model_validate(chat)
+                return self._to_chat_model(db, chat)
         except Exception:
             return None
 
@@ -753,7 +1081,7 @@ class ChatTable:
 
             all_chats = query.all()
             print("all_chats", all_chats)
-            return [ChatModel.model_validate(chat) for chat in all_chats]
+            return self._to_chat_models(db, all_chats)
 
     def add_chat_tag_by_id_and_user_id_and_tag_name(
         self, id: str, user_id: str, tag_name: str
@@ -774,7 +1102,7 @@ class ChatTable:
 
                 db.commit()
                 db.refresh(chat)
-                return ChatModel.model_validate(chat)
+                return self._to_chat_model(db, chat)
         except Exception:
             return None
 
@@ -850,6 +1178,7 @@ class ChatTable:
     def delete_chat_by_id(self, id: str) -> bool:
         try:
             with get_db() as db:
+                db.query(ChatMessage).filter_by(chat_id=id).delete()
                 db.query(Chat).filter_by(id=id).delete()
                 db.commit()
 
@@ -860,6 +1189,9 @@ class ChatTable:
     def delete_chat_by_id_and_user_id(self, id: str, user_id: str) -> bool:
         try:
             with get_db() as db:
+                self._delete_messages_by_chat_filter(
+                    db, Chat.id == id, Chat.user_id == user_id
+                )
                 db.query(Chat).filter_by(id=id, user_id=user_id).delete()
                 db.commit()
 
@@ -872,6 +1204,7 @@ class ChatTable:
             with get_db() as db:
                 self.delete_shared_chats_by_user_id(user_id)
 
+                self._delete_messages_by_chat_filter(db, Chat.user_id == user_id)
                 db.query(Chat).filter_by(user_id=user_id).delete()
                 db.commit()
 
@@ -884,6 +1217,9 @@ class ChatTable:
     ) -> bool:
         try:
             with get_db() as db:
+                self._delete_messages_by_chat_filter(
+                    db, Chat.user_id == user_id, Chat.folder_id == folder_id
+                )
                 db.query(Chat).filter_by(user_id=user_id, folder_id=folder_id).delete()
                 db.commit()
 
@@ -897,6 +1233,9 @@ class ChatTable:
                 chats_by_user = db.query(Chat).filter_by(user_id=user_id).all()
                 shared_chat_ids = [f"shared-{chat.id}" for chat in chats_by_user]
 
+                self._delete_messages_by_chat_filter(
+                    db, Chat.user_id.in_(shared_chat_ids)
+                )
                 db.query(Chat).filter(Chat.user_id.in_(shared_chat_ids)).delete()
                 db.commit()
 
@@ -0,0 +1,82 @@
+import logging
+import time
+
+from open_webui.internal.db import Base, get_db
+from open_webui.env import SRC_LOG_LEVELS
+
+from sqlalchemy import BigInteger, Column, String, select, update
+from sqlalchemy.exc import IntegrityError
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+# Bumped when the whole vector database is reset, or the embedding or reranking
+# model changes, so it is part of the version of every collection
+ALL_COLLECTIONS = "*"
+
+####################
+# Collection Versions DB Schema
+####################
+
+
+class CollectionVersion(Base):
+    __tablename__ = "collection_version"
+
+    name = Column(String, primary_key=True)
+    version = Column(BigInteger)
+    updated_at = Column(BigInteger)
+
+
+class CollectionVersionsTable:
+    """
+    Version of each vector DB collection, bumped on every write to it, so results
+    computed from a collection can be cached by every worker until it changes.
+    """
+
+    def get_versions(self, names: list[str]) -> dict[str, int]:
+        """Returns the version of each of `names` (0 if it was never written)."""
+        names = list(set(names) | {ALL_COLLECTIONS})
+        with get_db() as db:
+            rows = db.execute(
+                select(CollectionVersion.name, CollectionVersion.version).where(
+                    CollectionVersion.name.in_(names)
+                )
+            ).all()
+        versions = dict.fromkeys(names, 0)
+        versions.update({name: version for name, version in rows})
+        return versions
+
+    def _bump(self, db, name: str) -> bool:
+        return (
+            db.execute(
+                update(CollectionVersion)
+                .where(CollectionVersion.name == name)
+                .values(
+                    version=CollectionVersion.version + 1,
+                    updated_at=int(time.time()),
+                )
+            ).rowcount
+            > 0
+        )
+
+    def bump(self, name: str):
+        with get_db() as db:
+            try:
+                if not self._bump(db, name):
+                    db.add(
+                        CollectionVersion(
+                            name=name, version=1, updated_at=int(time.time())
+                        )
+                    )
+                db.commit()
+            except IntegrityError:
+                # Another worker wrote to the collection for the first time as well
+                db.rollback()
+                self._bump(db, name)
+                db.commit()
+
+    def bump_all(self):
+        self.bump(ALL_COLLECTIONS)
+
+
+CollectionVersions = CollectionVersionsTable()
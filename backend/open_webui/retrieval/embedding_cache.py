@@ -0,0 +1,235 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+from open_webui.env import (
+    ENABLE_RAG_EMBEDDING_CACHE,
+    RAG_EMBEDDING_CACHE_DIR,
+    RAG_EMBEDDING_CACHE_MAX_SIZE,
+    SRC_LOG_LEVELS,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+# Host parameters per statement, below the SQLite default limit of 999
+QUERY_BATCH_SIZE = 500
+# Hits only refresh the access time of embeddings not used for this long
+ACCESS_TIME_RESOLUTION = 60 * 60
+# Eviction frees space down to this fraction of the maximum size
+EVICTION_TARGET = 0.9
+
+
+def get_text_hash(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).digest()
+
+
+class EmbeddingCache:
+    """
+    Content-addressed cache of embeddings, in a local SQLite database shared by the
+    workers of the instance.
+
+    Embeddings are keyed by (engine, model, sha256(text)), where the engine of a remote
+    API includes its base URL (see `get_embedding_function`), so the same chunk is only
+    embedded once however many knowledge bases it is added to, and stored as float32.
+    Once the database grows past `max_size` bytes the least recently used embeddings
+    are evicted.
+    """
+
+    def __init__(self, path: str, max_size: int):
+        self.path = path
+        self.max_size = max_size
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS embedding ("
+                "engine TEXT NOT NULL, model TEXT NOT NULL, hash BLOB NOT NULL, "
+                "vector BLOB NOT NULL, accessed_at INTEGER NOT NULL, "
+                "PRIMARY KEY (engine, model, hash))"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS embedding_accessed_at "
+                "ON embedding (accessed_at)"
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread, sqlite3 connections can't be shared between them
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(
+        self, engine: str, model: str, texts: list[str]
+    ) -> list[Optional[list[float]]]:
+        hashes = [get_text_hash(text) for text in texts]
+        now = int(time.time())
+
+        found = {}
+        stale = []
+        conn = self._connect()
+        for i in range(0, len(hashes), QUERY_BATCH_SIZE):
+            batch = list(set(hashes[i : i + QUERY_BATCH_SIZE]))
+            rows = conn.execute(
+                "SELECT hash, vector, accessed_at FROM embedding "
+                f"WHERE engine = ? AND model = ? AND hash IN ({','.join('?' * len(batch))})",
+                [engine, model, *batch],
+            ).fetchall()
+            for text_hash, vector, accessed_at in rows:
+                found[text_hash] = np.frombuffer(vector, dtype=np.float32).tolist()
+                if accessed_at < now - ACCESS_TIME_RESOLUTION:
+                    stale.append(text_hash)
+
+        if stale:
+            with conn:
+                conn.executemany(
+                    "UPDATE embedding SET accessed_at = ? "
+                    "WHERE engine = ? AND model = ? AND hash = ?",
+                    [(now, engine, model, text_hash) for text_hash in stale],
+                )
+
+        embeddings = [found.get(text_hash) for text_hash in hashes]
+        hits = sum(embedding is not None for embedding in embeddings)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(embeddings) - hits
+        return embeddings
+
+    def set_many(
+        self, engine: str, model: str, texts: list[str], embeddings: list[list[float]]
+    ):
+        now = int(time.time())
+        conn = self._connect()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO embedding "
+                "(engine, model, hash, vector, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (
+                        engine,
+                        model,
+                        get_text_hash(text),
+                        np.asarray(embedding, dtype=np.float32).tobytes(),
+                        now,
+                    )
+                    for text, embedding in zip(texts, embeddings)
+                ],
+            )
+        self._evict(conn)
+
+    def _get_size(self, conn: sqlite3.Connection) -> int:
+        # Pages in use, free pages are reused by later inserts
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        return (page_count - freelist_count) * page_size
+
+    def _evict(self, conn: sqlite3.Connection):
+        size = self._get_size(conn)
+        if size <= self.max_size:
+            return
+
+        count = conn.execute("SELECT COUNT(*) FROM embedding").fetchone()[0]
+        if count == 0:
+            return
+
+        evict_count = max(
+            int(count * (size - self.max_size * EVICTION_TARGET) / size), 1
+        )
+        with conn:
+            conn.execute(
+                "DELETE FROM embedding WHERE rowid IN "
+                "(SELECT rowid FROM embedding ORDER BY accessed_at LIMIT ?)",
+                (evict_count,),
+            )
+        log.info(f"Evicted {evict_count} of {count} cached embeddings")
+
+    def get_embeddings(
+        self,
+        engine: str,
+        model: str,
+        texts: list[str],
+        generate: Callable[[list[str]], list[list[float]]],
+    ) -> list[list[float]]:
+        """
+        Returns the embeddings of `texts`, calling `generate` only for the (unique)
+        texts that are not cached yet.
+        """
+        try:
+            embeddings = self.get_many(engine, model, texts)
+        except Exception as e:
+            log.warning(f"Failed to read the embedding cache: {e}")
+            return generate(texts)
+
+        missing = list(
+            dict.fromkeys(
+                text for text, embedding in zip(texts, embeddings) if embedding is None
+            )
+        )
+        if not missing:
+            return embeddings
+
+        generated = generate(missing)
+        if generated is None:
+            return None
+        if len(generated) != len(missing):
+            raise ValueError(
+                f"Got {len(generated)} embeddings from {engine} for {len(missing)} texts"
+            )
+
+        try:
+            self.set_many(engine, model, missing, generated)
+        except Exception as e:
+            log.warning(f"Failed to write to the embedding cache: {e}")
+
+        generated = dict(zip(missing, generated))
+        return [
+            embedding if embedding is not None else generated[text]
+            for text, embedding in zip(texts, embeddings)
+        ]
+
+    def get_stats(self) -> dict:
+        conn = self._connect()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "count": conn.execute("SELECT COUNT(*) FROM embedding").fetchone()[0],
+            "size": self._get_size(conn),
+            "max_size": self.max_size,
+        }
+
+    def clear(self):
+        conn = self._connect()
+        with conn:
+            conn.execute("DELETE FROM embedding")
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+EMBEDDING_CACHE = None
+if ENABLE_RAG_EMBEDDING_CACHE:
+    try:
+        EMBEDDING_CACHE = EmbeddingCache(
+            os.path.join(RAG_EMBEDDING_CACHE_DIR, "embeddings.db"),
+            RAG_EMBEDDING_CACHE_MAX_SIZE * 1024 * 1024,
+        )
+    except Exception as e:
+        log.warning(f"Failed to open the embedding cache, it is disabled: {e}")
@@ -0,0 +1,152 @@
+import asyncio
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from open_webui.env import (
+    RAG_EMBEDDING_CONCURRENCY,
+    RAG_EMBEDDING_MAX_RETRIES,
+    RAG_EMBEDDING_TIMEOUT,
+    SRC_LOG_LEVELS,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30
+
+
+def get_retry_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    # Honour Retry-After (in seconds), exponential backoff with jitter otherwise
+    if retry_after:
+        try:
+            return min(max(float(retry_after), 0), RETRY_MAX_DELAY)
+        except ValueError:
+            pass
+    delay = min(RETRY_BASE_DELAY * 2**attempt, RETRY_MAX_DELAY)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class EmbeddingClient:
+    """
+    Client for remote (Ollama / OpenAI compatible) embedding servers.
+
+    Requests go over pooled keep-alive connections and are retried with backoff on
+    429, 5xx and connection errors. `map` sends batches concurrently, with at most
+    `concurrency` requests in flight across the whole worker; the async methods share
+    the same limit per event loop.
+    """
+
+    def __init__(self, concurrency: int, max_retries: int, timeout: Optional[int]):
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.executor = ThreadPoolExecutor(
+            max_workers=concurrency, thread_name_prefix="embedding"
+        )
+
+        self._loop = None
+        self._async_session = None
+        self._semaphore = None
+
+    def post(self, url: str, headers: dict, payload: dict) -> dict:
+        for attempt in range(self.max_retries + 1):
+            try:
+                r = self.session.post(
+                    url, headers=headers, json=payload, timeout=self.timeout
+                )
+                if r.status_code in RETRY_STATUS_CODES and attempt < self.max_retries:
+                    delay = get_retry_delay(attempt, r.headers.get("Retry-After"))
+                    log.warning(
+                        f"Embedding request to {url} failed with {r.status_code}, retrying in {delay:.1f}s"
+                    )
+                    time.sleep(delay)
+                    continue
+
+                r.raise_for_status()
+                return r.json()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = get_retry_delay(attempt)
+                log.warning(
+                    f"Embedding request to {url} failed ({e}), retrying in {delay:.1f}s"
+                )
+                time.sleep(delay)
+
+    def map(self, func, batches: list) -> list:
+        """Returns `[func(batch) for batch in batches]`, computed concurrently."""
+        if len(batches) <= 1:
+            return [func(batch) for batch in batches]
+        return list(self.executor.map(func, batches))
+
+    ####################
+    # Async
+    ####################
+
+    def _get_async_state(self):
+        # aiohttp sessions and semaphores are bound to the event loop they were made in
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._async_session.closed:
+            self._loop = loop
+            self._async_session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trust_env=True,
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._async_session, self._semaphore
+
+    async def apost(self, url: str, headers: dict, payload: dict) -> dict:
+        session, semaphore = self._get_async_state()
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    async with session.post(url, headers=headers, json=payload) as r:
+                        if (
+                            r.status in RETRY_STATUS_CODES
+                            and attempt < self.max_retries
+                        ):
+                            delay = get_retry_delay(
+                                attempt, r.headers.get("Retry-After")
+                            )
+                            log.warning(
+                                f"Embedding request to {url} failed with {r.status}, retrying in {delay:.1f}s"
+                            )
+                            await asyncio.sleep(delay)
+                            continue
+
+                        r.raise_for_status()
+                        return await r.json()
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                    if attempt >= self.max_retries:
+                        raise
+                    delay = get_retry_delay(attempt)
+                    log.warning(
+                        f"Embedding request to {url} failed ({e}), retrying in {delay:.1f}s"
+                    )
+                    await asyncio.sleep(delay)
+
+    async def amap(self, func, batches: list) -> list:
+        """Async `map`, for a coroutine function `func`."""
+        return list(await asyncio.gather(*[func(batch) for batch in batches]))
+
+
+EMBEDDING_CLIENT = EmbeddingClient(
+    concurrency=RAG_EMBEDDING_CONCURRENCY,
+    max_retries=RAG_EMBEDDING_MAX_RETRIES,
+    timeout=RAG_EMBEDDING_TIMEOUT,
+)
@@ -2,6 +2,12 @@ import requests
 import logging
 import ftfy
 import sys
+import tempfile
+import threading
+from typing import Optional
+
+from pypdf import PdfReader, PdfWriter
+from requests.adapters import HTTPAdapter
 
 from langchain_community.document_loaders import (
     BSHTMLLoader,
@@ -19,7 +25,20 @@ from langchain_community.document_loaders import (
     YoutubeLoader,
 )
 from langchain_core.documents import Document
-from open_webui.env import SRC_LOG_LEVELS, GLOBAL_LOG_LEVEL
+from open_webui.env import (
+    SRC_LOG_LEVELS,
+    GLOBAL_LOG_LEVEL,
+    TIKA_CLIENT_CONNECT_TIMEOUT,
+    TIKA_CLIENT_TIMEOUT,
+    TIKA_MAX_CONCURRENT_REQUESTS,
+    TIKA_PDF_PAGES_PER_REQUEST,
+)
+from open_webui.retrieval.process_pool import (
+    PDF_PAGES_PER_TASK,
+    get_process_pool,
+    imap,
+    load_document,
+)
 
 logging.basicConfig(stream=sys.stdout, level=GLOBAL_LOG_LEVEL)
 log = logging.getLogger(__name__)
@@ -79,6 +98,13 @@ known_source_ext = [
 ]
 
 
+# Shared by all the Tika requests of the worker, so connections are reused
+TIKA_SESSION = requests.Session()
+TIKA_SESSION.mount("http://", HTTPAdapter(pool_maxsize=TIKA_MAX_CONCURRENT_REQUESTS))
+TIKA_SESSION.mount("https://", HTTPAdapter(pool_maxsize=TIKA_MAX_CONCURRENT_REQUESTS))
+TIKA_SEMAPHORE = threading.BoundedSemaphore(TIKA_MAX_CONCURRENT_REQUESTS)
+
+
 class TikaLoader:
     def __init__(self, url, file_path, mime_type=None):
         self.url = url
@@ -86,11 +112,48 @@ class TikaLoader:
         self.mime_type = mime_type
 
     def load(self) -> list[Document]:
+        if TIKA_PDF_PAGES_PER_REQUEST and self._is_pdf():
+            with open(self.file_path, "rb") as f:
+                # Reads pages from the file as they are needed, not all of it
+                try:
+                    reader = PdfReader(f)
+                    page_count = len(reader.pages)
+                except Exception as e:
+                    # Encrypted or malformed, Tika may still be able to read it
+                    log.warning(
+                        f"Can't split {self.file_path} by pages, sending it whole to Tika: {e}"
+                    )
+                    page_count = 0
+
+                if page_count > TIKA_PDF_PAGES_PER_REQUEST:
+                    return [
+                        self._load_pages(reader, start)
+                        for start in range(0, page_count, TIKA_PDF_PAGES_PER_REQUEST)
+                    ]
+
         with open(self.file_path, "rb") as f:
-            data = f.read()
+            text, headers = self._extract(f, self.mime_type)
+        return [Document(page_content=text, metadata=headers)]
 
-        if self.mime_type is not None:
-            headers = {"Content-Type": self.mime_type}
+    def _is_pdf(self) -> bool:
+        return self.mime_type == "application/pdf" or self.file_path.lower().endswith(
+            ".pdf"
+        )
+
+    def _load_pages(self, reader: PdfReader, start: int) -> Document:
+        writer = PdfWriter()
+        for page in reader.pages[start : start + TIKA_PDF_PAGES_PER_REQUEST]:
+            writer.add_page(page)
+
+        with tempfile.TemporaryFile() as f:
+            writer.write(f)
+            f.seek(0)
+            text, headers = self._extract(f, "application/pdf")
+        return Document(page_content=text, metadata={**headers, "page": start})
+
+    def _extract(self, data, mime_type=None) -> tuple[str, dict]:
+        if mime_type is not None:
+            headers = {"Content-Type": mime_type}
         else:
             headers = {}
 
@@ -99,7 +162,14 @@ class TikaLoader:
             endpoint += "/"
         endpoint += "tika/text"
 
-        r = requests.put(endpoint, data=data, headers=headers)
+        # The file object is streamed as the request body
+        with TIKA_SEMAPHORE:
+            r = TIKA_SESSION.put(
+                endpoint,
+                data=data,
+                headers=headers,
+                timeout=(TIKA_CLIENT_CONNECT_TIMEOUT, TIKA_CLIENT_TIMEOUT),
+            )
 
         if r.ok:
             raw_metadata = r.json()
@@ -110,11 +180,30 @@ class TikaLoader:
 
             log.debug("Tika extracted text: %s", text)
 
-            return [Document(page_content=text, metadata=headers)]
+            return text, headers
         else:
             raise Exception(f"Error calling Tika: {r.reason}")
 
 
+class PyPDFPagesLoader:
+    """`PyPDFLoader` for a range of pages, with the same text and metadata."""
+
+    def __init__(self, file_path, start, end):
+        self.file_path = file_path
+        self.start = start
+        self.end = end
+
+    def load(self) -> list[Document]:
+        reader = PdfReader(self.file_path)
+        return [
+            Document(
+                page_content=reader.pages[page_number].extract_text(),
+                metadata={"source": self.file_path, "page": page_number},
+            )
+            for page_number in range(self.start, min(self.end, len(reader.pages)))
+        ]
+
+
 class Loader:
     def __init__(self, engine: str = "", **kwargs):
         self.engine = engine
@@ -123,7 +212,51 @@ class Loader:
     def load(
         self, filename: str, file_content_type: str, file_path: str
     ) -> list[Document]:
-        loader = self._get_loader(filename, file_content_type, file_path)
+        # Tika extracts remotely, nothing to gain from the process pool
+        if get_process_pool() is None or (
+            self.engine == "tika" and self.kwargs.get("TIKA_SERVER_URL")
+        ):
+            return self.load_local(filename, file_content_type, file_path)
+
+        # PDFs are extracted a few pages per task, on all the cores
+        shards = [None]
+        file_ext = filename.split(".")[-1].lower()
+        if file_ext == "pdf" and not self.kwargs.get("PDF_EXTRACT_IMAGES"):
+            page_count = len(PdfReader(file_path).pages)
+            shards = [
+                (start, start + PDF_PAGES_PER_TASK)
+                for start in range(0, page_count, PDF_PAGES_PER_TASK)
+            ] or [None]
+
+        docs = []
+        for shard_docs in imap(
+            load_document,
+            [
+                (
+                    self.engine,
+                    self.kwargs,
+                    filename,
+                    file_content_type,
+                    file_path,
+                    pages,
+                )
+                for pages in shards
+            ],
+        ):
+            docs.extend(shard_docs)
+        return docs
+
+    def load_local(
+        self,
+        filename: str,
+        file_content_type: str,
+        file_path: str,
+        pages: Optional[tuple[int, int]] = None,
+    ) -> list[Document]:
+        if pages is not None:
+            loader = PyPDFPagesLoader(file_path, *pages)
+        else:
+            loader = self._get_loader(filename, file_content_type, file_path)
         docs = loader.load()
 
         return [
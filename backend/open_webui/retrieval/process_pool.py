@@ -0,0 +1,123 @@
+import logging
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from itertools import islice
+from typing import Callable, Iterable, Iterator, Optional
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter, TokenTextSplitter
+from langchain_core.documents import Document
+
+from open_webui.constants import ERROR_MESSAGES
+from open_webui.env import RAG_INGESTION_PROCESS_POOL_SIZE, SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+# Pages of a PDF extracted by one task
+PDF_PAGES_PER_TASK = 16
+# Documents split by one task
+SPLIT_DOCS_PER_TASK = 16
+
+_process_pool = None
+_process_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    """
+    Returns the pool that document loading and splitting run in, or None when
+    RAG_INGESTION_PROCESS_POOL_SIZE is 0 and they run in the calling thread.
+    """
+    global _process_pool
+    if RAG_INGESTION_PROCESS_POOL_SIZE <= 0:
+        return None
+
+    with _process_pool_lock:
+        if _process_pool is None:
+            # Forking a process with running threads (the server's) isn't safe
+            _process_pool = ProcessPoolExecutor(
+                max_workers=RAG_INGESTION_PROCESS_POOL_SIZE,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def imap(func: Callable, args: Iterable[tuple]) -> Iterator:
+    """
+    `map(func, *zip(*args))` over the process pool: results are yielded in order, with
+    a bounded number of tasks submitted ahead of the consumer.
+    """
+    global _process_pool
+    pool = get_process_pool()
+    args = iter(args)
+    futures = deque(
+        pool.submit(func, *task_args)
+        for task_args in islice(args, RAG_INGESTION_PROCESS_POOL_SIZE * 2)
+    )
+    try:
+        while futures:
+            result = futures.popleft().result()
+            for task_args in islice(args, 1):
+                futures.append(pool.submit(func, *task_args))
+            yield result
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory), start a new pool for the next call
+        with _process_pool_lock:
+            if _process_pool is pool:
+                _process_pool = None
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+####################
+# Tasks
+####################
+
+
+def load_document(
+    engine: str,
+    kwargs: dict,
+    filename: str,
+    file_content_type: str,
+    file_path: str,
+    pages: Optional[tuple[int, int]] = None,
+) -> list[Document]:
+    from open_webui.retrieval.loaders.main import Loader
+
+    return Loader(engine, **kwargs).load_local(
+        filename, file_content_type, file_path, pages
+    )
+
+
+@lru_cache(maxsize=8)
+def create_text_splitter(
+    text_splitter: str, chunk_size: int, chunk_overlap: int, encoding_name: str
+):
+    if text_splitter in ["", "character"]:
+        return RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            add_start_index=True,
+        )
+    elif text_splitter == "token":
+        return TokenTextSplitter(
+            encoding_name=encoding_name,
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            add_start_index=True,
+        )
+    else:
+        raise ValueError(ERROR_MESSAGES.DEFAULT("Invalid text splitter"))
+
+
+def split_documents(
+    splitter_config: tuple, docs: list[Document]
+) -> list[list[Document]]:
+    """Returns the chunks of each of `docs`."""
+    text_splitter = create_text_splitter(*splitter_config)
+    return [text_splitter.split_documents([doc]) for doc in docs]
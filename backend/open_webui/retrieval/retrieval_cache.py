@@ -0,0 +1,106 @@
+import copy
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from open_webui.models.collection_versions import CollectionVersions
+from open_webui.env import (
+    RAG_RETRIEVAL_CACHE_SIZE,
+    RAG_RETRIEVAL_CACHE_TTL,
+    SRC_LOG_LEVELS,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+
+class RetrievalCache:
+    """
+    In-memory LRU cache of the results of collection queries, with a TTL.
+
+    Results are keyed by the versions of the collections they were computed from
+    (see `CollectionVersionsTable`), so a write to any of them, by any worker, makes
+    the next identical query compute fresh results.
+    """
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # key -> (expires_at, result), least recently used first
+        self.entries: OrderedDict[tuple, tuple[float, dict]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_key(
+        self, collection_names: list[str], queries: list[str], **params
+    ) -> Optional[tuple]:
+        """Returns the key of a query, or None if its result can't be cached."""
+        if self.max_size <= 0 or self.ttl <= 0:
+            return None
+
+        try:
+            versions = CollectionVersions.get_versions(collection_names)
+        except Exception as e:
+            log.warning(f"Failed to get the collection versions: {e}")
+            return None
+
+        return (
+            tuple(sorted(versions.items())),
+            tuple(queries),
+            tuple(sorted(params.items())),
+        )
+
+    def get(self, key: Optional[tuple]) -> Optional[dict]:
+        if key is None:
+            return None
+
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self.entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+
+        # Callers are free to modify the results they get
+        return copy.deepcopy(entry[1])
+
+    def set(self, key: Optional[tuple], result: dict):
+        if key is None:
+            return
+
+        result = copy.deepcopy(result)
+        with self._lock:
+            self.entries[key] = (time.monotonic() + self.ttl, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def get_stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "count": len(self.entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+        }
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+RETRIEVAL_CACHE = RetrievalCache(RAG_RETRIEVAL_CACHE_SIZE, RAG_RETRIEVAL_CACHE_TTL)
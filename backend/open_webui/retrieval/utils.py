@@ -1,10 +1,11 @@
+import json
 import logging
 import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Union
 
 import asyncio
-import requests
 from huggingface_hub import snapshot_download
 from langchain.retrievers import ContextualCompressionRetriever, EnsembleRetriever
 from langchain_community.retrievers import BM25Retriever
@@ -29,18 +30,31 @@ from open_webui.config import VECTOR_DB
 from open_webui.retrieval.vector.connector import VECTOR_DB_CLIENT
 from open_webui.utils.misc import get_last_user_message, calculate_sha256_string
 
+from open_webui.models.bm25_index import BM25Index
+from open_webui.retrieval.embedding_client import EMBEDDING_CLIENT
+from open_webui.retrieval.embedding_cache import EMBEDDING_CACHE
+from open_webui.retrieval.retrieval_cache import RETRIEVAL_CACHE
 from open_webui.models.users import UserModel
 
 from open_webui.env import (
     SRC_LOG_LEVELS,
     OFFLINE_MODE,
     ENABLE_FORWARD_USER_INFO_HEADERS,
+    RAG_RERANKING_BATCH_SIZE,
 )
 >>>>>>>> upstream/main:backend/open_webui/retrieval/utils.py
 
 log = logging.getLogger(__name__)
 log.setLevel(SRC_LOG_LEVELS["RAG"])
 
+# Collections searched at the same time, by all the requests of the worker
+QUERY_COLLECTIONS_CONCURRENCY = 8
+
+# Shared by the searches, so that one isn't started and stopped per request
+QUERY_COLLECTIONS_EXECUTOR = ThreadPoolExecutor(
+    max_workers=QUERY_COLLECTIONS_CONCURRENCY, thread_name_prefix="query_collections"
+)
+
 
 from typing import Any
 
@@ -73,6 +87,7 @@ class VectorSearchRetriever(BaseRetriever):
         for idx in range(len(ids)):
             results.append(
                 Document(
+                    id=ids[idx],
                     metadata=metadatas[idx],
                     page_content=documents[idx],
                 )
@@ -80,6 +95,68 @@ class VectorSearchRetriever(BaseRetriever):
         return results
 
 
+class BM25IndexRetriever(BaseRetriever):
+    collection_name: Any
+    top_k: int
+
+    def _get_relevant_documents(
+        self,
+        query: str,
+        *,
+        run_manager: CallbackManagerForRetrieverRun,
+    ) -> list[Document]:
+        results = BM25Index.search(self.collection_name, query, self.top_k) or []
+        return [
+            Document(
+                id=result["id"],
+                metadata=result["metadata"] or {},
+                page_content=result["content"],
+            )
+            for result in results
+        ]
+
+
+def get_bm25_retriever(collection_name: str, k: int) -> BaseRetriever:
+    if BM25Index.has_collection(collection_name):
+        return BM25IndexRetriever(collection_name=collection_name, top_k=k)
+
+    # First hybrid search of the collection, index it for the next queries. The build
+    # is claimed before reading the collection, so that the writes made while it is
+    # read are applied to the index.
+    build_id = None
+    try:
+        build_id = BM25Index.start_build(collection_name)
+    except Exception as e:
+        log.exception(f"Failed to start the BM25 index of {collection_name}: {e}")
+
+    try:
+        result = VECTOR_DB_CLIENT.get(collection_name=collection_name)
+    except Exception:
+        if build_id is not None:
+            BM25Index.cancel_build(collection_name, build_id)
+        raise
+
+    if build_id is not None:
+        items = [
+            {"id": id, "text": text, "metadata": metadata}
+            for id, text, metadata in zip(
+                result.ids[0], result.documents[0], result.metadatas[0]
+            )
+        ]
+        try:
+            if BM25Index.finish_build(collection_name, build_id, items):
+                return BM25IndexRetriever(collection_name=collection_name, top_k=k)
+        except Exception as e:
+            log.exception(f"Failed to build the BM25 index of {collection_name}: {e}")
+
+    bm25_retriever = BM25Retriever.from_texts(
+        texts=result.documents[0],
+        metadatas=result.metadatas[0],
+    )
+    bm25_retriever.k = k
+    return bm25_retriever
+
+
 def query_doc(
 <<<<<<<< HEAD:backend/open_webui/apps/rag/utils.py
     collection_name: str,
@@ -125,6 +202,54 @@ def get_doc(collection_name: str, user: UserModel = None):
         raise e
 
 
+def query_doc_by_embeddings(
+    collection_name: str, query_embeddings: list[list[float]], k: int
+) -> list[dict]:
+    """
+    Searches the collection for every query embedding, with a single request if the
+    vector DB supports searching multiple vectors. Returns one result per embedding.
+    """
+
+    def split_result(result) -> list[dict]:
+        if result is None:
+            return []
+        return [
+            {
+                "distances": [result.distances[idx]],
+                "documents": [result.documents[idx]],
+                "metadatas": [result.metadatas[idx]],
+            }
+            for idx in range(len(result.ids))
+        ]
+
+    results = split_result(
+        VECTOR_DB_CLIENT.search(
+            collection_name=collection_name, vectors=query_embeddings, limit=k
+        )
+    )
+
+    # Some vector DBs only search for the first vector
+    for query_embedding in query_embeddings[len(results) :]:
+        result = split_result(
+            VECTOR_DB_CLIENT.search(
+                collection_name=collection_name, vectors=[query_embedding], limit=k
+            )
+        )
+        results.extend(
+            result[:1] or [{"distances": [[]], "documents": [[]], "metadatas": [[]]}]
+        )
+
+    log.info(f"query_doc_by_embeddings:result {collection_name} {len(results)}")
+    return results
+
+
+def map_concurrently(func, args: list) -> list:
+    if len(args) <= 1:
+        return [func(arg) for arg in args]
+
+    return list(QUERY_COLLECTIONS_EXECUTOR.map(func, args))
+
+
 def query_doc_with_hybrid_search(
     collection_name: str,
     query: str,
@@ -132,15 +257,10 @@ def query_doc_with_hybrid_search(
     k: int,
     reranking_function,
     r: float,
+    embedding_config: Optional[dict] = None,
 ) -> dict:
     try:
-        result = VECTOR_DB_CLIENT.get(collection_name=collection_name)
-
-        bm25_retriever = BM25Retriever.from_texts(
-            texts=result.documents[0],
-            metadatas=result.metadatas[0],
-        )
-        bm25_retriever.k = k
+        bm25_retriever = get_bm25_retriever(collection_name, k)
 
         vector_search_retriever = VectorSearchRetriever(
             collection_name=collection_name,
@@ -156,6 +276,8 @@ def query_doc_with_hybrid_search(
             top_n=k,
             reranking_function=reranking_function,
             r_score=r,
+            collection_name=collection_name,
+            embedding_config=embedding_config,
         )
 
         compression_retriever = ContextualCompressionRetriever(
@@ -285,30 +407,50 @@ def query_collection(
     embedding_function,
     k: int,
 ) -> dict:
+    collection_names = [name for name in collection_names if name]
+    if not queries or not collection_names:
+        return merge_and_sort_query_results([], k=k)
+
+    cache_key = RETRIEVAL_CACHE.get_key(
+        collection_names, queries, k=k, hybrid_search=False
+    )
+    cached_result = RETRIEVAL_CACHE.get(cache_key)
+    if cached_result is not None:
+        return cached_result
+
+    # One batched embedding request for all the queries
+    query_embeddings = embedding_function(queries)
+
+    def search_collection(collection_name):
+        try:
+            return query_doc_by_embeddings(
+                collection_name=collection_name,
+                query_embeddings=query_embeddings,
+                k=k,
+            )
+        except Exception as e:
+            log.exception(f"Error when querying the collection: {e}")
+            return None
+
     results = []
-    for query in queries:
-        query_embedding = embedding_function(query)
-        for collection_name in collection_names:
-            if collection_name:
-                try:
-                    result = query_doc(
-                        collection_name=collection_name,
-                        k=k,
-                        query_embedding=query_embedding,
-                    )
-                    if result is not None:
-                        results.append(result.model_dump())
-                except Exception as e:
-                    log.exception(f"Error when querying the collection: {e}")
-            else:
-                pass
+    error = False
+    for collection_results in map_concurrently(search_collection, collection_names):
+        if collection_results is None:
+            error = True
+        else:
+            results.extend(collection_results)
 
     if VECTOR_DB == "chroma":
         # Chroma uses unconventional cosine similarity, so we don't need to reverse the results
         # https://docs.trychroma.com/docs/collections/configure#configuring-chroma-collections
-        return merge_and_sort_query_results(results, k=k, reverse=False)
+        result = merge_and_sort_query_results(results, k=k, reverse=False)
     else:
-        return merge_and_sort_query_results(results, k=k, reverse=True)
+        result = merge_and_sort_query_results(results, k=k, reverse=True)
+
+    # Partial results are returned, but not cached
+    if not error:
+        RETRIEVAL_CACHE.set(cache_key, result)
+    return result
 
 
 def query_collection_with_hybrid_search(
@@ -318,26 +460,53 @@ def query_collection_with_hybrid_search(
     k: int,
     reranking_function,
     r: float,
+    embedding_config: Optional[dict] = None,
 ) -> dict:
-    results = []
-    error = False
-    for collection_name in collection_names:
+    cache_key = RETRIEVAL_CACHE.get_key(
+        collection_names, queries, k=k, r=r, hybrid_search=True
+    )
+    cached_result = RETRIEVAL_CACHE.get(cache_key)
+    if cached_result is not None:
+        return cached_result
+
+    # Embed all the queries with one batched request up front
+    query_embeddings = (
+        dict(zip(queries, embedding_function(queries))) if queries else {}
+    )
+
+    # Callers' embedding functions take the query only, the user is bound in them
+    def cached_embedding_function(query):
+        if isinstance(query, str) and query in query_embeddings:
+            return query_embeddings[query]
+        return embedding_function(query)
+
+    def search_collection(args):
+        collection_name, query = args
         try:
-            for query in queries:
-                result = query_doc_with_hybrid_search(
-                    collection_name=collection_name,
-                    query=query,
-                    embedding_function=embedding_function,
-                    k=k,
-                    reranking_function=reranking_function,
-                    r=r,
-                )
-                results.append(result)
+            return query_doc_with_hybrid_search(
+                collection_name=collection_name,
+                query=query,
+                embedding_function=cached_embedding_function,
+                k=k,
+                reranking_function=reranking_function,
+                r=r,
+                embedding_config=embedding_config,
+            )
         except Exception as e:
             log.exception(
                 "Error when querying the collection with " f"hybrid_search: {e}"
             )
-            error = True
+            return None
+
+    results = map_concurrently(
+        search_collection,
+        [
+            (collection_name, query)
+            for collection_name in collection_names
+            for query in queries
+        ],
+    )
+    error = any(result is None for result in results)
 
     if error:
         raise Exception(
@@ -347,9 +516,12 @@ def query_collection_with_hybrid_search(
     if VECTOR_DB == "chroma":
         # Chroma uses unconventional cosine similarity, so we don't need to reverse the results
         # https://docs.trychroma.com/docs/collections/configure#configuring-chroma-collections
-        return merge_and_sort_query_results(results, k=k, reverse=False)
+        result = merge_and_sort_query_results(results, k=k, reverse=False)
     else:
-        return merge_and_sort_query_results(results, k=k, reverse=True)
+        result = merge_and_sort_query_results(results, k=k, reverse=True)
+
+    RETRIEVAL_CACHE.set(cache_key, result)
+    return result
 
 
 def get_embedding_function(
@@ -361,7 +533,7 @@ def get_embedding_function(
     embedding_batch_size,
 ):
     if embedding_engine == "":
-        return lambda query, user=None: embedding_function.encode(query).tolist()
+        generate = lambda query, user=None: embedding_function.encode(query).tolist()
     elif embedding_engine in ["ollama", "openai"]:
         func = lambda query, user=None: generate_embeddings(
             engine=embedding_engine,
@@ -374,19 +546,47 @@ def get_embedding_function(
 
         def generate_multiple(query, user, func):
             if isinstance(query, list):
+                # Batches are sent concurrently over pooled connections
                 embeddings = []
-                for i in range(0, len(query), embedding_batch_size):
-                    embeddings.extend(
-                        func(query[i : i + embedding_batch_size], user=user)
-                    )
+                for batch_embeddings in EMBEDDING_CLIENT.map(
+                    lambda batch: func(batch, user=user),
+                    [
+                        query[i : i + embedding_batch_size]
+                        for i in range(0, len(query), embedding_batch_size)
+                    ],
+                ):
+                    embeddings.extend(batch_embeddings)
                 return embeddings
             else:
                 return func(query, user)
 
-        return lambda query, user=None: generate_multiple(query, user, func)
+        generate = lambda query, user=None: generate_multiple(query, user, func)
     else:
         raise ValueError(f"Unknown embedding engine: {embedding_engine}")
 
+    if EMBEDDING_CACHE is None:
+        return generate
+
+    # Servers can host different weights under the same model name
+    cache_engine = (
+        f"{embedding_engine}:{(url or '').rstrip('/')}"
+        if embedding_engine in ["ollama", "openai"]
+        else embedding_engine
+    )
+
+    def generate_cached(query, user=None):
+        embeddings = EMBEDDING_CACHE.get_embeddings(
+            cache_engine,
+            embedding_model,
+            [query] if isinstance(query, str) else query,
+            lambda texts: generate(texts, user=user),
+        )
+        if isinstance(query, str) and embeddings is not None:
+            return embeddings[0]
+        return embeddings
+
+    return generate_cached
+
 
 def get_sources_from_files(
     files,
@@ -397,6 +597,7 @@ def get_sources_from_files(
     r,
     hybrid_search,
     full_context=False,
+    embedding_config=None,
 ):
     log.debug(
         f"files: {files} {queries} {embedding_function} {reranking_function} {full_context}"
@@ -494,6 +695,7 @@ def get_sources_from_files(
                                     k=k,
                                     reranking_function=reranking_function,
                                     r=r,
+                                    embedding_config=embedding_config,
                                 )
                             except Exception as e:
                                 log.debug(
@@ -629,6 +831,41 @@ def get_model_path(model: str, update_model: bool = False):
         return model
 
 
+def get_embedding_headers(key: str = "", user: UserModel = None) -> dict:
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {key}",
+        **(
+            {
+                "X-OpenWebUI-User-Name": user.name,
+                "X-OpenWebUI-User-Id": user.id,
+                "X-OpenWebUI-User-Email": user.email,
+                "X-OpenWebUI-User-Role": user.role,
+            }
+            if ENABLE_FORWARD_USER_INFO_HEADERS and user
+            else {}
+        ),
+    }
+
+
+def get_embedding_request(
+    engine: str, model: str, texts: list[str], url: str
+) -> tuple[str, dict]:
+    if engine == "ollama":
+        return f"{url}/api/embed", {"input": texts, "model": model}
+    else:
+        return f"{url}/embeddings", {"input": texts, "model": model}
+
+
+def parse_embedding_response(engine: str, data: dict) -> list[list[float]]:
+    if engine == "ollama":
+        if "embeddings" in data:
+            return data["embeddings"]
+    elif "data" in data:
+        return [elem["embedding"] for elem in data["data"]]
+    raise ValueError("Something went wrong :/")
+
+
 def generate_openai_batch_embeddings(
     model: str,
     texts: list[str],
@@ -637,30 +874,11 @@ def generate_openai_batch_embeddings(
     user: UserModel = None,
 ) -> Optional[list[list[float]]]:
     try:
-        r = requests.post(
-            f"{url}/embeddings",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {key}",
-                **(
-                    {
-                        "X-OpenWebUI-User-Name": user.name,
-                        "X-OpenWebUI-User-Id": user.id,
-                        "X-OpenWebUI-User-Email": user.email,
-                        "X-OpenWebUI-User-Role": user.role,
-                    }
-                    if ENABLE_FORWARD_USER_INFO_HEADERS and user
-                    else {}
-                ),
-            },
-            json={"input": texts, "model": model},
+        request_url, payload = get_embedding_request("openai", model, texts, url)
+        data = EMBEDDING_CLIENT.post(
+            request_url, get_embedding_headers(key, user), payload
         )
-        r.raise_for_status()
-        data = r.json()
-        if "data" in data:
-            return [elem["embedding"] for elem in data["data"]]
-        else:
-            raise "Something went wrong :/"
+        return parse_embedding_response("openai", data)
     except Exception as e:
         print(e)
         return None
@@ -670,31 +888,11 @@ def generate_ollama_batch_embeddings(
     model: str, texts: list[str], url: str, key: str = "", user: UserModel = None
 ) -> Optional[list[list[float]]]:
     try:
-        r = requests.post(
-            f"{url}/api/embed",
-            headers={
-                "Content-Type": "application/json",
-                "Authorization": f"Bearer {key}",
-                **(
-                    {
-                        "X-OpenWebUI-User-Name": user.name,
-                        "X-OpenWebUI-User-Id": user.id,
-                        "X-OpenWebUI-User-Email": user.email,
-                        "X-OpenWebUI-User-Role": user.role,
-                    }
-                    if ENABLE_FORWARD_USER_INFO_HEADERS
-                    else {}
-                ),
-            },
-            json={"input": texts, "model": model},
+        request_url, payload = get_embedding_request("ollama", model, texts, url)
+        data = EMBEDDING_CLIENT.post(
+            request_url, get_embedding_headers(key, user), payload
         )
-        r.raise_for_status()
-        data = r.json()
-
-        if "embeddings" in data:
-            return data["embeddings"]
-        else:
-            raise "Something went wrong :/"
+        return parse_embedding_response("ollama", data)
     except Exception as e:
         print(e)
         return None
@@ -730,32 +928,149 @@ def generate_embeddings(engine: str, model: str, text: Union[str, list[str]], **
         return embeddings[0] if isinstance(text, str) else embeddings
 
 
+async def agenerate_embeddings(
+    engine: str,
+    model: str,
+    text: Union[str, list[str]],
+    url: str = "",
+    key: str = "",
+    user: UserModel = None,
+    batch_size: int = 1,
+):
+    """
+    Async `generate_embeddings` for the remote engines. A list of texts is split into
+    `batch_size` batches, which are sent concurrently.
+    """
+    texts = [text] if isinstance(text, str) else text
+    headers = get_embedding_headers(key, user)
+
+    async def generate_batch(batch):
+        request_url, payload = get_embedding_request(engine, model, batch, url)
+        data = await EMBEDDING_CLIENT.apost(request_url, headers, payload)
+        return parse_embedding_response(engine, data)
+
+    batch_size = max(batch_size, 1)
+    embeddings = []
+    for batch_embeddings in await EMBEDDING_CLIENT.amap(
+        generate_batch,
+        [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)],
+    ):
+        embeddings.extend(batch_embeddings)
+
+    return embeddings[0] if isinstance(text, str) else embeddings
+
+
+import inspect
 import operator
+import time
 from typing import Optional, Sequence
 
+import numpy as np
 from langchain_core.callbacks import Callbacks
 from langchain_core.documents import BaseDocumentCompressor, Document
 
 
+def is_pairwise_reranker(reranking_function) -> bool:
+    """
+    Whether the reranker scores (query, document) pairs like CrossEncoder and ColBERT,
+    rather than taking the query and the documents like the API rerankers.
+    """
+    return "sentences" in inspect.signature(reranking_function.predict).parameters
+
+
 class RerankCompressor(BaseDocumentCompressor):
     embedding_function: Any
     top_n: int
     reranking_function: Any
     r_score: float
+    # Collection the documents were retrieved from, to reuse their stored vectors
+    collection_name: Optional[str] = None
+    # Engine and model of `embedding_function`, only the vectors stored with them
+    # are reused
+    embedding_config: Optional[dict] = None
 
     class Config:
         extra = "forbid"
         arbitrary_types_allowed = True
 
+    def predict_scores(self, query: str, documents: Sequence[Document]) -> list:
+        # Pairs are padded to the longest one of their batch, so the documents are
+        # sorted by length to batch the ones of similar lengths together
+        order = sorted(
+            range(len(documents)), key=lambda idx: len(documents[idx].page_content)
+        )
+        sorted_scores = self.reranking_function.predict(
+            [(query, documents[idx].page_content) for idx in order],
+            batch_size=RAG_RERANKING_BATCH_SIZE,
+        )
+
+        scores = [0.0] * len(documents)
+        for idx, score in zip(order, sorted_scores):
+            scores[idx] = float(score)
+        return scores
+
+    def has_embedding_config(self, doc: Document) -> bool:
+        """Returns whether the stored vector of `doc` was made by `embedding_function`."""
+        config = doc.metadata.get("embedding_config")
+        if self.embedding_config is None or config is None:
+            return False
+        try:
+            # save_docs_to_vector_db stores it as JSON
+            if isinstance(config, str):
+                config = json.loads(config)
+        except ValueError:
+            return False
+        return config == self.embedding_config
+
+    def get_document_embeddings(
+        self, documents: Sequence[Document], dimension: int
+    ) -> list:
+        """
+        Returns the embeddings of `documents`, reusing the vectors stored in the vector
+        DB by the current embedding model and only embedding the other documents.
+        """
+        stored = {}
+        ids = [doc.id for doc in documents if doc.id and self.has_embedding_config(doc)]
+        if self.collection_name and ids:
+            try:
+                stored = VECTOR_DB_CLIENT.get_vectors(self.collection_name, ids)
+            except Exception as e:
+                log.warning(
+                    f"Failed to get the vectors of {self.collection_name}, embedding the documents: {e}"
+                )
+
+        embeddings = []
+        for doc in documents:
+            vector = stored.get(doc.id) if doc.id else None
+            # pgvector pads the vectors with zeros
+            if vector is not None and len(vector) >= dimension:
+                if not any(vector[dimension:]):
+                    embeddings.append(vector[:dimension])
+                    continue
+            embeddings.append(None)
+
+        missing = [idx for idx, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            generated = self.embedding_function(
+                [documents[idx].page_content for idx in missing]
+            )
+            for idx, embedding in zip(missing, generated):
+                embeddings[idx] = embedding
+        return embeddings
+
     def compress_documents(
         self,
         documents: Sequence[Document],
         query: str,
         callbacks: Optional[Callbacks] = None,
     ) -> Sequence[Document]:
+        if not documents:
+            return []
+
+        start_time = time.perf_counter()
         reranking = self.reranking_function is not None
 
-        if reranking:
+        if reranking and not is_pairwise_reranker(self.reranking_function):
             docs_with_scores = self.reranking_function.predict(
                 query=query,
                 docs=documents,
@@ -763,20 +1078,35 @@ class RerankCompressor(BaseDocumentCompressor):
                 r_score=self.r_score,
             )
         else:
-            from sentence_transformers import util
-
-            query_embedding = self.embedding_function(query)
-            document_embedding = self.embedding_function(
-                [doc.page_content for doc in documents]
-            )
-            scores = util.cos_sim(query_embedding, document_embedding)[0]
+            if reranking:
+                scores = self.predict_scores(query, documents)
+            else:
+                query_embedding = np.asarray(
+                    self.embedding_function(query), dtype=np.float32
+                )
+                document_embeddings = np.asarray(
+                    self.get_document_embeddings(documents, len(query_embedding)),
+                    dtype=np.float32,
+                )
+                norms = np.linalg.norm(document_embeddings, axis=1) * np.linalg.norm(
+                    query_embedding
+                )
+                scores = (
+                    document_embeddings @ query_embedding / np.maximum(norms, 1e-12)
+                ).tolist()
 
-            docs_with_scores = list(zip(documents, scores.tolist()))
+            docs_with_scores = list(zip(documents, scores))
             if self.r_score:
                 docs_with_scores = [
                     (d, s) for d, s in docs_with_scores if s >= self.r_score
                 ]
 
+        log.info(
+            f"Reranked {len(documents)} documents of {self.collection_name} "
+            f"{'with the reranking model' if reranking else 'by cosine similarity'} "
+            f"in {(time.perf_counter() - start_time) * 1000:.1f} ms"
+        )
+
         result = sorted(docs_with_scores, key=operator.itemgetter(1), reverse=True)
         final_results = []
         for doc, doc_score in result[: self.top_n]:
@@ -1,4 +1,12 @@
+import logging
+
 from open_webui.config import VECTOR_DB
+from open_webui.env import SRC_LOG_LEVELS
+from open_webui.models.bm25_index import BM25Index
+from open_webui.models.collection_versions import CollectionVersions
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
 
 if VECTOR_DB == "milvus":
     from open_webui.retrieval.vector.dbs.milvus import MilvusClient
@@ -20,3 +28,87 @@ else:
     from open_webui.retrieval.vector.dbs.chroma import ChromaClient
 
     VECTOR_DB_CLIENT = ChromaClient()
+
+
+class SparseIndexedClient:
+    """
+    Forwards everything to the vector DB client, and applies the writes to the BM25
+    index of the collection as well (if it is indexed, see `BM25IndexTable`).
+
+    Every write also bumps the version of the collection, which invalidates the
+    results cached for it (see `RetrievalCache`).
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+    def _update_index(self, func, collection_name, *args, **kwargs):
+        try:
+            func(collection_name, *args, **kwargs)
+        except Exception as e:
+            # Drop the index rather than serve stale results, it is rebuilt when needed
+            log.exception(f"Failed to update the BM25 index of {collection_name}: {e}")
+            BM25Index.delete_collection(collection_name)
+
+    def _bump_version(self, collection_name=None):
+        # After the write, so that a result cached under the new version is up to date
+        try:
+            if collection_name is None:
+                CollectionVersions.bump_all()
+            else:
+                CollectionVersions.bump(collection_name)
+        except Exception as e:
+            log.exception(f"Failed to bump the version of {collection_name}: {e}")
+
+    def insert(self, collection_name: str, items: list):
+        try:
+            result = self.client.insert(collection_name=collection_name, items=items)
+            self._update_index(BM25Index.add_items, collection_name, items)
+        finally:
+            self._bump_version(collection_name)
+        return result
+
+    def upsert(self, collection_name: str, items: list):
+        try:
+            result = self.client.upsert(collection_name=collection_name, items=items)
+            self._update_index(
+                BM25Index.add_items, collection_name, items, replace=True
+            )
+        finally:
+            self._bump_version(collection_name)
+        return result
+
+    def delete(self, collection_name: str, **kwargs):
+        try:
+            result = self.client.delete(collection_name=collection_name, **kwargs)
+            self._update_index(
+                BM25Index.delete_items,
+                collection_name,
+                ids=kwargs.get("ids"),
+                filter=kwargs.get("filter"),
+            )
+        finally:
+            self._bump_version(collection_name)
+        return result
+
+    def delete_collection(self, collection_name: str):
+        try:
+            result = self.client.delete_collection(collection_name=collection_name)
+            BM25Index.delete_collection(collection_name)
+        finally:
+            self._bump_version(collection_name)
+        return result
+
+    def reset(self):
+        try:
+            result = self.client.reset()
+            BM25Index.reset()
+        finally:
+            self._bump_version()
+        return result
+
+
+VECTOR_DB_CLIENT = SparseIndexedClient(VECTOR_DB_CLIENT)
@@ -153,6 +153,18 @@ class OpenSearchClient:
         )
         return self._result_to_get_result(result)
 
+    def get_vectors(self, index_name: str, ids: list[str]) -> dict:
+        result = self.client.mget(
+            index=f"{self.index_prefix}_{index_name}",
+            body={"ids": ids},
+            _source=["vector"],
+        )
+        return {
+            doc["_id"]: doc["_source"]["vector"]
+            for doc in result["docs"]
+            if doc.get("found")
+        }
+
     def insert(self, index_name: str, items: list[VectorItem]):
         if not self.has_index(index_name):
             self._create_index(index_name, dimension=len(items[0]["vector"]))
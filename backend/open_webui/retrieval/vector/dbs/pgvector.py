@@ -337,6 +337,20 @@ class PgvectorClient:
             print(f"Error during get: {e}")
             return None
 
+    def get_vectors(self, collection_name: str, ids: List[str]) -> Dict[str, Any]:
+        try:
+            results = (
+                self.session.query(DocumentChunk.id, DocumentChunk.vector)
+                .filter(DocumentChunk.collection_name == collection_name)
+                .filter(DocumentChunk.id.in_(ids))
+                .all()
+            )
+            # Vectors are padded with zeros to VECTOR_LENGTH
+            return {id: list(vector) for id, vector in results if vector is not None}
+        except Exception as e:
+            print(f"Error during get_vectors: {e}")
+            return {}
+
     def delete(
         self,
         collection_name: str,
@@ -131,6 +131,16 @@ class QdrantClient:
         )
         return self._result_to_get_result(points.points)
 
+    def get_vectors(self, collection_name: str, ids: list[str]) -> dict:
+        # Get the vectors of the items with the given ids.
+        points = self.client.retrieve(
+            collection_name=f"{self.collection_prefix}_{collection_name}",
+            ids=ids,
+            with_payload=False,
+            with_vectors=True,
+        )
+        return {str(point.id): point.vector for point in points}
+
     def insert(self, collection_name: str, items: list[VectorItem]):
         # Insert the items into the collection, if the collection does not exist, it will be created.
         self._create_collection_if_not_exists(collection_name, len(items[0]["vector"]))
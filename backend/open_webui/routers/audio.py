@@ -1,15 +1,14 @@
-import hashlib
 import json
 import logging
 import os
 import uuid
 from functools import lru_cache
 from pathlib import Path
+from typing import Optional
 from pydub import AudioSegment
 from pydub.silence import split_on_silence
 
 import aiohttp
-import aiofiles
 import requests
 import mimetypes
 
@@ -23,12 +22,15 @@ from fastapi import (
     status,
     APIRouter,
 )
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel
+from starlette.background import BackgroundTask
 
 
 from open_webui.utils.auth import get_admin_user, get_verified_user
+from open_webui.utils.speech_cache import SPEECH_CACHE
 from open_webui.config import (
     WHISPER_MODEL_AUTO_UPDATE,
     WHISPER_MODEL_DIR,
@@ -54,9 +56,6 @@ MAX_FILE_SIZE = MAX_FILE_SIZE_MB * 1024 * 1024  # Convert MB to bytes
 log = logging.getLogger(__name__)
 log.setLevel(SRC_LOG_LEVELS["AUDIO"])
 
-SPEECH_CACHE_DIR = Path(CACHE_DIR).joinpath("./audio/speech/")
-SPEECH_CACHE_DIR.mkdir(parents=True, exist_ok=True)
-
 
 ##########################################
 #
@@ -239,202 +238,162 @@ def load_speech_pipeline(request):
         )
 
 
-@router.post("/speech")
-async def speech(request: Request, user=Depends(get_verified_user)):
-    body = await request.body()
-    name = hashlib.sha256(
-        body
-        + str(request.app.state.config.TTS_ENGINE).encode("utf-8")
-        + str(request.app.state.config.TTS_MODEL).encode("utf-8")
-    ).hexdigest()
-
-    file_path = SPEECH_CACHE_DIR.joinpath(f"{name}.mp3")
-    file_body_path = SPEECH_CACHE_DIR.joinpath(f"{name}.json")
+async def cleanup_response(
+    response: Optional[aiohttp.ClientResponse],
+    session: Optional[aiohttp.ClientSession],
+):
+    if response:
+        response.close()
+    if session:
+        await session.close()
 
-    # Check if the file already exists in the cache
-    if file_path.is_file():
-        return FileResponse(file_path)
 
-    payload = None
+async def stream_speech(key: str, meta: dict, url: str, **kwargs):
+    """
+    Sends a request to a TTS engine and streams the audio back as it arrives, so
+    playback starts with the first bytes. The clip is cached once complete.
+    """
+    r = None
+    session = None
     try:
-        payload = json.loads(body.decode("utf-8"))
+        timeout = aiohttp.ClientTimeout(total=AIOHTTP_CLIENT_TIMEOUT)
+        session = aiohttp.ClientSession(timeout=timeout, trust_env=True)
+        r = await session.post(url, **kwargs)
+        r.raise_for_status()
     except Exception as e:
         log.exception(e)
-        raise HTTPException(status_code=400, detail="Invalid JSON payload")
-
-    if request.app.state.config.TTS_ENGINE == "openai":
-        payload["model"] = request.app.state.config.TTS_MODEL
+        detail = None
 
         try:
-            # print(payload)
-            timeout = aiohttp.ClientTimeout(total=AIOHTTP_CLIENT_TIMEOUT)
-            async with aiohttp.ClientSession(
-                timeout=timeout, trust_env=True
-            ) as session:
-                async with session.post(
-                    url=f"{request.app.state.config.TTS_OPENAI_API_BASE_URL}/audio/speech",
-                    json=payload,
-                    headers={
-                        "Content-Type": "application/json",
-                        "Authorization": f"Bearer {request.app.state.config.TTS_OPENAI_API_KEY}",
-                        **(
-                            {
-                                "X-OpenWebUI-User-Name": user.name,
-                                "X-OpenWebUI-User-Id": user.id,
-                                "X-OpenWebUI-User-Email": user.email,
-                                "X-OpenWebUI-User-Role": user.role,
-                            }
-                            if ENABLE_FORWARD_USER_INFO_HEADERS
-                            else {}
-                        ),
-                    },
-                ) as r:
-                    r.raise_for_status()
-
-                    async with aiofiles.open(file_path, "wb") as f:
-                        await f.write(await r.read())
-
-                    async with aiofiles.open(file_body_path, "w") as f:
-                        await f.write(json.dumps(payload))
-
-            return FileResponse(file_path)
-
-        except Exception as e:
-            log.exception(e)
-            detail = None
-
-            try:
-                if r.status != 200:
-                    res = await r.json()
+            if r.status != 200:
+                res = await r.json()
+                if "error" in res:
+                    detail = f"External: {res['error'].get('message', '')}"
+        except Exception:
+            detail = f"External: {e}"
 
-                    if "error" in res:
-                        detail = f"External: {res['error'].get('message', '')}"
-            except Exception:
-                detail = f"External: {e}"
+        await cleanup_response(r, session)
+        raise HTTPException(
+            status_code=getattr(r, "status", 500),
+            detail=detail if detail else "Open WebUI: Server Connection Error",
+        )
 
-            raise HTTPException(
-                status_code=getattr(r, "status", 500),
-                detail=detail if detail else "Open WebUI: Server Connection Error",
-            )
+    content_type = r.headers.get("Content-Type", "audio/mpeg")
+    return StreamingResponse(
+        SPEECH_CACHE.stream_to_file(key, r.content.iter_any(), content_type, **meta),
+        media_type=content_type,
+        background=BackgroundTask(cleanup_response, response=r, session=session),
+    )
 
-    elif request.app.state.config.TTS_ENGINE == "elevenlabs":
-        voice_id = payload.get("voice", "")
 
-        if voice_id not in get_available_voices(request):
-            raise HTTPException(
-                status_code=400,
-                detail="Invalid voice id",
-            )
+@router.post("/speech")
+async def speech(request: Request, user=Depends(get_verified_user)):
+    body = await request.body()
 
-        try:
-            timeout = aiohttp.ClientTimeout(total=AIOHTTP_CLIENT_TIMEOUT)
-            async with aiohttp.ClientSession(
-                timeout=timeout, trust_env=True
-            ) as session:
-                async with session.post(
-                    f"https://api.elevenlabs.io/v1/text-to-speech/{voice_id}",
-                    json={
-                        "text": payload["input"],
-                        "model_id": request.app.state.config.TTS_MODEL,
-                        "voice_settings": {"stability": 0.5, "similarity_boost": 0.5},
-                    },
-                    headers={
-                        "Accept": "audio/mpeg",
-                        "Content-Type": "application/json",
-                        "xi-api-key": request.app.state.config.TTS_API_KEY,
-                    },
-                ) as r:
-                    r.raise_for_status()
-
-                    async with aiofiles.open(file_path, "wb") as f:
-                        await f.write(await r.read())
-
-                    async with aiofiles.open(file_body_path, "w") as f:
-                        await f.write(json.dumps(payload))
-
-            return FileResponse(file_path)
+    payload = None
+    try:
+        payload = json.loads(body.decode("utf-8"))
+    except Exception as e:
+        log.exception(e)
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
 
-        except Exception as e:
-            log.exception(e)
-            detail = None
+    # Only what changes the audio is part of the cache key
+    engine = request.app.state.config.TTS_ENGINE
+    model = request.app.state.config.TTS_MODEL
+    voice = ""
+    options = {}
+    if engine == "openai":
+        voice = payload.get("voice", "")
+        options = {
+            k: v for k, v in payload.items() if k not in ("model", "input", "voice")
+        }
+    elif engine == "elevenlabs":
+        voice = payload.get("voice", "")
+    elif engine == "azure":
+        voice = request.app.state.config.TTS_VOICE
+        options = {
+            "output_format": request.app.state.config.TTS_AZURE_SPEECH_OUTPUT_FORMAT
+        }
 
-            try:
-                if r.status != 200:
-                    res = await r.json()
-                    if "error" in res:
-                        detail = f"External: {res['error'].get('message', '')}"
-            except Exception:
-                detail = f"External: {e}"
+    key = SPEECH_CACHE.get_key(
+        engine, model, voice, str(payload.get("input", "")), **options
+    )
+    meta = {"engine": engine, "model": model, "voice": voice}
+
+    # Check if the clip already exists in the cache
+    cached = await run_in_threadpool(SPEECH_CACHE.get_file, key)
+    if cached:
+        file_path, content_type = cached
+        return FileResponse(file_path, media_type=content_type)
+
+    if engine == "openai":
+        payload["model"] = model
+
+        return await stream_speech(
+            key,
+            meta,
+            url=f"{request.app.state.config.TTS_OPENAI_API_BASE_URL}/audio/speech",
+            json=payload,
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": f"Bearer {request.app.state.config.TTS_OPENAI_API_KEY}",
+                **(
+                    {
+                        "X-OpenWebUI-User-Name": user.name,
+                        "X-OpenWebUI-User-Id": user.id,
+                        "X-OpenWebUI-User-Email": user.email,
+                        "X-OpenWebUI-User-Role": user.role,
+                    }
+                    if ENABLE_FORWARD_USER_INFO_HEADERS
+                    else {}
+                ),
+            },
+        )
 
+    elif engine == "elevenlabs":
+        if voice not in get_available_voices(request):
             raise HTTPException(
-                status_code=getattr(r, "status", 500),
-                detail=detail if detail else "Open WebUI: Server Connection Error",
+                status_code=400,
+                detail="Invalid voice id",
             )
 
-    elif request.app.state.config.TTS_ENGINE == "azure":
-        try:
-            payload = json.loads(body.decode("utf-8"))
-        except Exception as e:
-            log.exception(e)
-            raise HTTPException(status_code=400, detail="Invalid JSON payload")
+        return await stream_speech(
+            key,
+            meta,
+            url=f"https://api.elevenlabs.io/v1/text-to-speech/{voice}",
+            json={
+                "text": payload["input"],
+                "model_id": model,
+                "voice_settings": {"stability": 0.5, "similarity_boost": 0.5},
+            },
+            headers={
+                "Accept": "audio/mpeg",
+                "Content-Type": "application/json",
+                "xi-api-key": request.app.state.config.TTS_API_KEY,
+            },
+        )
 
+    elif engine == "azure":
         region = request.app.state.config.TTS_AZURE_SPEECH_REGION
-        language = request.app.state.config.TTS_VOICE
-        locale = "-".join(request.app.state.config.TTS_VOICE.split("-")[:1])
-        output_format = request.app.state.config.TTS_AZURE_SPEECH_OUTPUT_FORMAT
+        locale = "-".join(voice.split("-")[:1])
 
-        try:
-            data = f"""<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="{locale}">
-                <voice name="{language}">{payload["input"]}</voice>
+        data = f"""<speak version="1.0" xmlns="http://www.w3.org/2001/10/synthesis" xml:lang="{locale}">
+                <voice name="{voice}">{payload["input"]}</voice>
             </speak>"""
-            timeout = aiohttp.ClientTimeout(total=AIOHTTP_CLIENT_TIMEOUT)
-            async with aiohttp.ClientSession(
-                timeout=timeout, trust_env=True
-            ) as session:
-                async with session.post(
-                    f"https://{region}.tts.speech.microsoft.com/cognitiveservices/v1",
-                    headers={
-                        "Ocp-Apim-Subscription-Key": request.app.state.config.TTS_API_KEY,
-                        "Content-Type": "application/ssml+xml",
-                        "X-Microsoft-OutputFormat": output_format,
-                    },
-                    data=data,
-                ) as r:
-                    r.raise_for_status()
-
-                    async with aiofiles.open(file_path, "wb") as f:
-                        await f.write(await r.read())
-
-                    async with aiofiles.open(file_body_path, "w") as f:
-                        await f.write(json.dumps(payload))
-
-                    return FileResponse(file_path)
-
-        except Exception as e:
-            log.exception(e)
-            detail = None
-
-            try:
-                if r.status != 200:
-                    res = await r.json()
-                    if "error" in res:
-                        detail = f"External: {res['error'].get('message', '')}"
-            except Exception:
-                detail = f"External: {e}"
-
-            raise HTTPException(
-                status_code=getattr(r, "status", 500),
-                detail=detail if detail else "Open WebUI: Server Connection Error",
-            )
 
-    elif request.app.state.config.TTS_ENGINE == "transformers":
-        payload = None
-        try:
-            payload = json.loads(body.decode("utf-8"))
-        except Exception as e:
-            log.exception(e)
-            raise HTTPException(status_code=400, detail="Invalid JSON payload")
+        return await stream_speech(
+            key,
+            meta,
+            url=f"https://{region}.tts.speech.microsoft.com/cognitiveservices/v1",
+            headers={
+                "Ocp-Apim-Subscription-Key": request.app.state.config.TTS_API_KEY,
+                "Content-Type": "application/ssml+xml",
+                "X-Microsoft-OutputFormat": options["output_format"],
+            },
+            data=data,
+        )
 
+    elif engine == "transformers":
         import torch
         import soundfile as sf
 
@@ -444,9 +403,7 @@ async def speech(request: Request, user=Depends(get_verified_user)):
 
         speaker_index = 6799
         try:
-            speaker_index = embeddings_dataset["filename"].index(
-                request.app.state.config.TTS_MODEL
-            )
+            speaker_index = embeddings_dataset["filename"].index(model)
         except Exception:
             pass
 
@@ -459,14 +416,19 @@ async def speech(request: Request, user=Depends(get_verified_user)):
             forward_params={"speaker_embeddings": speaker_embedding},
         )
 
+        file_path = SPEECH_CACHE.get_file_path(key)
         sf.write(file_path, speech["audio"], samplerate=speech["sampling_rate"])
-
-        async with aiofiles.open(file_body_path, "w") as f:
-            await f.write(json.dumps(payload))
+        await run_in_threadpool(SPEECH_CACHE.add_file, key, "audio/mpeg", **meta)
 
         return FileResponse(file_path)
 
 
+@router.get("/speech/cache")
+async def get_speech_cache_stats(user=Depends(get_admin_user)):
+    # Hits and misses are counted per worker
+    return await run_in_threadpool(SPEECH_CACHE.get_stats)
+
+
 def transcribe(request: Request, file_path):
     print("transcribe", file_path)
     filename = os.path.basename(file_path)
@@ -6,9 +6,16 @@ from datetime import time
 from pathlib import Path
 from typing import Optional
 <<<<<<< HEAD:backend/open_webui/apps/webui/routers/files.py
+import asyncio
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import oss2
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
 
 from open_webui.apps.webui.models.files import Files, FileForm, FileModel
@@ -23,6 +30,10 @@ from open_webui.config import (
     OSS_ACCESS_SECRET,
     OSS_ENDPOINT,
     OSS_BUCKET_NAME,
+    OSS_CDN_URL,
+    OSS_UPLOAD_MAX_WORKERS,
+    OSS_MULTIPART_THRESHOLD,
+    OSS_URL_CACHE_SIZE,
     AppConfig,
 )
 from open_webui.constants import ERROR_MESSAGES
@@ -32,6 +43,7 @@ from open_webui.utils.utils import get_verified_user, get_admin_user
 from urllib.parse import quote
 
 from fastapi import APIRouter, Depends, File, HTTPException, Request, UploadFile, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse, StreamingResponse
 from open_webui.constants import ERROR_MESSAGES
 from open_webui.env import SRC_LOG_LEVELS
@@ -42,8 +54,9 @@ from open_webui.models.files import (
     Files,
 )
 from open_webui.routers.retrieval import ProcessFileForm, process_file
-from open_webui.storage.provider import Storage
+from open_webui.storage.provider import STORAGE_CACHE, LocalStorageProvider, Storage
 from open_webui.utils.auth import get_admin_user, get_verified_user
+from open_webui.utils.files import get_file_content_headers, parse_range_header
 from pydantic import BaseModel
 >>>>>>> upstream/main:backend/open_webui/routers/files.py
 
@@ -66,6 +79,14 @@ bucket = oss2.Bucket(
     auth, config.OSS_ENDPOINT, config.OSS_BUCKET_NAME, connect_timeout=10
 )
 
+# OSS 上传在独立线程池中执行，不占用请求线程
+OSS_UPLOAD_EXECUTOR = ThreadPoolExecutor(
+    max_workers=OSS_UPLOAD_MAX_WORKERS, thread_name_prefix="oss_upload"
+)
+
+# 限制排队中的后台任务（缩略图/WebP），队列满时跳过
+OSS_VARIANT_SLOTS = threading.BoundedSemaphore(OSS_UPLOAD_MAX_WORKERS * 4)
+
 ############################
 # Upload File
 ############################
@@ -107,7 +128,8 @@ def upload_file(
         # Insert file record into the database
         file_record = Files.insert_new_file(
 =======
-        contents, file_path = Storage.upload_file(file.file, filename)
+        # Streamed to storage, only its size and hash are kept
+        metadata, file_path = Storage.upload_file(file.file, filename)
 
         file_item = Files.insert_new_file(
 >>>>>>> upstream/main:backend/open_webui/routers/files.py
@@ -124,7 +146,8 @@ def upload_file(
                         "size": file_size,
                         "path": file_path,
 =======
-                        "size": len(contents),
+                        "size": metadata["size"],
+                        "sha256": metadata["sha256"],
                         "data": file_metadata,
 >>>>>>> upstream/main:backend/open_webui/routers/files.py
                     },
@@ -169,70 +192,144 @@ def upload_file(
         )
 
 
-# background Images
-def save_file(file: UploadFile, oss_directory: str) -> dict:
-    log.info(f"file.content_type: {file.content_type}")
+####################
+# 图片上传 (OSS)
+####################
+
+IMAGE_CHUNK_SIZE = 1024 * 1024
+IMAGE_THUMBNAIL_SIZE = 256
+
+# OSS key -> OSS 元信息。文件按内容命名（{sha256}{ext}），同一个 key 的内容不会变，
+# 相同内容的图片不再重复上传
+OSS_URL_CACHE: OrderedDict[str, dict] = OrderedDict()
+OSS_URL_CACHE_LOCK = threading.Lock()
+
+
+def get_oss_url(key: str) -> str:
+    base_url = (
+        OSS_CDN_URL
+        or f"https://{config.OSS_BUCKET_NAME}.{config.OSS_ENDPOINT.replace('https://', '')}"
+    )
+    return f"{base_url.rstrip('/')}/{key}"
+
+
+def get_cached_oss_meta(key: str) -> Optional[dict]:
+    with OSS_URL_CACHE_LOCK:
+        oss_meta = OSS_URL_CACHE.get(key)
+        if oss_meta is None:
+            return None
+        OSS_URL_CACHE.move_to_end(key)
+        return dict(oss_meta)
+
+
+def set_cached_oss_meta(key: str, oss_meta: dict):
+    if OSS_URL_CACHE_SIZE <= 0:
+        return
+
+    with OSS_URL_CACHE_LOCK:
+        OSS_URL_CACHE[key] = oss_meta
+        OSS_URL_CACHE.move_to_end(key)
+        while len(OSS_URL_CACHE) > OSS_URL_CACHE_SIZE:
+            OSS_URL_CACHE.popitem(last=False)
+
+
+def write_local_file(source, directory: str, ext: str) -> tuple[str, int, str]:
+    """
+    分块写入本地文件并按内容命名为 {sha256}{ext}，返回文件名、大小和 sha256。
+    同名的不同图片不会互相覆盖，失败时删除不完整的文件
+    """
+    size = 0
+    sha256 = hashlib.sha256()
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
     try:
-        # 获取文件名并拼接 OSS 路径
-        filename = os.path.basename(file.filename)
-        oss_file_path = os.path.join(oss_directory, filename)
+        with os.fdopen(fd, "wb") as f:
+            while chunk := source.read(IMAGE_CHUNK_SIZE):
+                f.write(chunk)
+                size += len(chunk)
+                sha256.update(chunk)
+
+        filename = f"{sha256.hexdigest()}{ext}"
+        os.replace(tmp_path, os.path.join(directory, filename))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return filename, size, sha256.hexdigest()
+
+
+def upload_to_oss(key: str, file_path: str) -> str:
+    # 大文件自动分片上传；公共读通过请求头设置，省去单独的 put_object_acl 请求
+    oss2.resumable_upload(
+        bucket,
+        key,
+        file_path,
+        headers={"x-oss-object-acl": "public-read"},
+        multipart_threshold=OSS_MULTIPART_THRESHOLD * 1024 * 1024,
+    )
+    return get_oss_url(key)
+
+
+def get_image_variants(filename: str) -> dict[str, str]:
+    """缩略图和 WebP 版本的文件名"""
+    stem, ext = os.path.splitext(filename)
+    variants = {"thumbnail": f"{stem}_thumb.webp"}
+    if ext.lower() != ".webp":
+        variants["webp"] = f"{stem}.webp"
+    return variants
+
+
+def create_image_variants(directory: str, filename: str, variants: dict[str, str]):
+    """生成缩略图和 WebP 版本并上传到 OSS，在后台线程中执行"""
+    from PIL import Image
 
-        # 读取文件内容
-        with file.file as source_file:
-            contents = source_file.read()
+    try:
+        with Image.open(os.path.join(directory, filename)) as image:
+            has_alpha = "A" in image.getbands() or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
 
-        with open(oss_file_path, "wb") as f:
-            f.write(contents)
+        if "webp" in variants:
+            image.save(os.path.join(directory, variants["webp"]), "WEBP", quality=85)
+        image.thumbnail((IMAGE_THUMBNAIL_SIZE, IMAGE_THUMBNAIL_SIZE))
+        image.save(os.path.join(directory, variants["thumbnail"]), "WEBP", quality=80)
 
-        # 获取文件元信息
-        file_size = len(contents)
-
-        if config.OSS_ENABLE_STORAGE:
-            # 上传文件到 OSS，带有超时控制
-            bucket.put_object_from_file(filename, oss_file_path)
-
-            # 设置文件为公共读
-            bucket.put_object_acl(filename, "public-read")
-
-            # 生成文件的 URL
-            oss_file_url = f"https://{config.OSS_BUCKET_NAME}.{config.OSS_ENDPOINT.replace('https://', '')}/{filename}"
-
-            log.info(f"File uploaded to OSS: {oss_file_path}, Size: {file_size} bytes")
-
-            # 返回上传结果
-            return {
-                "filename": filename,
-                "meta": {
-                    "name": filename,
-                    "content_type": file.content_type,
-                    "size": file_size,
-                    "path": oss_file_path,
-                    "oss_path": oss_file_path,
-                    "oss_url": oss_file_url,
-                },
-            }
-        else:
-            return {
-                "filename": filename,
-                "meta": {
-                    "name": filename,
-                    "content_type": file.content_type,
-                    "size": len(contents),
-                    "path": oss_file_path,
-                },
-            }
-
-    except oss2.exceptions.RequestError as e:
-        log.error(f"File upload request error: {str(e)}")
-        return {
-            "filename": filename,
-            "meta": {
-                "name": filename,
-                "content_type": file.content_type,
-                "size": len(contents),
-                "path": oss_file_path,
-            },
-        }
+        for variant in variants.values():
+            upload_to_oss(variant, os.path.join(directory, variant))
+    except Exception as e:
+        log.warning(f"Failed to create image variants of {filename}: {e}")
+
+
+def schedule_image_variants(
+    directory: str, filename: str, variants: dict[str, str]
+) -> bool:
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        log.warning("Pillow is not installed, skipping image variants")
+        return False
+
+    if not OSS_VARIANT_SLOTS.acquire(blocking=False):
+        log.warning(f"Too many pending image variants, skipping {filename}")
+        return False
+
+    future = OSS_UPLOAD_EXECUTOR.submit(
+        create_image_variants, directory, filename, variants
+    )
+    future.add_done_callback(lambda _: OSS_VARIANT_SLOTS.release())
+    return True
+
+
+# background Images
+async def save_file(file: UploadFile, oss_directory: str) -> dict:
+    log.info(f"file.content_type: {file.content_type}")
+
+    name = os.path.basename(file.filename)
+    ext = os.path.splitext(name)[1].lower()
+
+    try:
+        # 分块写入本地文件，同时计算 sha256；本地和 OSS 上的文件名都是内容的 sha256
+        filename, file_size, sha256 = await run_in_threadpool(
+            write_local_file, file.file, oss_directory, ext
+        )
     except Exception as e:
         log.exception(e)
         raise HTTPException(
@@ -240,25 +337,75 @@ def save_file(file: UploadFile, oss_directory: str) -> dict:
             detail=f"Error uploading file to OSS: {str(e)}",
         )
 
+    oss_file_path = os.path.join(oss_directory, filename)
+    meta = {
+        "name": name,
+        "content_type": file.content_type,
+        "size": file_size,
+        "sha256": sha256,
+        "path": oss_file_path,
+    }
+    if not config.OSS_ENABLE_STORAGE:
+        return {"filename": filename, "meta": meta}
+
+    # 相同内容的文件已经上传过，直接返回缓存的 URL
+    oss_meta = get_cached_oss_meta(filename)
+    if oss_meta is None:
+        try:
+            # 在上传线程池中上传，不阻塞请求线程
+            oss_file_url = await asyncio.wrap_future(
+                OSS_UPLOAD_EXECUTOR.submit(upload_to_oss, filename, oss_file_path)
+            )
+        except oss2.exceptions.RequestError as e:
+            log.error(f"File upload request error: {str(e)}")
+            return {"filename": filename, "meta": meta}
+        except Exception as e:
+            log.exception(e)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Error uploading file to OSS: {str(e)}",
+            )
+
+        log.info(f"File uploaded to OSS: {oss_file_path}, Size: {file_size} bytes")
+        oss_meta = {"oss_path": oss_file_path, "oss_url": oss_file_url}
+
+        # 缩略图和 WebP 版本在后台生成，完成前对应的 URL 不可用
+        content_type = file.content_type or ""
+        if content_type.startswith("image/") and content_type != "image/svg+xml":
+            variants = get_image_variants(filename)
+            if schedule_image_variants(oss_directory, filename, variants):
+                oss_meta["oss_variants"] = {
+                    name: get_oss_url(variant) for name, variant in variants.items()
+                }
+
+        set_cached_oss_meta(filename, oss_meta)
+
+    # 返回上传结果
+    return {"filename": filename, "meta": {**meta, **oss_meta}}
+
 
 # Model Images
 @router.post("/model/images")
-def upload_model_image(file: UploadFile = File(...), user=Depends(get_admin_user)):
-    return save_file(file, MODEL_IMAGES_DIR)
+async def upload_model_image(
+    file: UploadFile = File(...), user=Depends(get_admin_user)
+):
+    return await save_file(file, MODEL_IMAGES_DIR)
 
 
 # Background Images
 @router.post("/background/images")
-def upload_background_image(
+async def upload_background_image(
     file: UploadFile = File(...), user=Depends(get_verified_user)
 ):
-    return save_file(file, BACKGROUND_IMAGES_DIR)
+    return await save_file(file, BACKGROUND_IMAGES_DIR)
 
 
 # User Images
 @router.post("/user/images")
-def upload_user_image(file: UploadFile = File(...), user=Depends(get_verified_user)):
-    return save_file(file, USER_IMAGES_DIR)
+async def upload_user_image(
+    file: UploadFile = File(...), user=Depends(get_verified_user)
+):
+    return await save_file(file, USER_IMAGES_DIR)
 
 
 ############################
@@ -301,6 +448,20 @@ async def delete_all_files(user=Depends(get_admin_user)):
         )
 
 
+############################
+# Storage Cache
+############################
+
+
+@router.get("/storage/cache")
+async def get_storage_cache_stats(user=Depends(get_admin_user)):
+    if isinstance(Storage, LocalStorageProvider):
+        return {"status": False}
+
+    # Hits and misses are counted per worker
+    return {"status": True, **STORAGE_CACHE.get_stats()}
+
+
 ############################
 # Get File By Id
 ############################
@@ -380,10 +541,59 @@ async def update_file_data_content_by_id(
 ############################
 
 
+async def get_remote_file_content(request: Request, file: FileModel):
+    """
+    Serves the content of a file of a remote storage provider: from its local copy if
+    it is cached and up to date, otherwise streamed from the object, only the range
+    requested (e.g. by PDF viewers) being fetched.
+    """
+    headers, content_type = get_file_content_headers(
+        file.meta.get("name", file.filename), file.meta.get("content_type")
+    )
+    try:
+        info = await run_in_threadpool(Storage.get_file_info, file.path)
+        file_path = STORAGE_CACHE.get_cached_file(info["local_path"], info["etag"])
+        if file_path:
+            return FileResponse(file_path, headers=headers, media_type=content_type)
+
+        size = info["size"]
+        byte_range = parse_range_header(request.headers.get("range"), size)
+        headers = {**headers, "Accept-Ranges": "bytes", "ETag": info["etag"]}
+        if byte_range is None:
+            status_code = status.HTTP_200_OK
+            start, end = 0, size - 1
+        else:
+            status_code = status.HTTP_206_PARTIAL_CONTENT
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+
+        return StreamingResponse(
+            Storage.stream_file(file.path, start, end) if size else iter([]),
+            status_code=status_code,
+            headers=headers,
+            media_type=content_type,
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        log.exception(e)
+        log.error("Error getting file content")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=ERROR_MESSAGES.DEFAULT("Error getting file content"),
+        )
+
+
 @router.get("/{id}/content")
-async def get_file_content_by_id(id: str, user=Depends(get_verified_user)):
+async def get_file_content_by_id(
+    id: str, request: Request, user=Depends(get_verified_user)
+):
     file = Files.get_file_by_id(id)
     if file and (file.user_id == user.id or user.role == "admin"):
+        if not isinstance(Storage, LocalStorageProvider):
+            return await get_remote_file_content(request, file)
+
         try:
             file_path = Storage.get_file(file.path)
             file_path = Path(file_path)
@@ -397,27 +607,9 @@ async def get_file_content_by_id(id: str, user=Depends(get_verified_user)):
 =======
             # Check if the file already exists in the cache
             if file_path.is_file():
-                # Handle Unicode filenames
-                filename = file.meta.get("name", file.filename)
-                encoded_filename = quote(filename)  # RFC5987 encoding
-
-                content_type = file.meta.get("content_type")
-                filename = file.meta.get("name", file.filename)
-                encoded_filename = quote(filename)
-                headers = {}
-
-                if content_type == "application/pdf" or filename.lower().endswith(
-                    ".pdf"
-                ):
-                    headers["Content-Disposition"] = (
-                        f"inline; filename*=UTF-8''{encoded_filename}"
-                    )
-                    content_type = "application/pdf"
-                elif content_type != "text/plain":
-                    headers["Content-Disposition"] = (
-                        f"attachment; filename*=UTF-8''{encoded_filename}"
-                    )
-
+                headers, content_type = get_file_content_headers(
+                    file.meta.get("name", file.filename), file.meta.get("content_type")
+                )
                 return FileResponse(file_path, headers=headers, media_type=content_type)
 
             else:
@@ -22,6 +22,7 @@ from open_webui.storage.provider import Storage
 from open_webui.constants import ERROR_MESSAGES
 from open_webui.utils.auth import get_verified_user
 from open_webui.utils.access_control import has_access, has_permission
+from open_webui.utils.jobs import JobModel, register_job, submit_job
 
 
 from open_webui.env import SRC_LOG_LEVELS
@@ -666,3 +667,82 @@ def add_files_to_knowledge_batch(
     return KnowledgeFilesResponse(
         **knowledge.model_dump(), files=Files.get_files_by_ids(existing_file_ids)
     )
+
+
+############################
+# Background file processing
+############################
+
+
+def check_knowledge_write_access(id: str, user):
+    knowledge = Knowledges.get_knowledge_by_id(id=id)
+    if not knowledge:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=ERROR_MESSAGES.NOT_FOUND,
+        )
+
+    if (
+        knowledge.user_id != user.id
+        and not has_access(user.id, "write", knowledge.access_control)
+        and user.role != "admin"
+    ):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=ERROR_MESSAGES.ACCESS_PROHIBITED,
+        )
+
+
+@register_job("add_file_to_knowledge")
+def add_file_to_knowledge_job(request: Request, user, id: str, file_id: str) -> dict:
+    add_file_to_knowledge_by_id(
+        request, id, KnowledgeFileIdForm(file_id=file_id), user=user
+    )
+    return {"knowledge_id": id, "file_ids": [file_id]}
+
+
+@router.post("/{id}/file/add/job", response_model=JobModel)
+async def add_file_to_knowledge_in_background(
+    id: str,
+    form_data: KnowledgeFileIdForm,
+    user=Depends(get_verified_user),
+):
+    """
+    Queues `/{id}/file/add` and returns the job immediately, poll
+    `/retrieval/jobs/{id}` or listen to "ingestion-events" for its outcome.
+    """
+    check_knowledge_write_access(id, user)
+    return await submit_job(
+        "add_file_to_knowledge", user.id, {"id": id, "file_id": form_data.file_id}
+    )
+
+
+@register_job("add_files_to_knowledge")
+def add_files_to_knowledge_job(
+    request: Request, user, id: str, file_ids: list[str]
+) -> dict:
+    response = add_files_to_knowledge_batch(
+        request,
+        id,
+        [KnowledgeFileIdForm(file_id=file_id) for file_id in file_ids],
+        user=user,
+    )
+    return {
+        "knowledge_id": id,
+        "file_ids": (response.data or {}).get("file_ids", []),
+        "warnings": getattr(response, "warnings", None),
+    }
+
+
+@router.post("/{id}/files/batch/add/job", response_model=JobModel)
+async def add_files_to_knowledge_batch_in_background(
+    id: str,
+    form_data: list[KnowledgeFileIdForm],
+    user=Depends(get_verified_user),
+):
+    check_knowledge_write_access(id, user)
+    return await submit_job(
+        "add_files_to_knowledge",
+        user.id,
+        {"id": id, "file_ids": [form.file_id for form in form_data]},
+    )
@@ -1,3 +1,4 @@
+import itertools
 import json
 import logging
 import mimetypes
@@ -23,14 +24,16 @@ from fastapi import (
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
+import anyio
 import tiktoken
 
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter, TokenTextSplitter
 from langchain_core.documents import Document
 
 from open_webui.models.files import FileModel, Files
+from open_webui.socket.main import emit_to_user
 from open_webui.models.knowledge import Knowledges
+from open_webui.models.collection_versions import CollectionVersions
 from open_webui.storage.provider import Storage
 
 
@@ -61,6 +64,15 @@ from open_webui.retrieval.web.bing import search_bing
 from open_webui.retrieval.web.exa import search_exa
 
 
+from open_webui.retrieval.embedding_cache import EMBEDDING_CACHE
+from open_webui.retrieval.retrieval_cache import RETRIEVAL_CACHE
+from open_webui.retrieval.process_pool import (
+    SPLIT_DOCS_PER_TASK,
+    create_text_splitter,
+    get_process_pool,
+    imap,
+    split_documents,
+)
 from open_webui.retrieval.utils import (
     get_embedding_function,
     get_model_path,
@@ -73,6 +85,7 @@ from open_webui.utils.misc import (
     calculate_sha256_string,
 )
 from open_webui.utils.auth import get_admin_user, get_verified_user
+from open_webui.utils.jobs import JobModel, get_job, register_job, submit_job
 
 
 from open_webui.config import (
@@ -88,6 +101,7 @@ from open_webui.env import (
     SRC_LOG_LEVELS,
     DEVICE_TYPE,
     DOCKER,
+    RAG_INGESTION_BATCH_SIZE,
 )
 from open_webui.constants import ERROR_MESSAGES
 
@@ -209,6 +223,34 @@ async def get_embedding_config(request: Request, user=Depends(get_admin_user)):
     }
 
 
+@router.get("/embedding/cache")
+async def get_embedding_cache_stats(user=Depends(get_admin_user)):
+    if EMBEDDING_CACHE is None:
+        return {"status": False}
+
+    # Hits and misses are counted per worker
+    return {"status": True, **EMBEDDING_CACHE.get_stats()}
+
+
+@router.post("/embedding/cache/reset")
+async def reset_embedding_cache(user=Depends(get_admin_user)):
+    if EMBEDDING_CACHE is not None:
+        EMBEDDING_CACHE.clear()
+    return {"status": True}
+
+
+@router.get("/query/cache")
+async def get_retrieval_cache_stats(user=Depends(get_admin_user)):
+    # Results are cached, and counted, per worker
+    return {"status": RETRIEVAL_CACHE.max_size > 0, **RETRIEVAL_CACHE.get_stats()}
+
+
+@router.post("/query/cache/reset")
+async def reset_retrieval_cache(user=Depends(get_admin_user)):
+    RETRIEVAL_CACHE.clear()
+    return {"status": True}
+
+
 @router.get("/reranking")
 async def get_reraanking_config(request: Request, user=Depends(get_admin_user)):
     return {
@@ -288,6 +330,8 @@ async def update_embedding_config(
             ),
             request.app.state.config.RAG_EMBEDDING_BATCH_SIZE,
         )
+        # Results cached by any worker were computed with the previous model
+        CollectionVersions.bump_all()
 
         return {
             "status": True,
@@ -333,6 +377,7 @@ async def update_reranking_config(
         except Exception as e:
             log.error(f"Error loading reranking model: {e}")
             request.app.state.config.ENABLE_RAG_HYBRID_SEARCH = False
+        CollectionVersions.bump_all()
 
         return {
             "status": True,
@@ -704,6 +749,68 @@ async def update_query_settings(
 ####################################
 
 
+def get_text_splitter_config(request: Request) -> tuple:
+    return (
+        request.app.state.config.TEXT_SPLITTER,
+        request.app.state.config.CHUNK_SIZE,
+        request.app.state.config.CHUNK_OVERLAP,
+        str(request.app.state.config.TIKTOKEN_ENCODING_NAME),
+    )
+
+
+def get_text_splitter(request: Request):
+    if request.app.state.config.TEXT_SPLITTER == "token":
+        log.info(
+            f"Using token text splitter: {request.app.state.config.TIKTOKEN_ENCODING_NAME}"
+        )
+
+        tiktoken.get_encoding(str(request.app.state.config.TIKTOKEN_ENCODING_NAME))
+    return create_text_splitter(*get_text_splitter_config(request))
+
+
+def batched(iterable, size: int) -> Iterator[list]:
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def get_chunk_id(collection_name: str, hash: str, index: int) -> str:
+    # Stable across attempts, so a resumed ingestion overwrites instead of duplicating
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{collection_name}/{hash}/{index}"))
+
+
+def get_ingestion_checkpoint(collection_name: str, metadata: dict) -> Optional[dict]:
+    """
+    Returns the checkpoint of an unfinished ingestion of the same file (and content)
+    into `collection_name`, e.g. by a worker that died mid-file. Its "splitter" is the
+    `get_text_splitter_config` the file was chunked with.
+    """
+    file = Files.get_file_by_id(metadata["file_id"])
+    checkpoint = (file.data or {}).get("ingestion") if file else None
+    if (
+        checkpoint
+        and checkpoint.get("collection_name") == collection_name
+        and checkpoint.get("hash") == metadata["hash"]
+    ):
+        return checkpoint
+    return None
+
+
+def emit_ingestion_event(user, data: dict):
+    if user is None:
+        return
+    try:
+        # Ingestion runs in threadpool workers, the socket server on the event loop
+        anyio.from_thread.run(emit_to_user, user.id, "ingestion-events", data)
+    except Exception as e:
+        log.debug(f"Failed to emit ingestion event: {e}")
+
+
 def save_docs_to_vector_db(
     request: Request,
     docs,
@@ -714,6 +821,16 @@ def save_docs_to_vector_db(
     add: bool = False,
     user=None,
 ) -> bool:
+    """
+    Splits, embeds and inserts `docs` as a pipeline of RAG_INGESTION_BATCH_SIZE chunk
+    batches, so only the chunks and vectors of one batch are held at a time. Progress
+    is emitted to `user` as "ingestion-events".
+
+    Files (`metadata` with "file_id" and "hash") are checkpointed after every batch: if
+    the ingestion is interrupted, processing the file again resumes after the last
+    inserted batch.
+    """
+
     def _get_docs_info(docs: list[Document]) -> str:
         docs_info = set()
 
@@ -734,8 +851,35 @@ def save_docs_to_vector_db(
         f"save_docs_to_vector_db: document {_get_docs_info(docs)} {collection_name}"
     )
 
+    resumable = bool(metadata and "file_id" in metadata and "hash" in metadata)
+    checkpoint = (
+        get_ingestion_checkpoint(collection_name, metadata) if resumable else None
+    )
+
+    splitter_config = list(get_text_splitter_config(request)) if split else None
+    embedding_config = json.dumps(
+        {
+            "engine": request.app.state.config.RAG_EMBEDDING_ENGINE,
+            "model": request.app.state.config.RAG_EMBEDDING_MODEL,
+        }
+    )
+    if checkpoint is not None and (
+        checkpoint.get("splitter") != splitter_config
+        or checkpoint.get("embedding_config") != embedding_config
+    ):
+        # The chunks of the interrupted attempt don't line up with the new chunking,
+        # and some of them may be past the new last chunk, or their vectors were made
+        # by another embedding model. Start over.
+        log.info(
+            f"chunking or embedding changed since the interrupted ingestion into {collection_name}, restarting it"
+        )
+        VECTOR_DB_CLIENT.delete(
+            collection_name=collection_name, filter={"hash": metadata["hash"]}
+        )
+        checkpoint = {**checkpoint, "count": 0}
+
     # Check if entries with the same hash (metadata.hash) already exist
-    if metadata and "hash" in metadata:
+    if metadata and "hash" in metadata and checkpoint is None:
         result = VECTOR_DB_CLIENT.query(
             collection_name=collection_name,
             filter={"hash": metadata["hash"]},
@@ -748,111 +892,173 @@ def save_docs_to_vector_db(
                 raise ValueError(ERROR_MESSAGES.DUPLICATE_CONTENT)
 
     if split:
-        if request.app.state.config.TEXT_SPLITTER in ["", "character"]:
-            text_splitter = RecursiveCharacterTextSplitter(
-                chunk_size=request.app.state.config.CHUNK_SIZE,
-                chunk_overlap=request.app.state.config.CHUNK_OVERLAP,
-                add_start_index=True,
-            )
-        elif request.app.state.config.TEXT_SPLITTER == "token":
+        text_splitter = get_text_splitter(request)
+
+        # Split one document at a time, chunks are only produced as they are consumed
+        def split_docs():
+            for idx, doc in enumerate(docs):
+                for chunk in text_splitter.split_documents([doc]):
+                    yield idx, chunk
+
+        # Or groups of documents at a time on all the cores, still in order
+        def split_docs_in_process_pool():
+            idx = 0
+            for docs_chunks in imap(
+                split_documents,
+                (
+                    (tuple(splitter_config), group)
+                    for group in batched(docs, SPLIT_DOCS_PER_TASK)
+                ),
+            ):
+                for doc_chunks in docs_chunks:
+                    for chunk in doc_chunks:
+                        yield idx, chunk
+                    idx += 1
+
+        if get_process_pool() is not None and len(docs) > 1:
+            chunks = split_docs_in_process_pool()
+        else:
+            chunks = split_docs()
+    else:
+        chunks = enumerate(docs)
+
+    first_chunk = next(chunks, None)
+    if first_chunk is None:
+        raise ValueError(ERROR_MESSAGES.EMPTY_CONTENT)
+    chunks = itertools.chain([first_chunk], chunks)
+
+    if checkpoint is not None:
+        log.info(
+            f"resuming ingestion into {collection_name} after {checkpoint['count']} chunks"
+        )
+    elif VECTOR_DB_CLIENT.has_collection(collection_name=collection_name):
+        log.info(f"collection {collection_name} already exists")
+
+        if overwrite:
+            VECTOR_DB_CLIENT.delete_collection(collection_name=collection_name)
+            log.info(f"deleting existing collection {collection_name}")
+        elif add is False:
             log.info(
-                f"Using token text splitter: {request.app.state.config.TIKTOKEN_ENCODING_NAME}"
+                f"collection {collection_name} already exists, overwrite is False and add is False"
             )
+            return True
+
+    embedding_function = get_embedding_function(
+        request.app.state.config.RAG_EMBEDDING_ENGINE,
+        request.app.state.config.RAG_EMBEDDING_MODEL,
+        request.app.state.ef,
+        (
+            request.app.state.config.RAG_OPENAI_API_BASE_URL
+            if request.app.state.config.RAG_EMBEDDING_ENGINE == "openai"
+            else request.app.state.config.RAG_OLLAMA_BASE_URL
+        ),
+        (
+            request.app.state.config.RAG_OPENAI_API_KEY
+            if request.app.state.config.RAG_EMBEDDING_ENGINE == "openai"
+            else request.app.state.config.RAG_OLLAMA_API_KEY
+        ),
+        request.app.state.config.RAG_EMBEDDING_BATCH_SIZE,
+    )
 
-            tiktoken.get_encoding(str(request.app.state.config.TIKTOKEN_ENCODING_NAME))
-            text_splitter = TokenTextSplitter(
-                encoding_name=str(request.app.state.config.TIKTOKEN_ENCODING_NAME),
-                chunk_size=request.app.state.config.CHUNK_SIZE,
-                chunk_overlap=request.app.state.config.CHUNK_OVERLAP,
-                add_start_index=True,
-            )
-        else:
-            raise ValueError(ERROR_MESSAGES.DEFAULT("Invalid text splitter"))
+    event = {
+        "collection_name": collection_name,
+        "file_id": metadata.get("file_id") if metadata else None,
+    }
+    skip = checkpoint["count"] if checkpoint else 0
+    count = 0
 
-        docs = text_splitter.split_documents(docs)
+    def save_checkpoint(count):
+        Files.update_file_data_by_id(
+            metadata["file_id"],
+            {
+                "ingestion": {
+                    "collection_name": collection_name,
+                    "hash": metadata["hash"],
+                    "splitter": splitter_config,
+                    "embedding_config": embedding_config,
+                    "count": count,
+                }
+            },
+        )
 
-    if len(docs) == 0:
-        raise ValueError(ERROR_MESSAGES.EMPTY_CONTENT)
+    try:
+        log.info(f"adding to collection {collection_name}")
+        if resumable and skip == 0:
+            save_checkpoint(0)
 
-    texts = [doc.page_content for doc in docs]
-    metadatas = [
-        {
-            **doc.metadata,
-            **(metadata if metadata else {}),
-            "embedding_config": json.dumps(
+        for batch in batched(chunks, RAG_INGESTION_BATCH_SIZE):
+            start = count
+            count += len(batch)
+
+            # Skip the chunks inserted by the interrupted attempt
+            if count <= skip:
+                continue
+            batch = batch[max(skip - start, 0) :]
+            start = max(start, skip)
+
+            texts = [doc.page_content for _, doc in batch]
+            metadatas = [
                 {
-                    "engine": request.app.state.config.RAG_EMBEDDING_ENGINE,
-                    "model": request.app.state.config.RAG_EMBEDDING_MODEL,
+                    **doc.metadata,
+                    **(metadata if metadata else {}),
+                    "embedding_config": embedding_config,
                 }
-            ),
-        }
-        for doc in docs
-    ]
-
-    # ChromaDB does not like datetime formats
-    # for meta-data so convert them to string.
-    for metadata in metadatas:
-        for key, value in metadata.items():
-            if (
-                isinstance(value, datetime)
-                or isinstance(value, list)
-                or isinstance(value, dict)
-            ):
-                metadata[key] = str(value)
+                for _, doc in batch
+            ]
 
-    try:
-        if VECTOR_DB_CLIENT.has_collection(collection_name=collection_name):
-            log.info(f"collection {collection_name} already exists")
-
-            if overwrite:
-                VECTOR_DB_CLIENT.delete_collection(collection_name=collection_name)
-                log.info(f"deleting existing collection {collection_name}")
-            elif add is False:
-                log.info(
-                    f"collection {collection_name} already exists, overwrite is False and add is False"
-                )
-                return True
+            # ChromaDB does not like datetime formats
+            # for meta-data so convert them to string.
+            for item_metadata in metadatas:
+                for key, value in item_metadata.items():
+                    if (
+                        isinstance(value, datetime)
+                        or isinstance(value, list)
+                        or isinstance(value, dict)
+                    ):
+                        item_metadata[key] = str(value)
+
+            embeddings = embedding_function(
+                list(map(lambda x: x.replace("\n", " "), texts)), user=user
+            )
 
-        log.info(f"adding to collection {collection_name}")
-        embedding_function = get_embedding_function(
-            request.app.state.config.RAG_EMBEDDING_ENGINE,
-            request.app.state.config.RAG_EMBEDDING_MODEL,
-            request.app.state.ef,
-            (
-                request.app.state.config.RAG_OPENAI_API_BASE_URL
-                if request.app.state.config.RAG_EMBEDDING_ENGINE == "openai"
-                else request.app.state.config.RAG_OLLAMA_BASE_URL
-            ),
-            (
-                request.app.state.config.RAG_OPENAI_API_KEY
-                if request.app.state.config.RAG_EMBEDDING_ENGINE == "openai"
-                else request.app.state.config.RAG_OLLAMA_API_KEY
-            ),
-            request.app.state.config.RAG_EMBEDDING_BATCH_SIZE,
-        )
+            items = [
+                {
+                    "id": (
+                        get_chunk_id(collection_name, metadata["hash"], start + idx)
+                        if resumable
+                        else str(uuid.uuid4())
+                    ),
+                    "text": text,
+                    "vector": embeddings[idx],
+                    "metadata": metadatas[idx],
+                }
+                for idx, text in enumerate(texts)
+            ]
 
-        embeddings = embedding_function(
-            list(map(lambda x: x.replace("\n", " "), texts)), user=user
-        )
+            if resumable:
+                VECTOR_DB_CLIENT.upsert(collection_name=collection_name, items=items)
+                save_checkpoint(count)
+            else:
+                VECTOR_DB_CLIENT.insert(collection_name=collection_name, items=items)
 
-        items = [
-            {
-                "id": str(uuid.uuid4()),
-                "text": text,
-                "vector": embeddings[idx],
-                "metadata": metadatas[idx],
-            }
-            for idx, text in enumerate(texts)
-        ]
+            emit_ingestion_event(
+                user,
+                {
+                    **event,
+                    "status": "processing",
+                    "chunks": count,
+                    "progress": (batch[-1][0] + 1) / len(docs),
+                },
+            )
 
-        VECTOR_DB_CLIENT.insert(
-            collection_name=collection_name,
-            items=items,
-        )
+        if resumable:
+            Files.update_file_data_by_id(metadata["file_id"], {"ingestion": None})
+        emit_ingestion_event(user, {**event, "status": "completed", "chunks": count})
 
         return True
     except Exception as e:
         log.exception(e)
+        emit_ingestion_event(user, {**event, "status": "failed", "error": str(e)})
         raise e
 
 
@@ -1434,6 +1640,10 @@ def query_doc_handler(
                     if form_data.r
                     else request.app.state.config.RELEVANCE_THRESHOLD
                 ),
+                embedding_config={
+                    "engine": request.app.state.config.RAG_EMBEDDING_ENGINE,
+                    "model": request.app.state.config.RAG_EMBEDDING_MODEL,
+                },
                 user=user,
             )
         else:
@@ -1482,6 +1692,10 @@ def query_collection_handler(
                     if form_data.r
                     else request.app.state.config.RELEVANCE_THRESHOLD
                 ),
+                embedding_config={
+                    "engine": request.app.state.config.RAG_EMBEDDING_ENGINE,
+                    "model": request.app.state.config.RAG_EMBEDDING_MODEL,
+                },
             )
         else:
             return query_collection(
@@ -1658,3 +1872,67 @@ def process_files_batch(
                 )
 
     return BatchProcessFilesResponse(results=results, errors=errors)
+
+
+####################################
+#
+# Background processing
+#
+####################################
+
+
+@register_job("process_file")
+def process_file_job(request: Request, user, **payload) -> dict:
+    result = process_file(request, ProcessFileForm(**payload), user=user)
+    # The extracted content is stored with the file, the job only keeps the outcome
+    return {key: value for key, value in (result or {}).items() if key != "content"}
+
+
+@router.post("/process/file/job", response_model=JobModel)
+async def process_file_in_background(
+    form_data: ProcessFileForm,
+    user=Depends(get_verified_user),
+):
+    """
+    Queues `/process/file` and returns the job immediately, poll `/jobs/{id}` or
+    listen to "ingestion-events" for its outcome.
+    """
+    return await submit_job("process_file", user.id, form_data.model_dump())
+
+
+class BatchProcessFilesJobForm(BaseModel):
+    file_ids: List[str]
+    collection_name: str
+
+
+@register_job("process_files_batch")
+def process_files_batch_job(
+    request: Request, user, file_ids: List[str], collection_name: str
+) -> dict:
+    result = process_files_batch(
+        request,
+        BatchProcessFilesForm(
+            files=Files.get_files_by_ids(file_ids), collection_name=collection_name
+        ),
+        user=user,
+    )
+    return result.model_dump()
+
+
+@router.post("/process/files/batch/job", response_model=JobModel)
+async def process_files_batch_in_background(
+    form_data: BatchProcessFilesJobForm,
+    user=Depends(get_verified_user),
+):
+    return await submit_job("process_files_batch", user.id, form_data.model_dump())
+
+
+@router.get("/jobs/{id}", response_model=JobModel)
+async def get_job_by_id(id: str, user=Depends(get_verified_user)):
+    job = await get_job(id)
+    if job is None or (job.user_id != user.id and user.role != "admin"):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=ERROR_MESSAGES.NOT_FOUND,
+        )
+    return job
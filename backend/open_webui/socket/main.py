@@ -14,7 +14,8 @@ from open_webui.env import (
     WEBSOCKET_REDIS_URL,
 )
 from open_webui.utils.auth import decode_token
-from open_webui.socket.utils import RedisDict, RedisLock
+from open_webui.utils.chat_save import run_in_chat_executor
+from open_webui.socket.utils import AsyncLocalDict, AsyncRedisDict, AsyncRedisLock
 
 from open_webui.env import (
     GLOBAL_LOG_LEVEL,
@@ -50,15 +51,24 @@ else:
 # Timeout duration in seconds
 TIMEOUT_DURATION = 3
 
+# How long the user list and the models in use may be served from a local copy
+POOL_CACHE_TTL = 1
+
 # Dictionary to maintain the user pool
 
 if WEBSOCKET_MANAGER == "redis":
     log.debug("Using Redis to manage websockets.")
-    SESSION_POOL = RedisDict("open-webui:session_pool", redis_url=WEBSOCKET_REDIS_URL)
-    USER_POOL = RedisDict("open-webui:user_pool", redis_url=WEBSOCKET_REDIS_URL)
-    USAGE_POOL = RedisDict("open-webui:usage_pool", redis_url=WEBSOCKET_REDIS_URL)
+    SESSION_POOL = AsyncRedisDict(
+        "open-webui:session_pool", redis_url=WEBSOCKET_REDIS_URL
+    )
+    USER_POOL = AsyncRedisDict(
+        "open-webui:user_pool", redis_url=WEBSOCKET_REDIS_URL, cache_ttl=POOL_CACHE_TTL
+    )
+    USAGE_POOL = AsyncRedisDict(
+        "open-webui:usage_pool", redis_url=WEBSOCKET_REDIS_URL, cache_ttl=POOL_CACHE_TTL
+    )
 
-    clean_up_lock = RedisLock(
+    clean_up_lock = AsyncRedisLock(
         redis_url=WEBSOCKET_REDIS_URL,
         lock_name="usage_cleanup_lock",
         timeout_secs=TIMEOUT_DURATION * 2,
@@ -67,26 +77,32 @@ if WEBSOCKET_MANAGER == "redis":
     renew_func = clean_up_lock.renew_lock
     release_func = clean_up_lock.release_lock
 else:
-    SESSION_POOL = {}
-    USER_POOL = {}
-    USAGE_POOL = {}
-    aquire_func = release_func = renew_func = lambda: True
+    SESSION_POOL = AsyncLocalDict()
+    USER_POOL = AsyncLocalDict()
+    USAGE_POOL = AsyncLocalDict()
+
+    async def aquire_func():
+        return True
+
+    renew_func = release_func = aquire_func
 
 
 async def periodic_usage_pool_cleanup():
-    if not aquire_func():
+    if not await aquire_func():
         log.debug("Usage pool cleanup lock already exists. Not running it.")
         return
     log.debug("Running periodic_usage_pool_cleanup")
     try:
         while True:
-            if not renew_func():
+            if not await renew_func():
                 log.error(f"Unable to renew cleanup lock. Exiting usage pool cleanup.")
                 raise Exception("Unable to renew usage pool cleanup lock.")
 
             now = int(time.time())
             send_usage = False
-            for model_id, connections in list(USAGE_POOL.items()):
+            updated_models = {}
+            removed_models = []
+            for model_id, connections in await USAGE_POOL.items(use_cache=False):
                 # Creating a list of sids to remove if they have timed out
                 expired_sids = [
                     sid
@@ -99,19 +115,22 @@ async def periodic_usage_pool_cleanup():
 
                 if not connections:
                     log.debug(f"Cleaning up model {model_id} from usage pool")
-                    del USAGE_POOL[model_id]
-                else:
-                    USAGE_POOL[model_id] = connections
+                    removed_models.append(model_id)
+                elif expired_sids:
+                    updated_models[model_id] = connections
 
                 send_usage = True
 
+            if updated_models or removed_models:
+                await USAGE_POOL.update(updated_models, removed_models)
+
             if send_usage:
                 # Emit updated usage information after cleaning
-                await sio.emit("usage", {"models": get_models_in_use()})
+                await sio.emit("usage", {"models": await get_models_in_use()})
 
             await asyncio.sleep(TIMEOUT_DURATION)
     finally:
-        release_func()
+        await release_func()
 
 
 app = socketio.ASGIApp(
@@ -120,9 +139,9 @@ app = socketio.ASGIApp(
 )
 
 
-def get_models_in_use():
+async def get_models_in_use():
     # List models that are currently in use
-    models_in_use = list(USAGE_POOL.keys())
+    models_in_use = await USAGE_POOL.keys()
     return models_in_use
 
 
@@ -133,13 +152,21 @@ async def usage(sid, data):
     current_time = int(time.time())
 
     # Store the new usage data and task
-    USAGE_POOL[model_id] = {
-        **(USAGE_POOL[model_id] if model_id in USAGE_POOL else {}),
-        sid: {"updated_at": current_time},
-    }
+    await USAGE_POOL.set(
+        model_id,
+        {
+            **(await USAGE_POOL.get(model_id, {})),
+            sid: {"updated_at": current_time},
+        },
+    )
 
     # Broadcast the usage data to all clients
-    await sio.emit("usage", {"models": get_models_in_use()})
+    await sio.emit("usage", {"models": await get_models_in_use()})
+
+
+async def add_user_session(sid, user):
+    await SESSION_POOL.set(sid, user.model_dump())
+    await USER_POOL.set(user.id, (await USER_POOL.get(user.id, [])) + [sid])
 
 
 @sio.event
@@ -152,15 +179,11 @@ async def connect(sid, environ, auth):
             user = Users.get_user_by_id(data["id"])
 
         if user:
-            SESSION_POOL[sid] = user.model_dump()
-            if user.id in USER_POOL:
-                USER_POOL[user.id] = USER_POOL[user.id] + [sid]
-            else:
-                USER_POOL[user.id] = [sid]
+            await add_user_session(sid, user)
 
             # print(f"user {user.name}({user.id}) connected with session ID {sid}")
-            await sio.emit("user-list", {"user_ids": list(USER_POOL.keys())})
-            await sio.emit("usage", {"models": get_models_in_use()})
+            await sio.emit("user-list", {"user_ids": await USER_POOL.keys()})
+            await sio.emit("usage", {"models": await get_models_in_use()})
 
 
 @sio.on("user-join")
@@ -178,11 +201,7 @@ async def user_join(sid, data):
     if not user:
         return
 
-    SESSION_POOL[sid] = user.model_dump()
-    if user.id in USER_POOL:
-        USER_POOL[user.id] = USER_POOL[user.id] + [sid]
-    else:
-        USER_POOL[user.id] = [sid]
+    await add_user_session(sid, user)
 
     # Join all the channels
     channels = Channels.get_channels_by_user_id(user.id)
@@ -192,7 +211,7 @@ async def user_join(sid, data):
 
     # print(f"user {user.name}({user.id}) connected with session ID {sid}")
 
-    await sio.emit("user-list", {"user_ids": list(USER_POOL.keys())})
+    await sio.emit("user-list", {"user_ids": await USER_POOL.keys()})
     return {"id": user.id, "name": user.name}
 
 
@@ -233,13 +252,17 @@ async def channel_events(sid, data):
     event_type = event_data["type"]
 
     if event_type == "typing":
+        session_user = await SESSION_POOL.get(sid)
+        if not session_user:
+            return
+
         await sio.emit(
             "channel-events",
             {
                 "channel_id": data["channel_id"],
                 "message_id": data.get("message_id", None),
                 "data": event_data,
-                "user": UserNameResponse(**SESSION_POOL[sid]).model_dump(),
+                "user": UserNameResponse(**session_user).model_dump(),
             },
             room=room,
         )
@@ -247,22 +270,24 @@ async def channel_events(sid, data):
 
 @sio.on("user-list")
 async def user_list(sid):
-    await sio.emit("user-list", {"user_ids": list(USER_POOL.keys())})
+    await sio.emit("user-list", {"user_ids": await USER_POOL.keys()})
 
 
 @sio.event
 async def disconnect(sid):
-    if sid in SESSION_POOL:
-        user = SESSION_POOL[sid]
-        del SESSION_POOL[sid]
+    user = await SESSION_POOL.get(sid)
+    if user:
+        await SESSION_POOL.delete(sid)
 
         user_id = user["id"]
-        USER_POOL[user_id] = [_sid for _sid in USER_POOL[user_id] if _sid != sid]
+        session_ids = [_sid for _sid in await USER_POOL.get(user_id, []) if _sid != sid]
 
-        if len(USER_POOL[user_id]) == 0:
-            del USER_POOL[user_id]
+        if session_ids:
+            await USER_POOL.set(user_id, session_ids)
+        else:
+            await USER_POOL.delete(user_id)
 
-        await sio.emit("user-list", {"user_ids": list(USER_POOL.keys())})
+        await sio.emit("user-list", {"user_ids": await USER_POOL.keys()})
     else:
         pass
         # print(f"Unknown session ID {sid} disconnected")
@@ -272,7 +297,7 @@ def get_event_emitter(request_info):
     async def __event_emitter__(event_data):
         user_id = request_info["user_id"]
         session_ids = list(
-            set(USER_POOL.get(user_id, []) + [request_info["session_id"]])
+            set((await USER_POOL.get(user_id, [])) + [request_info["session_id"]])
         )
 
         for session_id in session_ids:
@@ -287,33 +312,29 @@ def get_event_emitter(request_info):
             )
 
         if "type" in event_data and event_data["type"] == "status":
-            Chats.add_message_status_to_chat_by_id_and_message_id(
+            await run_in_chat_executor(
+                request_info["chat_id"],
+                Chats.add_message_status_to_chat_by_id_and_message_id,
                 request_info["chat_id"],
                 request_info["message_id"],
                 event_data.get("data", {}),
             )
 
         if "type" in event_data and event_data["type"] == "message":
-            message = Chats.get_message_by_id_and_message_id(
+            await run_in_chat_executor(
                 request_info["chat_id"],
-                request_info["message_id"],
-            )
-
-            content = message.get("content", "")
-            content += event_data.get("data", {}).get("content", "")
-
-            Chats.upsert_message_to_chat_by_id_and_message_id(
+                Chats.append_message_content_to_chat_by_id_and_message_id,
                 request_info["chat_id"],
                 request_info["message_id"],
-                {
-                    "content": content,
-                },
+                event_data.get("data", {}).get("content", ""),
             )
 
         if "type" in event_data and event_data["type"] == "replace":
             content = event_data.get("data", {}).get("content", "")
 
-            Chats.upsert_message_to_chat_by_id_and_message_id(
+            await run_in_chat_executor(
+                request_info["chat_id"],
+                Chats.upsert_message_to_chat_by_id_and_message_id,
                 request_info["chat_id"],
                 request_info["message_id"],
                 {
@@ -343,28 +364,32 @@ def get_event_call(request_info):
 get_event_caller = get_event_call
 
 
-def get_user_id_from_session_pool(sid):
-    user = SESSION_POOL.get(sid)
+async def emit_to_user(user_id, event, data):
+    for session_id in await USER_POOL.get(user_id, []):
+        await sio.emit(event, data, to=session_id)
+
+
+async def get_user_id_from_session_pool(sid):
+    user = await SESSION_POOL.get(sid)
     if user:
         return user["id"]
     return None
 
 
-def get_user_ids_from_room(room):
+async def get_user_ids_from_room(room):
     active_session_ids = sio.manager.get_participants(
         namespace="/",
         room=room,
     )
 
-    active_user_ids = list(
-        set(
-            [SESSION_POOL.get(session_id[0])["id"] for session_id in active_session_ids]
-        )
+    sessions = await SESSION_POOL.get_many(
+        session_id[0] for session_id in active_session_ids
     )
+    active_user_ids = list(set([user["id"] for user in sessions.values()]))
     return active_user_ids
 
 
-def get_active_status_by_user_id(user_id):
-    if user_id in USER_POOL:
+async def get_active_status_by_user_id(user_id):
+    if await USER_POOL.contains(user_id):
         return True
     return False
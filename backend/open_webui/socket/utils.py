@@ -1,6 +1,10 @@
 import json
 import redis
+import redis.asyncio
+import threading
+import time
 import uuid
+from collections import defaultdict
 
 
 class RedisLock:
@@ -85,3 +89,284 @@ class RedisDict:
         if key not in self:
             self[key] = default
         return self[key]
+
+
+class AsyncRedisLock:
+    """Async version of `RedisLock`, for use from the event loop."""
+
+    def __init__(self, redis_url, lock_name, timeout_secs):
+        self.lock_name = lock_name
+        self.lock_id = str(uuid.uuid4())
+        self.timeout_secs = timeout_secs
+        self.lock_obtained = False
+        self.redis = redis.asyncio.Redis.from_url(redis_url, decode_responses=True)
+
+    async def aquire_lock(self):
+        self.lock_obtained = await self.redis.set(
+            self.lock_name, self.lock_id, nx=True, ex=self.timeout_secs
+        )
+        return self.lock_obtained
+
+    async def renew_lock(self):
+        return await self.redis.set(
+            self.lock_name, self.lock_id, xx=True, ex=self.timeout_secs
+        )
+
+    async def release_lock(self):
+        lock_value = await self.redis.get(self.lock_name)
+        if lock_value and lock_value == self.lock_id:
+            await self.redis.delete(self.lock_name)
+
+
+class AsyncRedisDict:
+    """
+    Async version of `RedisDict`, with bulk operations sent as a single command or
+    pipeline.
+
+    With `cache_ttl`, whole-hash reads (`keys`, `items`, `values`) are served from a
+    local copy for that many seconds. Writes made through this instance drop the copy,
+    writes of other workers show up once it expires. Single-key reads always go to
+    Redis, so read-modify-write cycles never start from stale data.
+    """
+
+    def __init__(self, name, redis_url, cache_ttl=0):
+        self.name = name
+        self.redis = redis.asyncio.Redis.from_url(redis_url, decode_responses=True)
+        self.cache_ttl = cache_ttl
+        self._cache = None
+        self._cache_expires_at = 0
+
+    def _invalidate(self):
+        self._cache = None
+
+    async def _get_all(self, use_cache=True):
+        if use_cache and self._cache is not None:
+            if time.monotonic() < self._cache_expires_at:
+                return self._cache
+
+        data = {
+            k: json.loads(v) for k, v in (await self.redis.hgetall(self.name)).items()
+        }
+        if self.cache_ttl:
+            self._cache = data
+            self._cache_expires_at = time.monotonic() + self.cache_ttl
+        return data
+
+    async def get(self, key, default=None):
+        value = await self.redis.hget(self.name, key)
+        if value is None:
+            return default
+        return json.loads(value)
+
+    async def get_many(self, keys):
+        """Returns a dict of the values of `keys` that exist, with one HMGET."""
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = await self.redis.hmget(self.name, keys)
+        return {k: json.loads(v) for k, v in zip(keys, values) if v is not None}
+
+    async def set(self, key, value):
+        self._invalidate()
+        await self.redis.hset(self.name, key, json.dumps(value))
+
+    async def delete(self, key):
+        self._invalidate()
+        return await self.redis.hdel(self.name, key) > 0
+
+    async def update(self, mapping=None, delete_keys=None):
+        """Sets every item of `mapping` and deletes `delete_keys` in one pipeline."""
+        self._invalidate()
+        pipe = self.redis.pipeline(transaction=False)
+        if mapping:
+            pipe.hset(self.name, mapping={k: json.dumps(v) for k, v in mapping.items()})
+        if delete_keys:
+            pipe.hdel(self.name, *delete_keys)
+        await pipe.execute()
+
+    async def contains(self, key):
+        return await self.redis.hexists(self.name, key)
+
+    async def length(self):
+        return await self.redis.hlen(self.name)
+
+    async def keys(self, use_cache=True):
+        return list(await self._get_all(use_cache))
+
+    async def values(self, use_cache=True):
+        return list((await self._get_all(use_cache)).values())
+
+    async def items(self, use_cache=True):
+        return list((await self._get_all(use_cache)).items())
+
+    async def clear(self):
+        self._invalidate()
+        await self.redis.delete(self.name)
+
+
+class AsyncLocalDict:
+    """In-memory `AsyncRedisDict`, for a single worker without Redis."""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key, default=None):
+        return self.data.get(key, default)
+
+    async def get_many(self, keys):
+        return {k: self.data[k] for k in keys if k in self.data}
+
+    async def set(self, key, value):
+        self.data[key] = value
+
+    async def delete(self, key):
+        if key not in self.data:
+            return False
+        del self.data[key]
+        return True
+
+    async def update(self, mapping=None, delete_keys=None):
+        self.data.update(mapping or {})
+        for key in delete_keys or []:
+            self.data.pop(key, None)
+
+    async def contains(self, key):
+        return key in self.data
+
+    async def length(self):
+        return len(self.data)
+
+    async def keys(self, use_cache=True):
+        return list(self.data.keys())
+
+    async def values(self, use_cache=True):
+        return list(self.data.values())
+
+    async def items(self, use_cache=True):
+        return list(self.data.items())
+
+    async def clear(self):
+        self.data.clear()
+
+
+class RedisCounter:
+    """
+    Integer counters kept in one Redis hash per key (`{name}:{generation}:{key}`,
+    field -> count), with the keys tracked in the set `{name}:{generation}`.
+
+    `incr` only adds to a local buffer; `flush` sends the buffered increments with a
+    single pipeline of `HINCRBY`s, so concurrent workers never overwrite each other's
+    counts and each request costs no round trip. Reads flush the buffer first.
+
+    `clear` bumps the generation (`{name}:generation`) and records when it did
+    (`{name}:cleared_at`) instead of deleting the counts. Increments are buffered by
+    the second they were counted in, so at their next flush other workers drop the
+    ones counted before the clear and count the ones after it in the new generation.
+    """
+
+    # Seconds the counts of a cleared generation are kept, for the flushes that were
+    # in flight when it was cleared
+    CLEARED_GENERATION_TTL = 60 * 60
+
+    def __init__(self, name, redis_url):
+        self.name = name
+        self.redis = redis.Redis.from_url(redis_url, decode_responses=True)
+        # second -> key -> field -> amount
+        self.pending = self._new_pending()
+        self.lock = threading.Lock()
+        # Generation seen by the last flush, None until then
+        self.generation = None
+
+    @staticmethod
+    def _new_pending():
+        return defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+
+    def _get_generation(self):
+        """Returns the current generation and the time it started at."""
+        generation, cleared_at = self.redis.mget(
+            f"{self.name}:generation", f"{self.name}:cleared_at"
+        )
+        return int(generation or 0), float(cleared_at or 0)
+
+    def incr(self, key, field, amount=1):
+        with self.lock:
+            self.pending[int(time.time())][key][field] += amount
+
+    def flush(self):
+        generation, cleared_at = self._get_generation()
+        with self.lock:
+            pending = self.pending
+            self.pending = self._new_pending()
+            self.generation = generation
+
+        # Increments counted before the counters were cleared are dropped. Those of
+        # the second of the clear are counted in the new generation.
+        pending = {
+            second: keys
+            for second, keys in pending.items()
+            if second >= int(cleared_at)
+        }
+        if not pending:
+            return
+
+        counts = defaultdict(lambda: defaultdict(int))
+        for keys in pending.values():
+            for key, fields in keys.items():
+                for field, amount in fields.items():
+                    counts[key][field] += amount
+
+        try:
+            pipe = self.redis.pipeline(transaction=False)
+            for key, fields in counts.items():
+                pipe.sadd(f"{self.name}:{generation}", key)
+                for field, amount in fields.items():
+                    pipe.hincrby(f"{self.name}:{generation}:{key}", field, amount)
+            pipe.execute()
+        except Exception:
+            # Keep the increments for the next flush
+            with self.lock:
+                for second, keys in pending.items():
+                    for key, fields in keys.items():
+                        for field, amount in fields.items():
+                            self.pending[second][key][field] += amount
+            raise
+
+    def get(self, key):
+        self.flush()
+        return {
+            field: int(count)
+            for field, count in self.redis.hgetall(
+                f"{self.name}:{self.generation}:{key}"
+            ).items()
+        }
+
+    def keys(self):
+        self.flush()
+        return sorted(self.redis.smembers(f"{self.name}:{self.generation}"))
+
+    def items(self):
+        keys = self.keys()
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(f"{self.name}:{self.generation}:{key}")
+        return [
+            (key, {field: int(count) for field, count in counts.items()})
+            for key, counts in zip(keys, pipe.execute())
+        ]
+
+    def clear(self):
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.incr(f"{self.name}:generation")
+        pipe.set(f"{self.name}:cleared_at", time.time())
+        generation = pipe.execute()[0] - 1
+        with self.lock:
+            self.pending = self._new_pending()
+            self.generation = generation + 1
+
+        keys = self.redis.smembers(f"{self.name}:{generation}")
+        pipe = self.redis.pipeline(transaction=False)
+        for key in [f"{self.name}:{generation}:{key}" for key in keys] + [
+            f"{self.name}:{generation}"
+        ]:
+            pipe.expire(key, self.CLEARED_GENERATION_TTL)
+        pipe.execute()
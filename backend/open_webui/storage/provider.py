@@ -1,10 +1,17 @@
+import hashlib
 import os
 import shutil
 import json
+import tempfile
+import threading
+import time
+from collections import OrderedDict
 from abc import ABC, abstractmethod
-from typing import BinaryIO, Tuple
+from contextlib import contextmanager
+from typing import BinaryIO, Callable, Iterator, Optional, Tuple
 
 import boto3
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 from open_webui.config import (
     S3_ACCESS_KEY_ID,
@@ -18,6 +25,7 @@ from open_webui.config import (
     AZURE_STORAGE_ENDPOINT,
     AZURE_STORAGE_CONTAINER_NAME,
     AZURE_STORAGE_KEY,
+    STORAGE_CACHE_MAX_SIZE,
     STORAGE_PROVIDER,
     UPLOAD_DIR,
 )
@@ -28,6 +36,260 @@ from azure.identity import DefaultAzureCredential
 from azure.storage.blob import BlobServiceClient
 from azure.core.exceptions import ResourceNotFoundError
 
+# Uploads are copied to disk this many bytes at a time
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+# Files larger than this are uploaded to S3 in parts of this size
+S3_MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024
+# Size of the chunks of the resumable GCS uploads, a multiple of 256 KB
+GCS_CHUNK_SIZE = 8 * 1024 * 1024
+# Parts uploaded in parallel to S3 and Azure Blob Storage
+UPLOAD_MAX_CONCURRENCY = 4
+# Objects are streamed to the client this many bytes at a time
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+# Cached files are checked against the ETag of their object at most this often
+CACHE_VALIDATION_INTERVAL = 30
+# Eviction frees space down to this fraction of the maximum size
+CACHE_EVICTION_TARGET = 0.9
+# Directory of UPLOAD_DIR with the ETags of the cached files
+CACHE_ETAG_DIR = ".etags"
+
+
+class StorageCache:
+    """
+    Read-through cache of the files of a remote storage provider, in UPLOAD_DIR.
+
+    A cached file is served as long as the ETag it was downloaded with matches the
+    one of its object, and concurrent requests for a file that isn't cached download
+    it once. Once the cached files take more than `max_size` bytes, the least
+    recently used ones are deleted.
+
+    The cached files and their total size are tracked as they are added, used and
+    removed; UPLOAD_DIR is only scanned once, for the files cached by a previous run.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+
+        self._lock = threading.Lock()
+        # path -> size of the cached files, least recently used first
+        self._files: Optional[OrderedDict[str, int]] = None
+        self._size = 0
+        # path -> (lock, number of threads using it)
+        self._file_locks: dict[str, tuple[threading.Lock, int]] = {}
+        # path -> time its ETag was last checked
+        self._validated_at: dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @contextmanager
+    def _file_lock(self, file_path: str):
+        with self._lock:
+            lock, count = self._file_locks.get(file_path, (threading.Lock(), 0))
+            self._file_locks[file_path] = (lock, count + 1)
+        try:
+            with lock:
+                yield
+        finally:
+            with self._lock:
+                lock, count = self._file_locks[file_path]
+                if count == 1:
+                    del self._file_locks[file_path]
+                else:
+                    self._file_locks[file_path] = (lock, count - 1)
+
+    def _get_etag_path(self, file_path: str) -> str:
+        directory, filename = os.path.split(file_path)
+        return os.path.join(directory, CACHE_ETAG_DIR, filename)
+
+    def _read_etag(self, file_path: str) -> Optional[str]:
+        try:
+            with open(self._get_etag_path(file_path), "r") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _write_etag(self, file_path: str, etag: Optional[str]):
+        etag_path = self._get_etag_path(file_path)
+        if etag is None:
+            if os.path.isfile(etag_path):
+                os.remove(etag_path)
+            return
+
+        os.makedirs(os.path.dirname(etag_path), exist_ok=True)
+        with open(etag_path, "w") as f:
+            f.write(str(etag))
+
+    def get_file(
+        self,
+        file_path: str,
+        get_etag: Callable[[], str],
+        download: Callable[[str], None],
+    ) -> str:
+        """
+        Returns `file_path`, calling `download(path)` to (re)download the object to it
+        unless it is cached with the current ETag of the object (from `get_etag()`).
+        """
+        with self._file_lock(file_path):
+            if os.path.isfile(file_path):
+                validated_at = self._validated_at.get(file_path)
+                if (
+                    validated_at
+                    and time.time() - validated_at < CACHE_VALIDATION_INTERVAL
+                ):
+                    return self._hit(file_path)
+
+                etag = get_etag()
+                if etag is not None and self._read_etag(file_path) == str(etag):
+                    self._validated_at[file_path] = time.time()
+                    return self._hit(file_path)
+            else:
+                etag = get_etag()
+
+            with self._lock:
+                self.misses += 1
+
+            # Downloaded next to the cached file, which is only replaced once complete
+            fd, download_path = tempfile.mkstemp(
+                prefix=".download-", dir=os.path.dirname(file_path)
+            )
+            os.close(fd)
+            try:
+                download(download_path)
+                os.replace(download_path, file_path)
+            finally:
+                if os.path.isfile(download_path):
+                    os.remove(download_path)
+
+            self._write_etag(file_path, etag)
+            self._validated_at[file_path] = time.time()
+            self._track(file_path)
+
+        self._evict(keep=file_path)
+        return file_path
+
+    def get_cached_file(self, file_path: str, etag: Optional[str]) -> Optional[str]:
+        """Returns `file_path` if it is cached with the given (current) ETag."""
+        if (
+            etag is not None
+            and os.path.isfile(file_path)
+            and self._read_etag(file_path) == str(etag)
+        ):
+            self._validated_at[file_path] = time.time()
+            return self._hit(file_path)
+        return None
+
+    def _hit(self, file_path: str) -> str:
+        # The modification time orders the files for eviction after a restart
+        os.utime(file_path)
+        with self._lock:
+            self.hits += 1
+            files = self._get_files()
+            if file_path in files:
+                files.move_to_end(file_path)
+        return file_path
+
+    def add_file(self, file_path: str, etag: Optional[str]):
+        """Adds a file that was just uploaded from `file_path`."""
+        with self._file_lock(file_path):
+            self._write_etag(file_path, etag)
+            self._validated_at[file_path] = time.time()
+            self._track(file_path)
+        self._evict(keep=file_path)
+
+    def remove_file(self, file_path: str):
+        self._write_etag(file_path, None)
+        self._validated_at.pop(file_path, None)
+        with self._lock:
+            size = self._get_files().pop(file_path, None)
+            if size is not None:
+                self._size -= size
+
+    def reset(self):
+        """Forgets the cached files, after they were deleted along with UPLOAD_DIR's."""
+        with self._lock:
+            self._files = None
+            self._size = 0
+            self._validated_at.clear()
+
+    def _get_files(self) -> OrderedDict[str, int]:
+        # Called with the lock held
+        if self._files is None:
+            self._files = OrderedDict(
+                (file_path, file_size)
+                for _, file_size, file_path in sorted(self._scan(UPLOAD_DIR))
+            )
+            self._size = sum(self._files.values())
+        return self._files
+
+    def _track(self, file_path: str):
+        """Records the (new) size of a file that was just written to the cache."""
+        file_size = os.path.getsize(file_path)
+        with self._lock:
+            files = self._get_files()
+            self._size += file_size - files.pop(file_path, 0)
+            files[file_path] = file_size
+
+    def _scan(self, directory: str) -> list[tuple[float, int, str]]:
+        files = []
+        if not os.path.isdir(directory):
+            return files
+
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                # Skips the ETags and the downloads in progress
+                if entry.name.startswith(".") or not entry.is_file():
+                    continue
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+
+    def _evict(self, keep: Optional[str] = None):
+        evicted = []
+        with self._lock:
+            files = self._get_files()
+            if self._size <= self.max_size:
+                return
+
+            for file_path, file_size in list(files.items()):
+                if self._size <= self.max_size * CACHE_EVICTION_TARGET:
+                    break
+                # Just added, being downloaded or about to be served
+                if file_path == keep or file_path in self._file_locks:
+                    continue
+                del files[file_path]
+                self._size -= file_size
+                evicted.append(file_path)
+            self.evictions += len(evicted)
+
+        for file_path in evicted:
+            try:
+                os.remove(file_path)
+            except FileNotFoundError:
+                pass
+            self.remove_file(file_path)
+
+        if evicted:
+            print(f"Evicted {len(evicted)} cached files from {UPLOAD_DIR}")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            count, size = len(self._get_files()), self._size
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "count": count,
+            "size": size,
+            "max_size": self.max_size,
+        }
+
+
+STORAGE_CACHE = StorageCache(STORAGE_CACHE_MAX_SIZE * 1024 * 1024)
+
 
 class StorageProvider(ABC):
     @abstractmethod
@@ -35,7 +297,11 @@ class StorageProvider(ABC):
         pass
 
     @abstractmethod
-    def upload_file(self, file: BinaryIO, filename: str) -> Tuple[bytes, str]:
+    def upload_file(self, file: BinaryIO, filename: str) -> Tuple[dict, str]:
+        """
+        Stores `file`, and returns its metadata (`size` and `sha256`) and its path.
+        The file is streamed, it is never held in memory as a whole.
+        """
         pass
 
     @abstractmethod
@@ -49,14 +315,24 @@ class StorageProvider(ABC):
 
 class LocalStorageProvider(StorageProvider):
     @staticmethod
-    def upload_file(file: BinaryIO, filename: str) -> Tuple[bytes, str]:
-        contents = file.read()
-        if not contents:
-            raise ValueError(ERROR_MESSAGES.EMPTY_CONTENT)
+    def upload_file(file: BinaryIO, filename: str) -> Tuple[dict, str]:
+        """Handles uploading of the file to local storage."""
         file_path = f"{UPLOAD_DIR}/{filename}"
-        with open(file_path, "wb") as f:
-            f.write(contents)
-        return contents, file_path
+        size = 0
+        sha256 = hashlib.sha256()
+        try:
+            with open(file_path, "wb") as f:
+                while chunk := file.read(UPLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    sha256.update(chunk)
+                    size += len(chunk)
+            if size == 0:
+                raise ValueError(ERROR_MESSAGES.EMPTY_CONTENT)
+        except BaseException:
+            if os.path.isfile(file_path):
+                os.remove(file_path)
+            raise
+        return {"size": size, "sha256": sha256.hexdigest()}, file_path
 
     @staticmethod
     def get_file(file_path: str) -> str:
@@ -101,17 +377,26 @@ class S3StorageProvider(StorageProvider):
         )
         self.bucket_name = S3_BUCKET_NAME
         self.key_prefix = S3_KEY_PREFIX if S3_KEY_PREFIX else ""
+        self.transfer_config = TransferConfig(
+            multipart_threshold=S3_MULTIPART_CHUNK_SIZE,
+            multipart_chunksize=S3_MULTIPART_CHUNK_SIZE,
+            max_concurrency=UPLOAD_MAX_CONCURRENCY,
+        )
 
-    def upload_file(self, file: BinaryIO, filename: str) -> Tuple[bytes, str]:
+    def upload_file(self, file: BinaryIO, filename: str) -> Tuple[dict, str]:
         """Handles uploading of the file to S3 storage."""
-        _, file_path = LocalStorageProvider.upload_file(file, filename)
+        metadata, file_path = LocalStorageProvider.upload_file(file, filename)
         try:
             s3_key = os.path.join(self.key_prefix, filename)
-            self.s3_client.upload_file(file_path, self.bucket_name, s3_key)
-            return (
-                open(file_path, "rb").read(),
-                "s3://" + self.bucket_name + "/" + s3_key,
+            # Multipart upload, streamed from the local copy
+            self.s3_client.upload_file(
+                file_path, self.bucket_name, s3_key, Config=self.transfer_config
             )
+            STORAGE_CACHE.add_file(
+                file_path,
+                self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)["ETag"],
+            )
+            return metadata, "s3://" + self.bucket_name + "/" + s3_key
         except ClientError as e:
             raise RuntimeError(f"Error uploading file to S3: {e}")
 
@@ -119,12 +404,43 @@ class S3StorageProvider(StorageProvider):
         """Handles downloading of the file from S3 storage."""
         try:
             s3_key = self._extract_s3_key(file_path)
-            local_file_path = self._get_local_file_path(s3_key)
-            self.s3_client.download_file(self.bucket_name, s3_key, local_file_path)
-            return local_file_path
+            return STORAGE_CACHE.get_file(
+                self._get_local_file_path(s3_key),
+                lambda: self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)[
+                    "ETag"
+                ],
+                lambda path: self.s3_client.download_file(
+                    self.bucket_name, s3_key, path
+                ),
+            )
         except ClientError as e:
             raise RuntimeError(f"Error downloading file from S3: {e}")
 
+    def get_file_info(self, file_path: str) -> dict:
+        """Returns the `size` and `etag` of the object, and the path of its local copy."""
+        try:
+            s3_key = self._extract_s3_key(file_path)
+            response = self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
+            return {
+                "size": response["ContentLength"],
+                "etag": response["ETag"],
+                "local_path": self._get_local_file_path(s3_key),
+            }
+        except ClientError as e:
+            raise RuntimeError(f"Error getting file info from S3: {e}")
+
+    def stream_file(self, file_path: str, start: int, end: int) -> Iterator[bytes]:
+        """Streams the bytes `start` to `end` (inclusive) of the object."""
+        try:
+            response = self.s3_client.get_object(
+                Bucket=self.bucket_name,
+                Key=self._extract_s3_key(file_path),
+                Range=f"bytes={start}-{end}",
+            )
+            yield from response["Body"].iter_chunks(STREAM_CHUNK_SIZE)
+        except ClientError as e:
+            raise RuntimeError(f"Error streaming file from S3: {e}")
+
     def delete_file(self, file_path: str) -> None:
         """Handles deletion of the file from S3 storage."""
         try:
@@ -135,6 +451,7 @@ class S3StorageProvider(StorageProvider):
 
         # Always delete from local storage
         LocalStorageProvider.delete_file(file_path)
+        STORAGE_CACHE.remove_file(self._get_local_file_path(s3_key))
 
     def delete_all_files(self) -> None:
         """Handles deletion of all files from S3 storage."""
@@ -154,6 +471,7 @@ class S3StorageProvider(StorageProvider):
 
         # Always delete from local storage
         LocalStorageProvider.delete_all_files()
+        STORAGE_CACHE.reset()
 
     # The s3 key is the name assigned to an object. It excludes the bucket name, but includes the internal path and the file name.
     def _extract_s3_key(self, full_file_path: str) -> str:
@@ -178,13 +496,15 @@ class GCSStorageProvider(StorageProvider):
             self.gcs_client = storage.Client()
         self.bucket = self.gcs_client.bucket(GCS_BUCKET_NAME)
 
-    def upload_file(self, file: BinaryIO, filename: str) -> Tuple[bytes, str]:
+    def upload_file(self, file: BinaryIO, filename: str) -> Tuple[dict, str]:
         """Handles uploading of the file to GCS storage."""
-        contents, file_path = LocalStorageProvider.upload_file(file, filename)
+        metadata, file_path = LocalStorageProvider.upload_file(file, filename)
         try:
-            blob = self.bucket.blob(filename)
+            # Resumable upload, streamed from the local copy
+            blob = self.bucket.blob(filename, chunk_size=GCS_CHUNK_SIZE)
             blob.upload_from_filename(file_path)
-            return contents, "gs://" + self.bucket_name + "/" + filename
+            STORAGE_CACHE.add_file(file_path, blob.etag)
+            return metadata, "gs://" + self.bucket_name + "/" + filename
         except GoogleCloudError as e:
             raise RuntimeError(f"Error uploading file to GCS: {e}")
 
@@ -192,14 +512,55 @@ class GCSStorageProvider(StorageProvider):
         """Handles downloading of the file from GCS storage."""
         try:
             filename = file_path.removeprefix("gs://").split("/")[1]
-            local_file_path = f"{UPLOAD_DIR}/{filename}"
-            blob = self.bucket.get_blob(filename)
-            blob.download_to_filename(local_file_path)
 
-            return local_file_path
+            def get_etag():
+                blob = self.bucket.get_blob(filename)
+                if blob is None:
+                    raise RuntimeError(
+                        f"Error downloading file from GCS: {filename} not found"
+                    )
+                return blob.etag
+
+            return STORAGE_CACHE.get_file(
+                f"{UPLOAD_DIR}/{filename}",
+                get_etag,
+                lambda path: self.bucket.blob(filename).download_to_filename(path),
+            )
         except NotFound as e:
             raise RuntimeError(f"Error downloading file from GCS: {e}")
 
+    def get_file_info(self, file_path: str) -> dict:
+        """Returns the `size` and `etag` of the object, and the path of its local copy."""
+        filename = file_path.removeprefix("gs://").split("/")[1]
+        blob = self.bucket.get_blob(filename)
+        if blob is None:
+            raise RuntimeError(
+                f"Error getting file info from GCS: {filename} not found"
+            )
+        return {
+            "size": blob.size,
+            "etag": blob.etag,
+            "local_path": f"{UPLOAD_DIR}/{filename}",
+        }
+
+    def stream_file(self, file_path: str, start: int, end: int) -> Iterator[bytes]:
+        """Streams the bytes `start` to `end` (inclusive) of the object."""
+        try:
+            filename = file_path.removeprefix("gs://").split("/")[1]
+            with self.bucket.blob(filename).open(
+                "rb", chunk_size=STREAM_CHUNK_SIZE
+            ) as reader:
+                reader.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    chunk = reader.read(min(STREAM_CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    yield chunk
+        except NotFound as e:
+            raise RuntimeError(f"Error streaming file from GCS: {e}")
+
     def delete_file(self, file_path: str) -> None:
         """Handles deletion of the file from GCS storage."""
         try:
@@ -211,6 +572,7 @@ class GCSStorageProvider(StorageProvider):
 
         # Always delete from local storage
         LocalStorageProvider.delete_file(file_path)
+        STORAGE_CACHE.remove_file(f"{UPLOAD_DIR}/{filename}")
 
     def delete_all_files(self) -> None:
         """Handles deletion of all files from GCS storage."""
@@ -225,6 +587,7 @@ class GCSStorageProvider(StorageProvider):
 
         # Always delete from local storage
         LocalStorageProvider.delete_all_files()
+        STORAGE_CACHE.reset()
 
 
 class AzureStorageProvider(StorageProvider):
@@ -248,13 +611,21 @@ class AzureStorageProvider(StorageProvider):
             self.container_name
         )
 
-    def upload_file(self, file: BinaryIO, filename: str) -> Tuple[bytes, str]:
+    def upload_file(self, file: BinaryIO, filename: str) -> Tuple[dict, str]:
         """Handles uploading of the file to Azure Blob Storage."""
-        contents, file_path = LocalStorageProvider.upload_file(file, filename)
+        metadata, file_path = LocalStorageProvider.upload_file(file, filename)
         try:
             blob_client = self.container_client.get_blob_client(filename)
-            blob_client.upload_blob(contents, overwrite=True)
-            return contents, f"{self.endpoint}/{self.container_name}/{filename}"
+            # Staged in blocks, streamed from the local copy
+            with open(file_path, "rb") as data:
+                result = blob_client.upload_blob(
+                    data,
+                    length=metadata["size"],
+                    overwrite=True,
+                    max_concurrency=UPLOAD_MAX_CONCURRENCY,
+                )
+            STORAGE_CACHE.add_file(file_path, result.get("etag"))
+            return metadata, f"{self.endpoint}/{self.container_name}/{filename}"
         except Exception as e:
             raise RuntimeError(f"Error uploading file to Azure Blob Storage: {e}")
 
@@ -262,14 +633,48 @@ class AzureStorageProvider(StorageProvider):
         """Handles downloading of the file from Azure Blob Storage."""
         try:
             filename = file_path.split("/")[-1]
-            local_file_path = f"{UPLOAD_DIR}/{filename}"
             blob_client = self.container_client.get_blob_client(filename)
-            with open(local_file_path, "wb") as download_file:
-                download_file.write(blob_client.download_blob().readall())
-            return local_file_path
+
+            def download(path: str):
+                with open(path, "wb") as download_file:
+                    blob_client.download_blob(
+                        max_concurrency=UPLOAD_MAX_CONCURRENCY
+                    ).readinto(download_file)
+
+            return STORAGE_CACHE.get_file(
+                f"{UPLOAD_DIR}/{filename}",
+                lambda: blob_client.get_blob_properties().etag,
+                download,
+            )
         except ResourceNotFoundError as e:
             raise RuntimeError(f"Error downloading file from Azure Blob Storage: {e}")
 
+    def get_file_info(self, file_path: str) -> dict:
+        """Returns the `size` and `etag` of the object, and the path of its local copy."""
+        try:
+            filename = file_path.split("/")[-1]
+            properties = self.container_client.get_blob_client(
+                filename
+            ).get_blob_properties()
+            return {
+                "size": properties.size,
+                "etag": properties.etag,
+                "local_path": f"{UPLOAD_DIR}/{filename}",
+            }
+        except ResourceNotFoundError as e:
+            raise RuntimeError(f"Error getting file info from Azure Blob Storage: {e}")
+
+    def stream_file(self, file_path: str, start: int, end: int) -> Iterator[bytes]:
+        """Streams the bytes `start` to `end` (inclusive) of the object."""
+        try:
+            filename = file_path.split("/")[-1]
+            downloader = self.container_client.get_blob_client(filename).download_blob(
+                offset=start, length=end - start + 1
+            )
+            yield from downloader.chunks()
+        except ResourceNotFoundError as e:
+            raise RuntimeError(f"Error streaming file from Azure Blob Storage: {e}")
+
     def delete_file(self, file_path: str) -> None:
         """Handles deletion of the file from Azure Blob Storage."""
         try:
@@ -281,6 +686,7 @@ class AzureStorageProvider(StorageProvider):
 
         # Always delete from local storage
         LocalStorageProvider.delete_file(file_path)
+        STORAGE_CACHE.remove_file(f"{UPLOAD_DIR}/{filename}")
 
     def delete_all_files(self) -> None:
         """Handles deletion of all files from Azure Blob Storage."""
@@ -293,6 +699,7 @@ class AzureStorageProvider(StorageProvider):
 
         # Always delete from local storage
         LocalStorageProvider.delete_all_files()
+        STORAGE_CACHE.reset()
 
 
 def get_storage_provider(storage_provider: str):
@@ -0,0 +1,144 @@
+import pytest
+from open_webui.internal.db import Base, engine
+from open_webui.models import bm25_index
+from open_webui.models.bm25_index import (
+    BM25Collection,
+    BM25Deleted,
+    BM25Document,
+    BM25Index,
+    BM25Segment,
+)
+
+ITEMS = [
+    {"id": "1", "text": "the quick brown fox", "metadata": {"file_id": "a"}},
+    {"id": "2", "text": "the lazy dog sleeps", "metadata": {"file_id": "a"}},
+    {"id": "3", "text": "a quick dog runs fast", "metadata": {"file_id": "b"}},
+    {"id": "4", "text": "brown bears eat fish", "metadata": {"file_id": "b"}},
+]
+
+
+def search_ids(query, k=10):
+    return [result["id"] for result in BM25Index.search("test", query, k)]
+
+
+def search_scores(query, k=10):
+    return {
+        result["id"]: round(result["score"], 6)
+        for result in BM25Index.search("test", query, k)
+    }
+
+
+@pytest.fixture(autouse=True)
+def index():
+    models = (BM25Collection, BM25Segment, BM25Document, BM25Deleted)
+    Base.metadata.create_all(engine, tables=[model.__table__ for model in models])
+    BM25Index.reset()
+    yield BM25Index
+    BM25Index.reset()
+    BM25Index._segments.clear()
+
+
+class TestBM25Index:
+    def test_search(self):
+        assert BM25Index.search("test", "quick", 10) is None
+        assert BM25Index.build_collection("test", ITEMS)
+        assert BM25Index.has_collection("test")
+
+        assert sorted(search_ids("quick")) == ["1", "3"]
+        assert search_ids("bears")[0] == "4"
+        assert search_ids("missing") == []
+
+        result = BM25Index.search("test", "lazy", 10)[0]
+        assert result["content"] == "the lazy dog sleeps"
+        assert result["metadata"] == {"file_id": "a"}
+
+    def test_add_items(self):
+        BM25Index.build_collection("test", ITEMS)
+        assert BM25Index.add_items(
+            "test", [{"id": "5", "text": "quick quick zebra", "metadata": {}}]
+        )
+
+        assert search_ids("zebra") == ["5"]
+        assert search_ids("quick")[0] == "5"
+        # not indexed collections are left to be built on their first search
+        assert not BM25Index.add_items("other", ITEMS)
+
+    def test_delete_items(self):
+        BM25Index.build_collection("test", ITEMS)
+
+        assert BM25Index.delete_items("test", ids=["1"])
+        assert search_ids("quick") == ["3"]
+        assert search_ids("fox") == []
+
+        assert BM25Index.delete_items("test", filter={"file_id": "b"})
+        assert search_ids("quick") == []
+        assert search_ids("dog") == ["2"]
+
+    def test_upsert(self):
+        BM25Index.build_collection("test", ITEMS)
+        BM25Index.add_items(
+            "test",
+            [{"id": "1", "text": "a slow green turtle", "metadata": {}}],
+            replace=True,
+        )
+
+        assert search_ids("fox") == []
+        assert search_ids("turtle") == ["1"]
+        assert search_ids("the") == ["2"]
+
+    def test_merge(self, monkeypatch):
+        monkeypatch.setattr(bm25_index, "SEGMENT_MERGE_FACTOR", 100)
+        BM25Index.build_collection("test", ITEMS[:1])
+        for item in ITEMS[1:]:
+            BM25Index.add_items("test", [item])
+
+        queries = ["quick", "the dog", "brown fish", "lazy"]
+        expected = {query: search_scores(query) for query in queries}
+
+        monkeypatch.setattr(bm25_index, "SEGMENT_MERGE_FACTOR", 2)
+        with bm25_index.get_db() as db:
+            BM25Index._maybe_merge_segments(db, "test")
+            assert db.query(BM25Segment).count() == 1
+
+        for query in queries:
+            assert search_scores(query) == expected[query]
+
+    def test_merge_deleted(self, monkeypatch):
+        monkeypatch.setattr(bm25_index, "MAX_DELETED_RATIO", 1)
+        BM25Index.build_collection("test", ITEMS)
+        BM25Index.delete_items("test", ids=["1", "4"])
+
+        monkeypatch.setattr(bm25_index, "MAX_DELETED_RATIO", 0.25)
+        with bm25_index.get_db() as db:
+            BM25Index._maybe_merge_segments(db, "test")
+            assert db.query(BM25Deleted).count() == 0
+            assert db.query(BM25Segment).one().doc_count == 2
+
+        assert search_ids("quick") == ["3"]
+        assert search_ids("brown") == []
+        assert sorted(search_ids("dog")) == ["2", "3"]
+
+    def test_stale_build(self):
+        build_id = BM25Index.start_build("test")
+        assert build_id is not None
+        # already being indexed by another worker
+        assert BM25Index.start_build("test") is None
+        assert BM25Index.search("test", "quick", 10) is None
+
+        # the worker stopped during the build
+        with bm25_index.get_db() as db:
+            db.query(BM25Collection).update({"updated_at": 0})
+            db.commit()
+        new_build_id = BM25Index.start_build("test")
+        assert new_build_id not in (None, build_id)
+
+        assert not BM25Index.finish_build("test", build_id, ITEMS[:2])
+        assert BM25Index.finish_build("test", new_build_id, ITEMS)
+        assert sorted(search_ids("quick")) == ["1", "3"]
+
+    def test_build_cancelled_by_delete(self):
+        build_id = BM25Index.start_build("test")
+        assert not BM25Index.delete_items("test", ids=["1"])
+
+        assert not BM25Index.finish_build("test", build_id, ITEMS)
+        assert not BM25Index.has_collection("test")
@@ -0,0 +1,97 @@
+import pytest
+from open_webui.retrieval import embedding_cache
+from open_webui.retrieval.embedding_cache import EmbeddingCache
+
+
+class MockEmbeddings:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(texts)
+        return [[float(len(text)), 0.5] for text in texts]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(str(tmp_path / "embeddings.db"), max_size=1024 * 1024)
+
+
+class TestEmbeddingCache:
+    def test_get_embeddings(self, cache):
+        generate = MockEmbeddings()
+
+        assert cache.get_embeddings("", "model", ["a", "bb", "a"], generate) == [
+            [1.0, 0.5],
+            [2.0, 0.5],
+            [1.0, 0.5],
+        ]
+        # duplicates are only embedded once
+        assert generate.calls == [["a", "bb"]]
+
+        assert cache.get_embeddings("", "model", ["bb", "ccc"], generate) == [
+            [2.0, 0.5],
+            [3.0, 0.5],
+        ]
+        assert generate.calls == [["a", "bb"], ["ccc"]]
+
+        cache.get_embeddings("", "model", ["a", "bb", "ccc"], generate)
+        assert len(generate.calls) == 2
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 4
+        assert stats["misses"] == 4
+        assert stats["count"] == 3
+
+    def test_key(self, cache):
+        generate = MockEmbeddings()
+        cache.get_embeddings("openai:https://a/v1", "model", ["a"], generate)
+
+        # the engine includes the base URL of remote APIs
+        for engine, model in [
+            ("openai:https://b/v1", "model"),
+            ("ollama:https://a/v1", "model"),
+            ("openai:https://a/v1", "other-model"),
+        ]:
+            cache.get_embeddings(engine, model, ["a"], generate)
+        assert len(generate.calls) == 4
+
+        cache.get_embeddings("openai:https://a/v1", "model", ["a"], generate)
+        assert len(generate.calls) == 4
+
+    def test_embedding_count_mismatch(self, cache):
+        with pytest.raises(ValueError):
+            cache.get_embeddings("", "model", ["a", "b"], lambda texts: [[0.5]])
+        # nothing was cached
+        assert cache.get_many("", "model", ["a", "b"]) == [None, None]
+
+    def test_generate_error(self, cache):
+        assert cache.get_embeddings("", "model", ["a"], lambda texts: None) is None
+        assert cache.get_stats()["count"] == 0
+
+    def test_evict(self, cache, monkeypatch):
+        now = 1000
+        monkeypatch.setattr(embedding_cache.time, "time", lambda: now)
+        for text in ["a", "b", "c"]:
+            cache.set_many("", "model", [text], [[0.5]])
+            now += 1
+
+        # "a" was used since
+        now += embedding_cache.ACCESS_TIME_RESOLUTION + 1
+        assert cache.get_many("", "model", ["a"]) == [[0.5]]
+
+        # just enough over the max size for one embedding to be evicted
+        conn = cache._connect()
+        cache.max_size = int(
+            cache._get_size(conn) / 2 / embedding_cache.EVICTION_TARGET
+        )
+        cache._evict(conn)
+        assert cache.get_many("", "model", ["a", "b", "c"]) == [[0.5], None, [0.5]]
+
+    def test_clear(self, cache):
+        cache.get_embeddings("", "model", ["a"], MockEmbeddings())
+        cache.clear()
+        stats = cache.get_stats()
+        assert stats["count"] == 0
+        assert stats["hits"] == 0
+        assert stats["misses"] == 0
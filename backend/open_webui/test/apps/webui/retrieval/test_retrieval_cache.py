@@ -0,0 +1,96 @@
+import pytest
+from open_webui.retrieval import retrieval_cache
+
+
+class MockCollectionVersions:
+    def __init__(self):
+        self.versions = {}
+        self.fail = False
+
+    def get_versions(self, names):
+        if self.fail:
+            raise Exception("database unavailable")
+        return {name: self.versions.get(name, 0) for name in [*names, "*"]}
+
+
+@pytest.fixture
+def versions(monkeypatch):
+    versions = MockCollectionVersions()
+    monkeypatch.setattr(retrieval_cache, "CollectionVersions", versions)
+    return versions
+
+
+class TestRetrievalCache:
+    result = {"ids": [["1"]], "documents": [["doc"]], "distances": [[0.5]]}
+
+    def test_get_set(self, versions):
+        cache = retrieval_cache.RetrievalCache(max_size=10, ttl=60)
+        key = cache.get_key(["a"], ["query"], k=5)
+
+        assert cache.get(key) is None
+        cache.set(key, self.result)
+        assert cache.get(cache.get_key(["a"], ["query"], k=5)) == self.result
+        assert cache.get(cache.get_key(["a"], ["query"], k=10)) is None
+        assert cache.get_stats()["hits"] == 1
+        assert cache.get_stats()["misses"] == 2
+
+        # callers can modify the results they get
+        cache.get(key)["ids"][0].append("2")
+        assert cache.get(key) == self.result
+
+    def test_invalidation(self, versions):
+        cache = retrieval_cache.RetrievalCache(max_size=10, ttl=60)
+        cache.set(cache.get_key(["a", "b"], ["query"]), self.result)
+
+        versions.versions["c"] = 1
+        assert cache.get(cache.get_key(["a", "b"], ["query"])) == self.result
+        # a write to one of the collections
+        versions.versions["b"] = 1
+        assert cache.get(cache.get_key(["a", "b"], ["query"])) is None
+        cache.set(cache.get_key(["a", "b"], ["query"]), self.result)
+        # a reset, or a change of the embedding model
+        versions.versions["*"] = 1
+        assert cache.get(cache.get_key(["a", "b"], ["query"])) is None
+
+    def test_disabled(self, versions):
+        assert retrieval_cache.RetrievalCache(0, 60).get_key(["a"], ["q"]) is None
+        assert retrieval_cache.RetrievalCache(10, 0).get_key(["a"], ["q"]) is None
+
+        cache = retrieval_cache.RetrievalCache(max_size=10, ttl=60)
+        versions.fail = True
+        key = cache.get_key(["a"], ["query"])
+        assert key is None
+        cache.set(key, self.result)
+        assert cache.get(key) is None
+        assert cache.get_stats()["count"] == 0
+
+    def test_ttl(self, monkeypatch, versions):
+        now = [1000.0]
+        monkeypatch.setattr(retrieval_cache.time, "monotonic", lambda: now[0])
+        cache = retrieval_cache.RetrievalCache(max_size=10, ttl=60)
+        key = cache.get_key(["a"], ["query"])
+        cache.set(key, self.result)
+
+        now[0] += 59
+        assert cache.get(key) == self.result
+        now[0] += 2
+        assert cache.get(key) is None
+        assert cache.get_stats()["count"] == 0
+
+    def test_evict(self, versions):
+        cache = retrieval_cache.RetrievalCache(max_size=2, ttl=60)
+        keys = [cache.get_key(["a"], [query]) for query in ["q1", "q2", "q3"]]
+
+        cache.set(keys[0], self.result)
+        cache.set(keys[1], self.result)
+        # the least recently used result is evicted
+        cache.get(keys[0])
+        cache.set(keys[2], self.result)
+        assert cache.get(keys[0]) == self.result
+        assert cache.get(keys[1]) is None
+        assert cache.get(keys[2]) == self.result
+        assert cache.get_stats()["count"] == 2
+
+        cache.clear()
+        assert cache.get_stats()["count"] == 0
+        assert cache.get_stats()["hits"] == 0
@@ -1,5 +1,7 @@
+import hashlib
 import io
 import os
+from concurrent.futures import ThreadPoolExecutor
 import boto3
 import pytest
 from botocore.exceptions import ClientError
@@ -66,13 +68,17 @@ class TestLocalStorageProvider:
 
     def test_upload_file(self, monkeypatch, tmp_path):
         upload_dir = mock_upload_dir(monkeypatch, tmp_path)
-        contents, file_path = self.Storage.upload_file(self.file_bytesio, self.filename)
+        metadata, file_path = self.Storage.upload_file(self.file_bytesio, self.filename)
         assert (upload_dir / self.filename).exists()
         assert (upload_dir / self.filename).read_bytes() == self.file_content
-        assert contents == self.file_content
+        assert metadata == {
+            "size": len(self.file_content),
+            "sha256": hashlib.sha256(self.file_content).hexdigest(),
+        }
         assert file_path == str(upload_dir / self.filename)
         with pytest.raises(ValueError):
-            self.Storage.upload_file(self.file_bytesio_empty, self.filename)
+            self.Storage.upload_file(self.file_bytesio_empty, self.filename_extra)
+        assert not (upload_dir / self.filename_extra).exists()
 
     def test_get_file(self, monkeypatch, tmp_path):
         upload_dir = mock_upload_dir(monkeypatch, tmp_path)
@@ -97,6 +103,104 @@ class TestLocalStorageProvider:
         assert not (upload_dir / self.filename_extra).exists()
 
 
+class TestStorageCache:
+    file_content = b"test content"
+    filename = "test.txt"
+    filename_extra = "test_exyta.txt"
+
+    def get_file(self, cache, file_path, etag, downloads):
+        def download(path):
+            downloads.append(file_path)
+            with open(path, "wb") as f:
+                f.write(self.file_content)
+
+        return cache.get_file(file_path, lambda: etag, download)
+
+    def test_get_file(self, monkeypatch, tmp_path):
+        upload_dir = mock_upload_dir(monkeypatch, tmp_path)
+        monkeypatch.setattr(provider, "CACHE_VALIDATION_INTERVAL", 0)
+        cache = provider.StorageCache(max_size=1024)
+        file_path = str(upload_dir / self.filename)
+        downloads = []
+
+        assert self.get_file(cache, file_path, '"v1"', downloads) == file_path
+        assert (upload_dir / self.filename).read_bytes() == self.file_content
+        self.get_file(cache, file_path, '"v1"', downloads)
+        assert len(downloads) == 1
+        # the object changed
+        self.get_file(cache, file_path, '"v2"', downloads)
+        assert len(downloads) == 2
+        assert cache.get_stats()["hits"] == 1
+        assert cache.get_stats()["misses"] == 2
+
+        cache.remove_file(file_path)
+        self.get_file(cache, file_path, '"v2"', downloads)
+        assert len(downloads) == 3
+
+    def test_get_file_concurrently(self, monkeypatch, tmp_path):
+        upload_dir = mock_upload_dir(monkeypatch, tmp_path)
+        cache = provider.StorageCache(max_size=1024)
+        file_path = str(upload_dir / self.filename)
+        downloads = []
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(
+                executor.map(
+                    lambda _: self.get_file(cache, file_path, '"v1"', downloads),
+                    range(8),
+                )
+            )
+        assert results == [file_path] * 8
+        assert len(downloads) == 1
+
+    def test_evict(self, monkeypatch, tmp_path):
+        upload_dir = mock_upload_dir(monkeypatch, tmp_path)
+        cache = provider.StorageCache(max_size=len(self.file_content) * 3 // 2)
+        file_path = str(upload_dir / self.filename)
+        file_path_extra = str(upload_dir / self.filename_extra)
+        downloads = []
+
+        self.get_file(cache, file_path, '"v1"', downloads)
+        os.utime(file_path, (0, 0))
+        self.get_file(cache, file_path_extra, '"v1"', downloads)
+        # the least recently used file is evicted
+        assert not (upload_dir / self.filename).exists()
+        assert (upload_dir / self.filename_extra).exists()
+        assert cache.get_stats()["evictions"] == 1
+        assert cache.get_stats()["count"] == 1
+
+    def test_tracked_size(self, monkeypatch, tmp_path):
+        upload_dir = mock_upload_dir(monkeypatch, tmp_path)
+        # cached by a previous run
+        (upload_dir / self.filename_extra).write_bytes(self.file_content)
+        cache = provider.StorageCache(max_size=1024)
+        scan = cache._scan
+        scans = []
+        monkeypatch.setattr(
+            cache, "_scan", lambda directory: scans.append(directory) or scan(directory)
+        )
+        file_path = str(upload_dir / self.filename)
+        downloads = []
+
+        self.get_file(cache, file_path, '"v1"', downloads)
+        assert cache.get_stats()["count"] == 2
+        assert cache.get_stats()["size"] == 2 * len(self.file_content)
+
+        self.get_file(cache, file_path, '"v2"', downloads)
+        os.remove(upload_dir / self.filename_extra)
+        cache.remove_file(str(upload_dir / self.filename_extra))
+        assert cache.get_stats()["count"] == 1
+        assert cache.get_stats()["size"] == len(self.file_content)
+        # UPLOAD_DIR is only scanned once
+        assert len(scans) == 1
+
+        # the files were deleted
+        os.remove(file_path)
+        cache.reset()
+        assert cache.get_stats()["count"] == 0
+        assert len(scans) == 2
+
+
 @mock_aws
 class TestS3StorageProvider:
 
@@ -116,7 +220,7 @@ class TestS3StorageProvider:
         with pytest.raises(Exception):
             self.Storage.upload_file(io.BytesIO(self.file_content), self.filename)
         self.s3_client.create_bucket(Bucket=self.Storage.bucket_name)
-        contents, s3_file_path = self.Storage.upload_file(
+        metadata, s3_file_path = self.Storage.upload_file(
             io.BytesIO(self.file_content), self.filename
         )
         object = self.s3_client.Object(self.Storage.bucket_name, self.filename)
@@ -124,7 +228,10 @@ class TestS3StorageProvider:
         # local checks
         assert (upload_dir / self.filename).exists()
         assert (upload_dir / self.filename).read_bytes() == self.file_content
-        assert contents == self.file_content
+        assert metadata == {
+            "size": len(self.file_content),
+            "sha256": hashlib.sha256(self.file_content).hexdigest(),
+        }
         assert s3_file_path == "s3://" + self.Storage.bucket_name + "/" + self.filename
         with pytest.raises(ValueError):
             self.Storage.upload_file(self.file_bytesio_empty, self.filename)
@@ -132,7 +239,7 @@ class TestS3StorageProvider:
     def test_get_file(self, monkeypatch, tmp_path):
         upload_dir = mock_upload_dir(monkeypatch, tmp_path)
         self.s3_client.create_bucket(Bucket=self.Storage.bucket_name)
-        contents, s3_file_path = self.Storage.upload_file(
+        metadata, s3_file_path = self.Storage.upload_file(
             io.BytesIO(self.file_content), self.filename
         )
         file_path = self.Storage.get_file(s3_file_path)
@@ -142,7 +249,7 @@ class TestS3StorageProvider:
     def test_delete_file(self, monkeypatch, tmp_path):
         upload_dir = mock_upload_dir(monkeypatch, tmp_path)
         self.s3_client.create_bucket(Bucket=self.Storage.bucket_name)
-        contents, s3_file_path = self.Storage.upload_file(
+        metadata, s3_file_path = self.Storage.upload_file(
             io.BytesIO(self.file_content), self.filename
         )
         assert (upload_dir / self.filename).exists()
@@ -218,7 +325,7 @@ class TestGCSStorageProvider:
         with pytest.raises(Exception):
             self.Storage.bucket = monkeypatch(self.Storage, "bucket", None)
             self.Storage.upload_file(io.BytesIO(self.file_content), self.filename)
-        contents, gcs_file_path = self.Storage.upload_file(
+        metadata, gcs_file_path = self.Storage.upload_file(
             io.BytesIO(self.file_content), self.filename
         )
         object = self.Storage.bucket.get_blob(self.filename)
@@ -226,7 +333,10 @@ class TestGCSStorageProvider:
         # local checks
         assert (upload_dir / self.filename).exists()
         assert (upload_dir / self.filename).read_bytes() == self.file_content
-        assert contents == self.file_content
+        assert metadata == {
+            "size": len(self.file_content),
+            "sha256": hashlib.sha256(self.file_content).hexdigest(),
+        }
         assert gcs_file_path == "gs://" + self.Storage.bucket_name + "/" + self.filename
         # test error if file is empty
         with pytest.raises(ValueError):
@@ -234,16 +344,21 @@ class TestGCSStorageProvider:
 
     def test_get_file(self, monkeypatch, tmp_path, setup):
         upload_dir = mock_upload_dir(monkeypatch, tmp_path)
-        contents, gcs_file_path = self.Storage.upload_file(
+        metadata, gcs_file_path = self.Storage.upload_file(
             io.BytesIO(self.file_content), self.filename
         )
         file_path = self.Storage.get_file(gcs_file_path)
         assert file_path == str(upload_dir / self.filename)
         assert (upload_dir / self.filename).exists()
 
+    def test_get_file_not_found(self, monkeypatch, tmp_path, setup):
+        mock_upload_dir(monkeypatch, tmp_path)
+        with pytest.raises(RuntimeError):
+            self.Storage.get_file(f"gs://{self.Storage.bucket_name}/missing.txt")
+
     def test_delete_file(self, monkeypatch, tmp_path, setup):
         upload_dir = mock_upload_dir(monkeypatch, tmp_path)
-        contents, gcs_file_path = self.Storage.upload_file(
+        metadata, gcs_file_path = self.Storage.upload_file(
             io.BytesIO(self.file_content), self.filename
         )
         # ensure that local directory has the uploaded file as well
@@ -337,16 +452,20 @@ class TestAzureStorageProvider:
         # Reset side effect and create container
         self.Storage.container_client.get_blob_client.side_effect = None
         self.Storage.create_container()
-        contents, azure_file_path = self.Storage.upload_file(
+        metadata, azure_file_path = self.Storage.upload_file(
             io.BytesIO(self.file_content), self.filename
         )
 
         # Assertions
         self.Storage.container_client.get_blob_client.assert_called_with(self.filename)
-        self.Storage.container_client.get_blob_client().upload_blob.assert_called_once_with(
-            self.file_content, overwrite=True
-        )
-        assert contents == self.file_content
+        upload_blob = self.Storage.container_client.get_blob_client().upload_blob
+        upload_blob.assert_called_once()
+        assert upload_blob.call_args.kwargs["length"] == len(self.file_content)
+        assert upload_blob.call_args.kwargs["overwrite"] is True
+        assert metadata == {
+            "size": len(self.file_content),
+            "sha256": hashlib.sha256(self.file_content).hexdigest(),
+        }
         assert (
             azure_file_path
             == f"https://myaccount.blob.core.windows.net/{self.Storage.container_name}/{self.filename}"
@@ -364,7 +483,7 @@ class TestAzureStorageProvider:
         # Mock upload behavior
         self.Storage.upload_file(io.BytesIO(self.file_content), self.filename)
         # Mock blob download behavior
-        self.Storage.container_client.get_blob_client().download_blob().readall.return_value = (
+        self.Storage.container_client.get_blob_client().download_blob().readinto.side_effect = lambda f: f.write(
             self.file_content
         )
 
@@ -0,0 +1,56 @@
+import pytest
+from fastapi import HTTPException
+from open_webui.utils.files import get_file_content_headers, parse_range_header
+
+
+@pytest.mark.parametrize(
+    "range_header, expected",
+    [
+        ("bytes=0-99", (0, 99)),
+        ("bytes=100-", (100, 999)),
+        ("bytes=-50", (950, 999)),
+        ("bytes=-5000", (0, 999)),
+        ("bytes=900-5000", (900, 999)),
+        (" bytes = 10-20 ", (10, 20)),
+    ],
+)
+def test_parse_range_header(range_header, expected):
+    assert parse_range_header(range_header, 1000) == expected
+
+
+@pytest.mark.parametrize(
+    "range_header",
+    [
+        None,
+        "",
+        "bytes=0-1,5-6",
+        "items=0-1",
+        "bytes=abc",
+        "bytes=-",
+        "bytes=5-2",
+    ],
+)
+def test_parse_range_header_ignored(range_header):
+    assert parse_range_header(range_header, 1000) is None
+
+
+@pytest.mark.parametrize("range_header", ["bytes=1000-", "bytes=2000-3000"])
+def test_parse_range_header_not_satisfiable(range_header):
+    with pytest.raises(HTTPException) as exc_info:
+        parse_range_header(range_header, 1000)
+    assert exc_info.value.status_code == 416
+    assert exc_info.value.headers == {"Content-Range": "bytes */1000"}
+
+
+def test_get_file_content_headers():
+    assert get_file_content_headers("doc.PDF", None) == (
+        {"Content-Disposition": "inline; filename*=UTF-8''doc.PDF"},
+        "application/pdf",
+    )
+    assert get_file_content_headers("notes.txt", "text/plain") == ({}, "text/plain")
+    assert get_file_content_headers("résumé 1.docx", "application/msword") == (
+        {
+            "Content-Disposition": "attachment; filename*=UTF-8''r%C3%A9sum%C3%A9%201.docx"
+        },
+        "application/msword",
+    )
@@ -0,0 +1,142 @@
+import asyncio
+import time
+
+import fakeredis
+import pytest
+import redis.asyncio
+from open_webui.utils import job_queue
+from open_webui.utils.job_queue import JobModel, LocalJobQueue, RedisJobQueue
+
+
+def make_job(job_id, user_id):
+    now = int(time.time())
+    return JobModel(
+        id=job_id, type="test", user_id=user_id, created_at=now, updated_at=now
+    )
+
+
+async def claim_all(queue):
+    claimed = []
+    while job := await queue.claim():
+        claimed.append(job.id)
+    return claimed
+
+
+@pytest.fixture
+def redis_queue(monkeypatch):
+    server = fakeredis.FakeServer()
+    monkeypatch.setattr(
+        redis.asyncio.Redis,
+        "from_url",
+        classmethod(
+            lambda cls, url, **kwargs: fakeredis.FakeAsyncRedis(server=server, **kwargs)
+        ),
+    )
+    return RedisJobQueue("redis://localhost")
+
+
+async def submit_jobs(queue):
+    for job_id in ["a1", "a2", "a3"]:
+        await queue.submit(make_job(job_id, "alice"))
+    for job_id in ["b1", "b2"]:
+        await queue.submit(make_job(job_id, "bob"))
+
+
+class TestLocalJobQueue:
+    def test_round_robin(self):
+        queue = LocalJobQueue()
+
+        async def run():
+            await submit_jobs(queue)
+            return await claim_all(queue)
+
+        # Bob's jobs don't wait for all of Alice's
+        assert asyncio.run(run()) == ["a1", "b1", "a2", "b2", "a3"]
+
+    def test_get_update(self):
+        queue = LocalJobQueue()
+
+        async def run():
+            job = make_job("a1", "alice")
+            await queue.submit(job)
+            claimed = await queue.claim()
+            claimed.status = "completed"
+            await queue.update(claimed)
+            return await queue.get("a1"), await queue.claim()
+
+        job, next_job = asyncio.run(run())
+        assert job.status == "completed"
+        assert next_job is None
+
+    def test_prune(self):
+        queue = LocalJobQueue()
+
+        async def run():
+            old = make_job("old", "alice")
+            old.status = "failed"
+            old.updated_at -= job_queue.JOB_RESULT_TTL + 1
+            running = make_job("running", "alice")
+            running.updated_at -= job_queue.JOB_RESULT_TTL + 1
+            for job in [old, running]:
+                await queue.submit(job)
+            await claim_all(queue)
+            await queue.submit(make_job("new", "alice"))
+            return await queue.get("old"), await queue.get("running")
+
+        old, running = asyncio.run(run())
+        assert old is None
+        assert running is not None
+
+
+class TestRedisJobQueue:
+    def test_round_robin(self, redis_queue):
+        async def run():
+            await submit_jobs(redis_queue)
+            return await claim_all(redis_queue)
+
+        assert asyncio.run(run()) == ["a1", "b1", "a2", "b2", "a3"]
+
+    def test_requeue_expired(self, redis_queue, monkeypatch):
+        async def run():
+            await submit_jobs(redis_queue)
+            job = await redis_queue.claim()
+            job.status = "running"
+            job.attempts = 1
+            await redis_queue.update(job)
+
+            # Renewed leases aren't requeued
+            await redis_queue.renew(job)
+            assert await redis_queue.requeue_expired() == []
+
+            now = time.time() + job_queue.JOB_LEASE + 1
+            monkeypatch.setattr(job_queue.time, "time", lambda: now)
+            assert await redis_queue.requeue_expired() == []
+            return await redis_queue.get(job.id), await claim_all(redis_queue)
+
+        job, claimed = asyncio.run(run())
+        assert job.status == "pending"
+        # The job is back at the head of its user's queue
+        assert claimed == ["b1", "a1", "b2", "a2", "a3"]
+
+    def test_requeue_expired_max_attempts(self, redis_queue, monkeypatch):
+        async def run():
+            await redis_queue.submit(make_job("a1", "alice"))
+            job = await redis_queue.claim()
+            job.status = "running"
+            job.attempts = job_queue.JOB_MAX_ATTEMPTS
+            await redis_queue.update(job)
+
+            now = time.time() + job_queue.JOB_LEASE + 1
+            monkeypatch.setattr(job_queue.time, "time", lambda: now)
+            exhausted = await redis_queue.requeue_expired()
+            # Only one worker gets to fail the job
+            return (
+                exhausted,
+                await redis_queue.requeue_expired(),
+                await redis_queue.claim(),
+            )
+
+        exhausted, again, claimed = asyncio.run(run())
+        assert [job.id for job in exhausted] == ["a1"]
+        assert again == []
+        assert claimed is None
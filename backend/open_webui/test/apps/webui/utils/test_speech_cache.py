@@ -0,0 +1,118 @@
+import asyncio
+import os
+
+from open_webui.utils import speech_cache
+from open_webui.utils.speech_cache import SpeechCache
+
+
+async def generate_chunks(count, size=100):
+    for _ in range(count):
+        yield b"a" * size
+
+
+def write_clip(cache, key, size):
+    cache.get_file_path(key).write_bytes(b"a" * size)
+    cache.add_file(key, "audio/mpeg", engine="openai")
+
+
+class TestSpeechCache:
+    def test_get_key(self, tmp_path):
+        cache = SpeechCache(tmp_path, 1000)
+        key = cache.get_key("openai", "tts-1", "alloy", "hello   world", speed=1)
+        assert key == cache.get_key("openai", "tts-1", "alloy", " hello world", speed=1)
+        assert key != cache.get_key("openai", "tts-1", "echo", "hello world", speed=1)
+        assert key != cache.get_key("openai", "tts-1", "alloy", "hello world", speed=2)
+
+    def test_get_file(self, tmp_path):
+        cache = SpeechCache(tmp_path, 1000)
+        assert cache.get_file("clip") is None
+        write_clip(cache, "clip", 100)
+        assert cache.get_file("clip") == (cache.get_file_path("clip"), "audio/mpeg")
+
+        stats = cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["count"] == 1
+        assert stats["size"] == 100
+        assert stats["engines"] == {"openai": 1}
+
+    def test_get_file_removed(self, tmp_path):
+        cache = SpeechCache(tmp_path, 1000)
+        write_clip(cache, "clip", 100)
+        cache.get_file_path("clip").unlink()
+        assert cache.get_file("clip") is None
+        assert cache.get_stats()["count"] == 0
+
+    def test_evict(self, tmp_path, monkeypatch):
+        now = 1000.0
+        monkeypatch.setattr(speech_cache.time, "time", lambda: now)
+        cache = SpeechCache(tmp_path, 1000)
+        for i in range(4):
+            write_clip(cache, f"clip{i}", 200)
+            now += 1
+        # clip0 is now the most recently played
+        assert cache.get_file("clip0") is not None
+        now += 1
+
+        # 1200 bytes exceed the max size, so clips are evicted down to 900
+        write_clip(cache, "clip4", 400)
+        assert not cache.get_file_path("clip1").exists()
+        assert not cache.get_file_path("clip2").exists()
+        assert cache.get_file_path("clip0").exists()
+        assert cache.get_file_path("clip3").exists()
+        assert cache.get_file_path("clip4").exists()
+
+        stats = cache.get_stats()
+        assert stats["size"] == 800
+        assert stats["evictions"] == 2
+
+    def test_evict_keeps_added_clip(self, tmp_path):
+        cache = SpeechCache(tmp_path, 1000)
+        write_clip(cache, "clip", 1500)
+        assert cache.get_file_path("clip").exists()
+        assert cache.get_stats()["count"] == 1
+
+    def test_stream_to_file(self, tmp_path):
+        cache = SpeechCache(tmp_path, 1000)
+
+        async def consume():
+            return b"".join(
+                [
+                    chunk
+                    async for chunk in cache.stream_to_file(
+                        "clip", generate_chunks(5), "audio/mpeg", engine="openai"
+                    )
+                ]
+            )
+
+        assert asyncio.run(consume()) == b"a" * 500
+        assert cache.get_file("clip") == (cache.get_file_path("clip"), "audio/mpeg")
+        assert cache.get_file_path("clip").read_bytes() == b"a" * 500
+        assert not list(tmp_path.glob("*.tmp"))
+
+    def test_stream_to_file_aborted(self, tmp_path):
+        cache = SpeechCache(tmp_path, 1000)
+
+        async def consume():
+            chunks = cache.stream_to_file("clip", generate_chunks(5), "audio/mpeg")
+            await chunks.__anext__()
+            await chunks.aclose()
+
+        asyncio.run(consume())
+        assert not cache.get_file_path("clip").exists()
+        assert cache.get_file("clip") is None
+        assert not list(tmp_path.glob("*.tmp"))
+
+    def test_legacy_files(self, tmp_path):
+        (tmp_path / "legacy.mp3").write_bytes(b"a" * 100)
+        (tmp_path / "legacy.json").write_text("{}")
+        stale = tmp_path / "stale.tmp"
+        stale.write_bytes(b"a")
+        os.utime(stale, (0, 0))
+        (tmp_path / "recent.tmp").write_bytes(b"a")
+
+        cache = SpeechCache(tmp_path, 1000)
+        assert cache.get_file("legacy") == (tmp_path / "legacy.mp3", "audio/mpeg")
+        assert not (tmp_path / "legacy.json").exists()
+        assert not stale.exists()
+        assert (tmp_path / "recent.tmp").exists()
@@ -0,0 +1,102 @@
+"""
+Benchmark for the BM25 side of hybrid search.
+
+Compares the per-query latency of building `BM25Retriever.from_texts` over the whole
+collection (what `query_doc_with_hybrid_search` did on every query) against searching
+the persistent `BM25Index`, on a generated 50k chunk collection. Runs against a
+temporary SQLite database unless DATABASE_URL is set.
+
+    python -m open_webui.test.benchmarks.bench_bm25_index [chunks]
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+from langchain_community.retrievers import BM25Retriever
+
+from open_webui.internal.db import Base, engine
+from open_webui.models.bm25_index import (
+    BM25Collection,
+    BM25Deleted,
+    BM25Document,
+    BM25Index,
+    BM25Segment,
+)
+
+VOCABULARY = [f"term{i}" for i in range(20000)]
+QUERIES = ["term5 term300 term1200", "term15000 term19999", "term0 term1 term2"]
+COLLECTION_NAME = "bench-bm25"
+
+
+def generate_items(count, seed=0):
+    rng = random.Random(seed)
+    # Zipf-like term frequencies, so a few terms are in most of the chunks
+    weights = [1 / (i + 1) for i in range(len(VOCABULARY))]
+    return [
+        {
+            "id": str(i),
+            "text": " ".join(rng.choices(VOCABULARY, weights, k=rng.randint(50, 200))),
+            "metadata": {"file_id": f"file-{i % 100}"},
+        }
+        for i in range(count)
+    ]
+
+
+def timeit(func, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def legacy_search(items, query, k):
+    retriever = BM25Retriever.from_texts(
+        texts=[item["text"] for item in items],
+        metadatas=[item["metadata"] for item in items],
+    )
+    retriever.k = k
+    return retriever.invoke(query)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    items = generate_items(count)
+    print(f"{count} chunks")
+
+    Base.metadata.create_all(
+        engine,
+        tables=[
+            BM25Collection.__table__,
+            BM25Segment.__table__,
+            BM25Document.__table__,
+            BM25Deleted.__table__,
+        ],
+    )
+
+    build, _ = timeit(lambda: BM25Index.build_collection(COLLECTION_NAME, items), 1)
+    print(f"{'build':>24}: {build * 1000:.0f}ms (once per collection)")
+
+    for query in QUERIES:
+        legacy_time, _ = timeit(lambda: legacy_search(items, query, 10), repeat=1)
+        index_time, results = timeit(
+            lambda: BM25Index.search(COLLECTION_NAME, query, 10), repeat=20
+        )
+        assert len(results) == 10
+        print(
+            f"{query:>24}: legacy {legacy_time * 1000:.0f}ms, index {index_time * 1000:.2f}ms "
+            f"({legacy_time / index_time:.0f}x)"
+        )
+
+    BM25Index.delete_collection(COLLECTION_NAME)
+
+
+if __name__ == "__main__":
+    main()
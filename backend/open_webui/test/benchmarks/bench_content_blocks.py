@@ -0,0 +1,94 @@
+"""
+Micro-benchmark for the streaming response post-processor.
+
+Replays an SSE stream (recorded, or a generated ~20k token stream with a reasoning
+section) through the same per-chunk work `stream_body_handler` does: parse the
+event, append the delta to the content blocks and serialize them. The incremental
+`ContentBlocksStream` is compared against re-serializing every block on each chunk.
+
+    python -m open_webui.test.benchmarks.bench_content_blocks [recorded_stream.txt]
+"""
+
+import json
+import random
+import sys
+import time
+
+from open_webui.utils.content_blocks import (
+    ContentBlocksStream,
+    serialize_content_blocks,
+)
+
+WORDS = ["the", "model", "is", "thinking", "about", "a", "long", "answer", "and"]
+
+
+def generate_stream(tokens=20000, seed=0):
+    rng = random.Random(seed)
+    deltas = ["<think>"]
+    for i in range(tokens):
+        if i == tokens // 2:
+            deltas.append("</think>\n\n")
+        deltas.append(rng.choice(WORDS) + ("\n" if rng.random() < 0.05 else " "))
+
+    return [
+        "data: " + json.dumps({"choices": [{"delta": {"content": delta}}]})
+        for delta in deltas
+    ] + ["data: [DONE]"]
+
+
+def load_stream(path):
+    with open(path) as f:
+        return [line.rstrip("\n") for line in f if line.startswith("data:")]
+
+
+def iter_deltas(lines):
+    for line in lines:
+        data = line[len("data:") :].strip()
+        if data == "[DONE]":
+            break
+        value = json.loads(data)["choices"][0]["delta"].get("content")
+        if value:
+            yield value
+
+
+def replay(lines, incremental):
+    stream = ContentBlocksStream()
+    per_chunk = []
+    output = ""
+
+    for value in iter_deltas(lines):
+        start = time.perf_counter()
+        stream.append(value)
+        if incremental:
+            output = stream.serialize()
+        else:
+            output = serialize_content_blocks(stream.content_blocks)
+        per_chunk.append(time.perf_counter() - start)
+
+    return stream, output, per_chunk
+
+
+def report(name, per_chunk):
+    per_chunk = sorted(per_chunk)
+    total = sum(per_chunk)
+    p99 = per_chunk[int(len(per_chunk) * 0.99) - 1]
+    print(
+        f"{name:>12}: {len(per_chunk)} chunks, total {total * 1000:.1f}ms, "
+        f"avg {total / len(per_chunk) * 1e6:.1f}us, p99 {p99 * 1e6:.1f}us, "
+        f"max {per_chunk[-1] * 1e6:.1f}us"
+    )
+
+
+def main():
+    lines = load_stream(sys.argv[1]) if len(sys.argv) > 1 else generate_stream()
+
+    _, _, full = replay(lines, incremental=False)
+    stream, output, incremental = replay(lines, incremental=True)
+    assert output == serialize_content_blocks(stream.content_blocks)
+
+    report("full", full)
+    report("incremental", incremental)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Benchmark for the sensitive word filter automaton.
+
+Compares `wordsSearch` against the previous object-per-node trie (reproduced below
+as `LegacyWordsSearch`) on a generated 50k word dictionary: build time, loading the
+cached automaton, and `FindAll` / `Replace` on a 10 KB message.
+
+    python -m open_webui.test.benchmarks.bench_words_search [words_file]
+"""
+
+import random
+import sys
+import tempfile
+import time
+
+from open_webui.apps.filter.wordsSearch import load_words_search, wordsSearch
+
+ALPHABET = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)] + list(
+    "abcdefghijklmnopqrstuvwxyz"
+)
+
+
+class LegacyNode:
+    def __init__(self):
+        self.End = False
+        self.Results = []
+        self.m_values = {}
+        self.Failure = None
+        self.Parent = None
+        self.Char = None
+        self.Layer = 0
+        self.Index = 0
+
+
+class LegacyWordsSearch:
+    """The trie of Python objects `wordsSearch` used before (scan functions only)."""
+
+    def SetKeywords(self, keywords):
+        self._keywords = keywords
+        root = LegacyNode()
+        layers = {}
+        for i, p in enumerate(keywords):
+            nd = root
+            for j, c in enumerate(p):
+                c = ord(c)
+                if c not in nd.m_values:
+                    node = LegacyNode()
+                    node.Parent, node.Char = nd, c
+                    nd.m_values[c] = node
+                nd = nd.m_values[c]
+                if nd.Layer == 0:
+                    nd.Layer = j + 1
+                    layers.setdefault(nd.Layer, []).append(nd)
+            nd.End = True
+            nd.Results.append(i)
+
+        nodes = [root] + [nd for layer in layers.values() for nd in layer]
+        for i, nd in enumerate(nodes[1:], 1):
+            nd.Index = i
+            r = nd.Parent.Failure
+            while r is not None and nd.Char not in r.m_values:
+                r = r.Failure
+            if r is None:
+                nd.Failure = root
+            else:
+                nd.Failure = r.m_values[nd.Char]
+                for key in nd.Failure.Results:
+                    nd.End = True
+                    nd.Results.append(key)
+        root.Failure = root
+
+        for nd in nodes:
+            fail = nd.Failure
+            while fail is not root:
+                for key, value in fail.m_values.items():
+                    nd.m_values.setdefault(key, value)
+                fail = fail.Failure
+
+        self._first = root
+
+    def _next(self, ptr, t):
+        tn = None
+        if ptr is not None:
+            tn = ptr.m_values.get(t)
+        if tn is None:
+            tn = self._first.m_values.get(t)
+        return tn
+
+    def FindAll(self, text):
+        ptr = None
+        key_list = []
+        for index in range(len(text)):
+            tn = self._next(ptr, ord(text[index]))
+            if tn is not None and tn.End:
+                for item in tn.Results:
+                    keyword = self._keywords[item]
+                    key_list.append(
+                        {
+                            "Keyword": keyword,
+                            "Success": True,
+                            "End": index,
+                            "Start": index + 1 - len(keyword),
+                            "Index": item,
+                        }
+                    )
+            ptr = tn
+        return key_list
+
+    def Replace(self, text, replaceChar="*"):
+        result = list(text)
+        ptr = None
+        for i in range(len(text)):
+            tn = self._next(ptr, ord(text[i]))
+            if tn is not None and tn.End:
+                maxLength = len(self._keywords[tn.Results[0]])
+                for j in range(i + 1 - maxLength, i + 1):
+                    result[j] = replaceChar
+            ptr = tn
+        return "".join(result)
+
+
+def generate_words(count=50000, seed=0):
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < count:
+        words.add("".join(rng.choices(ALPHABET, k=rng.randint(2, 6))))
+    return sorted(words)
+
+
+def generate_text(words, size=10000, seed=1):
+    rng = random.Random(seed)
+    parts = []
+    while sum(len(part) for part in parts) < size:
+        if rng.random() < 0.01:
+            parts.append(rng.choice(words))
+        else:
+            parts.append(rng.choice(ALPHABET))
+    return "".join(parts)[:size]
+
+
+def timeit(func, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding="utf-8") as f:
+            words = sorted(set(line.strip() for line in f if line.strip()))
+    else:
+        words = generate_words()
+    text = generate_text(words)
+    print(f"{len(words)} words, {len(text)} character message")
+
+    legacy = LegacyWordsSearch()
+    legacy_build, _ = timeit(lambda: legacy.SetKeywords(words), repeat=1)
+
+    search = wordsSearch()
+    build, _ = timeit(lambda: search.SetKeywords(words), repeat=1)
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        load_words_search(words, cache_dir)
+        load, _ = timeit(lambda: load_words_search(words, cache_dir), repeat=3)
+
+    print(
+        f"{'build':>10}: legacy {legacy_build * 1000:.0f}ms, new {build * 1000:.0f}ms"
+    )
+    print(f"{'load':>10}: cached {load * 1000:.0f}ms")
+
+    for name in ["FindAll", "Replace"]:
+        legacy_time, legacy_result = timeit(lambda: getattr(legacy, name)(text))
+        new_time, new_result = timeit(lambda: getattr(search, name)(text))
+        assert legacy_result == new_result
+        print(
+            f"{name:>10}: legacy {legacy_time * 1000:.2f}ms, new {new_time * 1000:.2f}ms "
+            f"({legacy_time / new_time:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
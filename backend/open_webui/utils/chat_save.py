@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Optional
+
+from open_webui.models.chats import Chats
+from open_webui.env import (
+    CHAT_SAVE_THREAD_POOL_SIZE,
+    REALTIME_CHAT_SAVE_INTERVAL,
+    REALTIME_CHAT_SAVE_MAX_CHUNKS,
+    SRC_LOG_LEVELS,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["MAIN"])
+
+
+####################
+# Async persistence
+####################
+
+# Blocking chat reads/writes run here instead of on the event loop
+CHAT_SAVE_EXECUTOR = ThreadPoolExecutor(
+    max_workers=CHAT_SAVE_THREAD_POOL_SIZE, thread_name_prefix="chat_save"
+)
+
+# chat_id -> [lock, number of pending calls]
+CHAT_LOCKS: dict[str, list] = {}
+
+
+async def run_in_chat_executor(chat_id: str, func: Callable, *args, **kwargs) -> Any:
+    """
+    Runs a blocking `Chats` call on the chat save thread pool.
+
+    Calls for the same chat are serialized in the order they were made (asyncio locks
+    are FIFO), so concurrent events for a message can't overwrite each other out of order.
+    """
+    entry = CHAT_LOCKS.setdefault(chat_id, [asyncio.Lock(), 0])
+    entry[1] += 1
+    try:
+        async with entry[0]:
+            return await asyncio.get_running_loop().run_in_executor(
+                CHAT_SAVE_EXECUTOR, partial(func, *args, **kwargs)
+            )
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            CHAT_LOCKS.pop(chat_id, None)
+
+
+####################
+# Write-behind buffer
+####################
+
+
+class ChatSaveStats:
+    def __init__(self):
+        self.updates = 0  # updates handed to a buffer
+        self.flushes = 0  # writes issued to the database
+        self.dropped = 0  # writes that failed and were discarded
+        self.flush_time_total = 0.0
+        self.flush_time_max = 0.0
+
+    def record_flush(self, duration: float, success: bool):
+        self.flushes += 1
+        if not success:
+            self.dropped += 1
+
+        self.flush_time_total += duration
+        self.flush_time_max = max(self.flush_time_max, duration)
+
+    def to_dict(self) -> dict:
+        return {
+            "updates": self.updates,
+            "flushes": self.flushes,
+            "dropped": self.dropped,
+            "coalesced": max(self.updates - self.flushes, 0),
+            "flush_latency_avg": (
+                self.flush_time_total / self.flushes if self.flushes else 0.0
+            ),
+            "flush_latency_max": self.flush_time_max,
+        }
+
+
+CHAT_SAVE_STATS = ChatSaveStats()
+
+
+def get_chat_save_stats() -> dict:
+    return CHAT_SAVE_STATS.to_dict()
+
+
+class MessageWriteBuffer:
+    """
+    Write-behind buffer for the realtime saves of a single chat message.
+
+    Updates are merged in memory and written at most every `interval` seconds or
+    every `max_chunks` updates. Values may be zero-argument callables, which are
+    only evaluated when the buffer is flushed (e.g. serializing the content blocks).
+    """
+
+    def __init__(
+        self,
+        chat_id: str,
+        message_id: str,
+        interval: float = REALTIME_CHAT_SAVE_INTERVAL,
+        max_chunks: int = REALTIME_CHAT_SAVE_MAX_CHUNKS,
+    ):
+        self.chat_id = chat_id
+        self.message_id = message_id
+        self.interval = interval
+        self.max_chunks = max_chunks
+
+        self.pending = {}
+        self.chunks = 0
+        self.last_flush = time.monotonic()
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def update(self, message: dict):
+        self.pending = {**self.pending, **message}
+        self.chunks += 1
+        CHAT_SAVE_STATS.updates += 1
+
+        if (
+            self.chunks >= self.max_chunks
+            or time.monotonic() - self.last_flush >= self.interval
+        ):
+            await self.flush()
+        elif self._flush_task is None:
+            # Make sure trailing updates are written even if the stream stalls
+            self._flush_task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.interval)
+        self._flush_task = None
+        await self.flush()
+
+    async def flush(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+        if not self.pending:
+            return
+
+        message, self.pending, self.chunks = self.pending, {}, 0
+        self.last_flush = time.monotonic()
+
+        start = time.perf_counter()
+        result = None
+        try:
+            result = await run_in_chat_executor(
+                self.chat_id,
+                Chats.upsert_message_to_chat_by_id_and_message_id,
+                self.chat_id,
+                self.message_id,
+                {k: v() if callable(v) else v for k, v in message.items()},
+            )
+        except Exception as e:
+            log.exception(f"Error saving message {self.message_id}: {e}")
+
+        CHAT_SAVE_STATS.record_flush(time.perf_counter() - start, result is not None)
+
+    async def close(self):
+        await self.flush()
+        log.debug(f"chat save stats: {get_chat_save_stats()}")
@@ -0,0 +1,389 @@
+import html
+import json
+import re
+import time
+from typing import Optional
+
+# How far back from the end of the previous chunk tags are searched for, so that
+# tags split across chunks are still found without rescanning the whole block.
+TAG_LOOKBACK = 256
+
+REASONING_TAGS = [
+    "think",
+    "thinking",
+    "reason",
+    "reasoning",
+    "thought",
+    "Thought",
+]
+CODE_INTERPRETER_TAGS = ["code_interpreter"]
+
+
+def split_content_and_whitespace(content):
+    content_stripped = content.rstrip()
+    original_whitespace = (
+        content[len(content_stripped) :] if len(content) > len(content_stripped) else ""
+    )
+    return content_stripped, original_whitespace
+
+
+def is_opening_code_block(content):
+    backtick_segments = content.split("```")
+    # Even number of segments means the last backticks are opening a new block
+    return len(backtick_segments) > 1 and len(backtick_segments) % 2 == 0
+
+
+def strip_opening_code_block(content):
+    content_stripped, original_whitespace = split_content_and_whitespace(content)
+    if is_opening_code_block(content_stripped):
+        # Remove trailing backticks that would open a new block
+        return content_stripped.rstrip("`").rstrip() + original_whitespace
+    else:
+        # Keep content as is - either closing backticks or no backticks
+        return content_stripped + original_whitespace
+
+
+def format_reasoning_lines(content):
+    return [
+        (f"> {line}" if not line.startswith(">") else line)
+        for line in content.splitlines()
+    ]
+
+
+def serialize_reasoning_block(block, reasoning_display_content, raw=False):
+    reasoning_duration = block.get("duration", None)
+
+    if raw:
+        return f'\n<{block["tag"]}>{block["content"]}</{block["tag"]}>\n'
+
+    if reasoning_duration is not None:
+        return f'\n<details type="reasoning" done="true" duration="{reasoning_duration}">\n<summary>Thought for {reasoning_duration} seconds</summary>\n{reasoning_display_content}\n</details>\n'
+    else:
+        return f'\n<details type="reasoning" done="false">\n<summary>Thinking…</summary>\n{reasoning_display_content}\n</details>\n'
+
+
+def serialize_code_interpreter_block(block, raw=False):
+    attributes = block.get("attributes", {})
+    output = block.get("output", None)
+    lang = attributes.get("lang", "")
+
+    if output:
+        output = html.escape(json.dumps(output))
+
+        if raw:
+            return f'\n<code_interpreter type="code" lang="{lang}">\n{block["content"]}\n</code_interpreter>\n```output\n{output}\n```\n'
+        else:
+            return f'\n<details type="code_interpreter" done="true" output="{output}">\n<summary>Analyzed</summary>\n```{lang}\n{block["content"]}\n```\n</details>\n'
+    else:
+        if raw:
+            return f'\n<code_interpreter type="code" lang="{lang}">\n{block["content"]}\n</code_interpreter>\n'
+        else:
+            return f'\n<details type="code_interpreter" done="false">\n<summary>Analyzing...</summary>\n```{lang}\n{block["content"]}\n```\n</details>\n'
+
+
+def serialize_content_block(content, block, raw=False):
+    """
+    Appends the serialized form of `block` to the already serialized `content`.
+    """
+    if block["type"] == "text":
+        return f"{content}{block['content'].strip()}\n"
+    elif block["type"] == "tool_calls":
+        block_content = block.get("content", [])
+        results = block.get("results", [])
+
+        if results:
+
+            result_display_content = ""
+
+            for result in results:
+                tool_call_id = result.get("tool_call_id", "")
+                tool_name = ""
+
+                for tool_call in block_content:
+                    if tool_call.get("id", "") == tool_call_id:
+                        tool_name = tool_call.get("function", {}).get("name", "")
+                        break
+
+                result_display_content = f"{result_display_content}\n> {tool_name}: {result.get('content', '')}"
+
+            if not raw:
+                content = f'{content}\n<details type="tool_calls" done="true" content="{html.escape(json.dumps(block_content))}" results="{html.escape(json.dumps(results))}">\n<summary>Tool Executed</summary>\n{result_display_content}\n</details>\n'
+        else:
+            tool_calls_display_content = ""
+
+            for tool_call in block_content:
+                tool_calls_display_content = f"{tool_calls_display_content}\n> Executing {tool_call.get('function', {}).get('name', '')}"
+
+            if not raw:
+                content = f'{content}\n<details type="tool_calls" done="false" content="{html.escape(json.dumps(block_content))}">\n<summary>Tool Executing...</summary>\n{tool_calls_display_content}\n</details>\n'
+
+        return content
+    elif block["type"] == "reasoning":
+        reasoning_display_content = "\n".join(format_reasoning_lines(block["content"]))
+        return f"{content}{serialize_reasoning_block(block, reasoning_display_content, raw)}"
+    elif block["type"] == "code_interpreter":
+        return f"{strip_opening_code_block(content)}{serialize_code_interpreter_block(block, raw)}"
+    else:
+        block_content = str(block["content"]).strip()
+        return f"{content}{block['type']}: {block_content}\n"
+
+
+def serialize_content_blocks(content_blocks, raw=False):
+    content = ""
+
+    for block in content_blocks:
+        content = serialize_content_block(content, block, raw)
+
+    return content.strip()
+
+
+def extract_attributes(tag_content):
+    """Extract attributes from a tag if they exist."""
+    attributes = {}
+    if not tag_content:  # Ensure tag_content is not None
+        return attributes
+    # Match attributes in the format: key="value" (ignores single quotes for simplicity)
+    matches = re.findall(r'(\w+)\s*=\s*"([^"]+)"', tag_content)
+    for key, value in matches:
+        attributes[key] = value
+    return attributes
+
+
+class ContentBlocksStream:
+    """
+    Incremental post-processor for a streamed assistant message.
+
+    Deltas are appended with `append`, which only scans the newly appended suffix of
+    the current block for reasoning / code interpreter tags. `serialize` keeps the
+    serialized text of all finished blocks (and the finished lines of a reasoning
+    block) cached, so each chunk only costs the work of the new delta.
+
+    `content_blocks` may still be modified by the caller (e.g. tool calls, code
+    interpreter output), as long as only the last block is changed.
+    """
+
+    def __init__(
+        self,
+        content: str = "",
+        detect_reasoning: bool = True,
+        detect_code_interpreter: bool = False,
+        reasoning_tags: Optional[list[str]] = None,
+        code_interpreter_tags: Optional[list[str]] = None,
+    ):
+        self.content_blocks = [
+            {
+                "type": "text",
+                "content": content,
+            }
+        ]
+
+        self.tags = []
+        if detect_reasoning:
+            self.tags.append(("reasoning", reasoning_tags or REASONING_TAGS))
+        if detect_code_interpreter:
+            self.tags.append(
+                ("code_interpreter", code_interpreter_tags or CODE_INTERPRETER_TAGS)
+            )
+
+        self._content_parts = [content]
+
+        # Serialized (unstripped) text of content_blocks[:_prefix_count]
+        self._prefix = ""
+        self._prefix_count = 0
+        self._prefix_last = None
+        self._code_prefix = None
+
+        # Formatted finished lines of the last reasoning block
+        self._reasoning_block = None
+        self._reasoning_source = ""
+        self._reasoning_text = None
+
+    @property
+    def content(self) -> str:
+        """The raw streamed text, with processed tag sections removed."""
+        if len(self._content_parts) > 1:
+            self._content_parts = ["".join(self._content_parts)]
+        return self._content_parts[0]
+
+    def append(self, value: str) -> bool:
+        """
+        Appends a delta to the last block. Returns True when a code interpreter block
+        was closed, which means the stream should stop so the code can be executed.
+        """
+        self._content_parts.append(value)
+
+        if not self.content_blocks:
+            self.content_blocks.append(
+                {
+                    "type": "text",
+                    "content": "",
+                }
+            )
+
+        block = self.content_blocks[-1]
+        pos = max(len(block["content"]) - TAG_LOOKBACK, 0)
+        block["content"] = block["content"] + value
+
+        end = False
+        for content_type, tags in self.tags:
+            if self._handle_tags(content_type, tags, pos):
+                end = end or content_type == "code_interpreter"
+            # A new block was opened or closed, scan it from the beginning
+            if self.content_blocks[-1] is not block:
+                block = self.content_blocks[-1]
+                pos = 0
+
+        return end
+
+    def _handle_tags(self, content_type, tags, pos) -> bool:
+        if self.content_blocks[-1]["type"] == "text":
+            block = self.content_blocks[-1]
+            for tag in tags:
+                # Match start tag e.g., <tag> or <tag attr="value">
+                match = re.compile(rf"<{tag}(\s.*?)?>").search(block["content"], pos)
+                if match:
+                    attributes = extract_attributes(match.group(1) or "")
+
+                    before_tag = block["content"][: match.start()]
+                    after_tag = block["content"][match.end() :]
+
+                    block["content"] = before_tag
+                    if not block["content"]:
+                        self.content_blocks.pop()
+
+                    self.content_blocks.append(
+                        {
+                            "type": content_type,
+                            "tag": tag,
+                            "attributes": attributes,
+                            "content": after_tag,
+                            "started_at": time.time(),
+                        }
+                    )
+
+                    # The closing tag may already be part of the same chunk
+                    self._handle_end_tag(content_type, 0)
+                    return False
+
+        elif self.content_blocks[-1]["type"] == content_type:
+            return self._handle_end_tag(content_type, pos)
+
+        return False
+
+    def _handle_end_tag(self, content_type, pos) -> bool:
+        block = self.content_blocks[-1]
+        tag = block["tag"]
+
+        # Match end tag e.g., </tag>
+        end_tag_pattern = rf"</{tag}>"
+        if not re.compile(end_tag_pattern).search(block["content"], pos):
+            return False
+
+        # Strip start and end tags from the content
+        block_content = re.sub(rf"<{tag}(.*?)>", "", block["content"]).strip()
+        split_content = re.compile(end_tag_pattern, re.DOTALL).split(
+            block_content, maxsplit=1
+        )
+
+        # Content inside the tag
+        block_content = split_content[0].strip() if split_content else ""
+
+        # Leftover content (everything after `</tag>`)
+        leftover_content = split_content[1].strip() if len(split_content) > 1 else ""
+
+        if block_content:
+            block["content"] = block_content
+            block["ended_at"] = time.time()
+            block["duration"] = int(block["ended_at"] - block["started_at"])
+
+            # Reset the content_blocks by appending a new text block
+            if content_type != "code_interpreter":
+                self.content_blocks.append(
+                    {
+                        "type": "text",
+                        "content": leftover_content,
+                    }
+                )
+        else:
+            # Remove the block if content is empty
+            self.content_blocks.pop()
+            self.content_blocks.append(
+                {
+                    "type": "text",
+                    "content": leftover_content,
+                }
+            )
+
+        # Clean processed content
+        self._content_parts = [
+            re.sub(
+                rf"<{tag}(.*?)>(.|\n)*?</{tag}>",
+                "",
+                self.content,
+                flags=re.DOTALL,
+            )
+        ]
+        return True
+
+    def _update_prefix(self):
+        blocks = self.content_blocks
+        count = max(len(blocks) - 1, 0)
+
+        if self._prefix_count > count or (
+            self._prefix_count
+            and blocks[self._prefix_count - 1] is not self._prefix_last
+        ):
+            # Finished blocks were removed or replaced, start over
+            self._prefix = ""
+            self._prefix_count = 0
+            self._prefix_last = None
+            self._code_prefix = None
+
+        while self._prefix_count < count:
+            self._prefix_last = blocks[self._prefix_count]
+            self._prefix = serialize_content_block(self._prefix, self._prefix_last)
+            self._prefix_count += 1
+            self._code_prefix = None
+
+    def _format_reasoning(self, block) -> str:
+        content = block["content"]
+
+        if self._reasoning_block is not block or not content.startswith(
+            self._reasoning_source
+        ):
+            self._reasoning_block = block
+            self._reasoning_source = ""
+            self._reasoning_text = None
+
+        # Only format the lines that were finished since the previous chunk
+        start = len(self._reasoning_source)
+        end = content.rfind("\n", start) + 1
+        if end > start:
+            lines = format_reasoning_lines(content[start:end])
+            if self._reasoning_text is not None:
+                lines.insert(0, self._reasoning_text)
+            self._reasoning_text = "\n".join(lines)
+            self._reasoning_source = content[:end]
+
+        lines = format_reasoning_lines(content[len(self._reasoning_source) :])
+        if self._reasoning_text is not None:
+            lines.insert(0, self._reasoning_text)
+        return "\n".join(lines)
+
+    def serialize(self) -> str:
+        if not self.content_blocks:
+            return ""
+
+        self._update_prefix()
+
+        block = self.content_blocks[-1]
+        if block["type"] == "reasoning":
+            content = f"{self._prefix}{serialize_reasoning_block(block, self._format_reasoning(block))}"
+        elif block["type"] == "code_interpreter":
+            if self._code_prefix is None:
+                self._code_prefix = strip_opening_code_block(self._prefix)
+            content = f"{self._code_prefix}{serialize_code_interpreter_block(block)}"
+        else:
+            content = serialize_content_block(self._prefix, block)
+
+        return content.strip()
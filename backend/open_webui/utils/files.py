@@ -0,0 +1,57 @@
+from typing import Optional
+from urllib.parse import quote
+
+from fastapi import HTTPException, status
+
+
+def get_file_content_headers(
+    filename: str, content_type: Optional[str]
+) -> tuple[dict, Optional[str]]:
+    """Returns the headers and the media type to serve the content of a file with."""
+    encoded_filename = quote(filename)  # RFC5987 encoding
+    headers = {}
+
+    if content_type == "application/pdf" or filename.lower().endswith(".pdf"):
+        headers["Content-Disposition"] = f"inline; filename*=UTF-8''{encoded_filename}"
+        content_type = "application/pdf"
+    elif content_type != "text/plain":
+        headers["Content-Disposition"] = (
+            f"attachment; filename*=UTF-8''{encoded_filename}"
+        )
+    return headers, content_type
+
+
+def parse_range_header(
+    range_header: Optional[str], size: int
+) -> Optional[tuple[int, int]]:
+    """
+    Returns the first and last bytes requested by a single range `Range` header, or
+    None to send the whole file.
+    """
+    if not range_header or "," in range_header:
+        return None
+
+    unit, _, byte_range = range_header.partition("=")
+    if unit.strip() != "bytes":
+        return None
+
+    start, _, end = byte_range.strip().partition("-")
+    try:
+        if start == "":
+            # The last `end` bytes
+            start, end = max(size - int(end), 0), size - 1
+        else:
+            start = int(start)
+            if end and int(end) < start:
+                # Syntactically invalid, the header is ignored
+                return None
+            end = min(int(end), size - 1) if end else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
@@ -0,0 +1,253 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Optional
+
+import redis.asyncio
+from pydantic import BaseModel
+
+log = logging.getLogger(__name__)
+
+# Finished jobs can be polled for this long
+JOB_RESULT_TTL = 24 * 60 * 60
+# A running job that isn't renewed for this long is handed to another worker
+JOB_LEASE = 5 * 60
+# Jobs whose lease expired this many times (e.g. their file kills or hangs the worker)
+# are failed instead of being requeued
+JOB_MAX_ATTEMPTS = 3
+
+
+####################
+# Jobs
+####################
+
+
+class JobModel(BaseModel):
+    id: str
+    type: str
+    user_id: str
+    payload: dict = {}
+
+    status: str = "pending"  # pending, running, completed, failed
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    attempts: int = 0  # times the job was started
+
+    created_at: int  # timestamp in epoch
+    updated_at: int  # timestamp in epoch
+
+
+####################
+# Queues
+####################
+
+
+class LocalJobQueue:
+    """
+    In-process job queue.
+
+    Jobs only live in this process: they are lost on restart, and with several
+    workers they can only be polled from the worker that queued them. Polling jobs
+    then requires `RedisJobQueue` (INGESTION_JOB_QUEUE=redis).
+
+    Every user has their own FIFO queue, and workers take the next job from the users
+    in turn, so a bulk upload only delays the other users' jobs by one job at a time.
+    """
+
+    def __init__(self):
+        self.jobs: dict[str, JobModel] = {}
+        # user_id -> ids of their pending jobs, users in the order they are served
+        self.queues: OrderedDict[str, deque] = OrderedDict()
+        self.event = asyncio.Event()
+
+    async def submit(self, job: JobModel):
+        self._prune()
+        self.jobs[job.id] = job
+        self.queues.setdefault(job.user_id, deque()).append(job.id)
+        self.event.set()
+
+    async def claim(self) -> Optional[JobModel]:
+        if not self.queues:
+            return None
+
+        user_id, queue = next(iter(self.queues.items()))
+        job_id = queue.popleft()
+        if queue:
+            self.queues.move_to_end(user_id)
+        else:
+            del self.queues[user_id]
+        return self.jobs.get(job_id)
+
+    async def wait(self, timeout: float):
+        self.event.clear()
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def get(self, job_id: str) -> Optional[JobModel]:
+        return self.jobs.get(job_id)
+
+    async def update(self, job: JobModel):
+        self.jobs[job.id] = job
+
+    async def renew(self, job: JobModel):
+        pass
+
+    async def requeue_expired(self) -> list[JobModel]:
+        return []
+
+    def _prune(self):
+        expired_at = int(time.time()) - JOB_RESULT_TTL
+        for job_id, job in list(self.jobs.items()):
+            if job.status in ["completed", "failed"] and job.updated_at < expired_at:
+                del self.jobs[job_id]
+
+
+SUBMIT_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[1])
+if redis.call('RPUSH', KEYS[2], ARGV[2]) == 1 then
+    redis.call('RPUSH', KEYS[3], ARGV[3])
+end
+"""
+
+# Takes the next job of the user at the head of the ring, then moves the user to the
+# back of the ring (or drops them when they have no jobs left)
+CLAIM_SCRIPT = """
+local user_id = redis.call('LPOP', KEYS[1])
+if not user_id then
+    return nil
+end
+local queue = ARGV[1] .. user_id
+local job_id = redis.call('LPOP', queue)
+if redis.call('LLEN', queue) > 0 then
+    redis.call('RPUSH', KEYS[1], user_id)
+end
+if job_id then
+    redis.call('ZADD', KEYS[2], ARGV[2], job_id)
+end
+return job_id
+"""
+
+REQUEUE_SCRIPT = """
+if redis.call('ZREM', KEYS[1], ARGV[1]) == 0 then
+    return 0
+end
+if redis.call('LPUSH', KEYS[2], ARGV[1]) == 1 then
+    redis.call('RPUSH', KEYS[3], ARGV[2])
+end
+return 1
+"""
+
+
+class RedisJobQueue:
+    """
+    `LocalJobQueue` shared by all the workers through Redis.
+
+    Claimed jobs are leased for JOB_LEASE seconds and renewed while they run; jobs
+    of a worker that died are put back at the head of their user's queue.
+    """
+
+    def __init__(self, redis_url: str, prefix: str = "open-webui:jobs"):
+        self.redis = redis.asyncio.Redis.from_url(redis_url, decode_responses=True)
+        self.prefix = prefix
+        self.users_key = f"{prefix}:users"
+        self.running_key = f"{prefix}:running"
+        self.event = asyncio.Event()
+
+        self._submit = self.redis.register_script(SUBMIT_SCRIPT)
+        self._claim = self.redis.register_script(CLAIM_SCRIPT)
+        self._requeue = self.redis.register_script(REQUEUE_SCRIPT)
+
+    def _job_key(self, job_id: str) -> str:
+        return f"{self.prefix}:job:{job_id}"
+
+    def _queue_key(self, user_id: str = "") -> str:
+        return f"{self.prefix}:queue:{user_id}"
+
+    async def submit(self, job: JobModel):
+        await self._submit(
+            keys=[
+                self._job_key(job.id),
+                self._queue_key(job.user_id),
+                self.users_key,
+            ],
+            args=[job.model_dump_json(), job.id, job.user_id],
+        )
+        self.event.set()
+
+    async def claim(self) -> Optional[JobModel]:
+        job_id = await self._claim(
+            keys=[self.users_key, self.running_key],
+            args=[self._queue_key(), time.time() + JOB_LEASE],
+        )
+        if job_id is None:
+            return None
+
+        job = await self.get(job_id)
+        if job is None:
+            await self.redis.zrem(self.running_key, job_id)
+        return job
+
+    async def wait(self, timeout: float):
+        self.event.clear()
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def get(self, job_id: str) -> Optional[JobModel]:
+        data = await self.redis.get(self._job_key(job_id))
+        return JobModel.model_validate_json(data) if data else None
+
+    async def update(self, job: JobModel):
+        finished = job.status in ["completed", "failed"]
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(
+                self._job_key(job.id),
+                job.model_dump_json(),
+                ex=JOB_RESULT_TTL if finished else None,
+            )
+            if finished:
+                pipe.zrem(self.running_key, job.id)
+            await pipe.execute()
+
+    async def renew(self, job: JobModel):
+        await self.redis.zadd(
+            self.running_key, {job.id: time.time() + JOB_LEASE}, xx=True
+        )
+
+    async def requeue_expired(self) -> list[JobModel]:
+        """
+        Requeues the jobs whose lease expired, and returns those that can't be retried
+        any more for the caller to fail.
+        """
+        exhausted = []
+        for job_id in await self.redis.zrangebyscore(
+            self.running_key, "-inf", time.time()
+        ):
+            job = await self.get(job_id)
+            if job is None:
+                await self.redis.zrem(self.running_key, job_id)
+                continue
+
+            if job.attempts >= JOB_MAX_ATTEMPTS:
+                # Only the worker removing it from the running jobs fails it
+                if await self.redis.zrem(self.running_key, job_id):
+                    exhausted.append(job)
+                continue
+
+            if await self._requeue(
+                keys=[
+                    self.running_key,
+                    self._queue_key(job.user_id),
+                    self.users_key,
+                ],
+                args=[job.id, job.user_id],
+            ):
+                log.warning(f"Requeued job {job.id}, its worker stopped renewing it")
+                job.status = "pending"
+                job.updated_at = int(time.time())
+                await self.redis.set(self._job_key(job.id), job.model_dump_json())
+        return exhausted
@@ -0,0 +1,158 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Callable, Optional
+
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+
+from open_webui.models.users import Users
+from open_webui.socket.main import emit_to_user
+from open_webui.env import (
+    INGESTION_JOB_CONCURRENCY,
+    INGESTION_JOB_QUEUE,
+    INGESTION_JOB_REDIS_URL,
+    SRC_LOG_LEVELS,
+    UVICORN_WORKERS,
+)
+from open_webui.utils.job_queue import (
+    JOB_LEASE,
+    JobModel,
+    LocalJobQueue,
+    RedisJobQueue,
+)
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["RAG"])
+
+# Idle workers check the (shared) queue this often
+JOB_POLL_INTERVAL = 1
+
+
+####################
+# Jobs
+####################
+
+
+# job type -> handler(request, user, **payload)
+JOB_HANDLERS: dict[str, Callable] = {}
+
+
+def register_job(job_type: str):
+    """Registers a (blocking) function as the handler of the jobs of `job_type`."""
+
+    def decorator(func: Callable) -> Callable:
+        JOB_HANDLERS[job_type] = func
+        return func
+
+    return decorator
+
+
+if INGESTION_JOB_QUEUE == "redis":
+    JOB_QUEUE = RedisJobQueue(INGESTION_JOB_REDIS_URL)
+else:
+    if UVICORN_WORKERS > 1:
+        log.warning(
+            f"INGESTION_JOB_QUEUE is 'local' with {UVICORN_WORKERS} workers: every "
+            "worker has its own queue, so a job can only be polled from the worker "
+            "that queued it (/retrieval/jobs/{id} returns 404 on the others) and "
+            "queued jobs are lost on restart. Set INGESTION_JOB_QUEUE=redis."
+        )
+    JOB_QUEUE = LocalJobQueue()
+
+
+####################
+# Workers
+####################
+
+
+async def submit_job(job_type: str, user_id: str, payload: dict) -> JobModel:
+    now = int(time.time())
+    job = JobModel(
+        id=str(uuid.uuid4()),
+        type=job_type,
+        user_id=user_id,
+        payload=payload,
+        created_at=now,
+        updated_at=now,
+    )
+    await JOB_QUEUE.submit(job)
+    return job
+
+
+async def get_job(job_id: str) -> Optional[JobModel]:
+    return await JOB_QUEUE.get(job_id)
+
+
+async def set_job_status(job: JobModel, status: str, **kwargs):
+    job.status = status
+    job.updated_at = int(time.time())
+    for key, value in kwargs.items():
+        setattr(job, key, value)
+    await JOB_QUEUE.update(job)
+
+    await emit_to_user(
+        job.user_id,
+        "ingestion-events",
+        {
+            "job_id": job.id,
+            "type": job.type,
+            "status": job.status,
+            "error": job.error,
+        },
+    )
+
+
+async def renew_job_periodically(job: JobModel):
+    while True:
+        await asyncio.sleep(JOB_LEASE / 3)
+        await JOB_QUEUE.renew(job)
+
+
+async def run_job(app, job: JobModel):
+    handler = JOB_HANDLERS.get(job.type)
+    user = Users.get_user_by_id(job.user_id)
+    if handler is None or user is None:
+        await set_job_status(job, "failed", error="Invalid job")
+        return
+
+    await set_job_status(job, "running", attempts=job.attempts + 1)
+    renew_task = asyncio.create_task(renew_job_periodically(job))
+    try:
+        # Handlers are the (blocking) endpoint functions, called with a bare request
+        request = Request({"type": "http", "app": app, "headers": []})
+        result = await run_in_threadpool(handler, request, user, **job.payload)
+        await set_job_status(job, "completed", result=result)
+    except Exception as e:
+        error = str(e.detail if isinstance(e, HTTPException) else e)
+        log.exception(f"Job {job.id} ({job.type}) failed: {error}")
+        await set_job_status(job, "failed", error=error)
+    finally:
+        renew_task.cancel()
+
+
+async def job_worker(app):
+    while True:
+        try:
+            for expired_job in await JOB_QUEUE.requeue_expired():
+                error = f"Stopped without finishing {expired_job.attempts} times"
+                log.error(f"Job {expired_job.id} ({expired_job.type}) failed: {error}")
+                await set_job_status(expired_job, "failed", error=error)
+            job = await JOB_QUEUE.claim()
+            if job is None:
+                await JOB_QUEUE.wait(JOB_POLL_INTERVAL)
+                continue
+
+            await run_job(app, job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.exception(f"Job worker error: {e}")
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+
+def start_job_workers(app) -> list[asyncio.Task]:
+    return [
+        asyncio.create_task(job_worker(app)) for _ in range(INGESTION_JOB_CONCURRENCY)
+    ]
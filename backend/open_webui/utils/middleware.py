@@ -76,6 +76,11 @@ from open_webui.utils.filter import (
     process_filter_functions,
 )
 from open_webui.utils.code_interpreter import execute_code_jupyter
+from open_webui.utils.chat_save import MessageWriteBuffer, run_in_chat_executor
+from open_webui.utils.content_blocks import (
+    ContentBlocksStream,
+    serialize_content_blocks,
+)
 
 from open_webui.tasks import create_task
 
@@ -566,6 +571,10 @@ async def chat_completion_files_handler(
                         r=request.app.state.config.RELEVANCE_THRESHOLD,
                         hybrid_search=request.app.state.config.ENABLE_RAG_HYBRID_SEARCH,
                         full_context=request.app.state.config.RAG_FULL_CONTEXT,
+                        embedding_config={
+                            "engine": request.app.state.config.RAG_EMBEDDING_ENGINE,
+                            "model": request.app.state.config.RAG_EMBEDDING_MODEL,
+                        },
                     ),
                 )
         except Exception as e:
@@ -857,7 +866,9 @@ async def process_chat_response(
     request, response, form_data, user, events, metadata, tasks
 ):
     async def background_tasks_handler():
-        message_map = Chats.get_messages_by_chat_id(metadata["chat_id"])
+        message_map = await run_in_chat_executor(
+            metadata["chat_id"], Chats.get_messages_by_chat_id, metadata["chat_id"]
+        )
         message = message_map.get(metadata["message_id"]) if message_map else None
 
         if message:
@@ -900,7 +911,12 @@ async def process_chat_response(
                             if not title:
                                 title = messages[0].get("content", "New Chat")
 
-                            Chats.update_chat_title_by_id(metadata["chat_id"], title)
+                            await run_in_chat_executor(
+                                metadata["chat_id"],
+                                Chats.update_chat_title_by_id,
+                                metadata["chat_id"],
+                                title,
+                            )
 
                             await event_emitter(
                                 {
@@ -911,7 +927,12 @@ async def process_chat_response(
                     elif len(messages) == 2:
                         title = messages[0].get("content", "New Chat")
 
-                        Chats.update_chat_title_by_id(metadata["chat_id"], title)
+                        await run_in_chat_executor(
+                            metadata["chat_id"],
+                            Chats.update_chat_title_by_id,
+                            metadata["chat_id"],
+                            title,
+                        )
 
                         await event_emitter(
                             {
@@ -947,8 +968,12 @@ async def process_chat_response(
 
                         try:
                             tags = json.loads(tags_string).get("tags", [])
-                            Chats.update_chat_tags_by_id(
-                                metadata["chat_id"], tags, user
+                            await run_in_chat_executor(
+                                metadata["chat_id"],
+                                Chats.update_chat_tags_by_id,
+                                metadata["chat_id"],
+                                tags,
+                                user,
                             )
 
                             await event_emitter(
@@ -977,7 +1002,9 @@ async def process_chat_response(
     if not isinstance(response, StreamingResponse):
         if event_emitter:
             if "selected_model_id" in response:
-                Chats.upsert_message_to_chat_by_id_and_message_id(
+                await run_in_chat_executor(
+                    metadata["chat_id"],
+                    Chats.upsert_message_to_chat_by_id_and_message_id,
                     metadata["chat_id"],
                     metadata["message_id"],
                     {
@@ -997,7 +1024,11 @@ async def process_chat_response(
                         }
                     )
 
-                    title = Chats.get_chat_title_by_id(metadata["chat_id"])
+                    title = await run_in_chat_executor(
+                        metadata["chat_id"],
+                        Chats.get_chat_title_by_id,
+                        metadata["chat_id"],
+                    )
 
                     await event_emitter(
                         {
@@ -1011,7 +1042,9 @@ async def process_chat_response(
                     )
 
                     # Save message in the database
-                    Chats.upsert_message_to_chat_by_id_and_message_id(
+                    await run_in_chat_executor(
+                        metadata["chat_id"],
+                        Chats.upsert_message_to_chat_by_id_and_message_id,
                         metadata["chat_id"],
                         metadata["message_id"],
                         {
@@ -1020,7 +1053,7 @@ async def process_chat_response(
                     )
 
                     # Send a webhook notification if the user is not active
-                    if get_active_status_by_user_id(user.id) is None:
+                    if await get_active_status_by_user_id(user.id) is None:
                         webhook_url = Users.get_user_webhook_url_by_id(user.id)
                         if webhook_url:
                             post_webhook(
@@ -1053,7 +1086,9 @@ async def process_chat_response(
         task_id = str(uuid4())  # Create a unique task ID.
         model_id = form_data.get("model", "")
 
-        Chats.upsert_message_to_chat_by_id_and_message_id(
+        await run_in_chat_executor(
+            metadata["chat_id"],
+            Chats.upsert_message_to_chat_by_id_and_message_id,
             metadata["chat_id"],
             metadata["message_id"],
             {
@@ -1061,118 +1096,8 @@ async def process_chat_response(
             },
         )
 
-        def split_content_and_whitespace(content):
-            content_stripped = content.rstrip()
-            original_whitespace = (
-                content[len(content_stripped) :]
-                if len(content) > len(content_stripped)
-                else ""
-            )
-            return content_stripped, original_whitespace
-
-        def is_opening_code_block(content):
-            backtick_segments = content.split("```")
-            # Even number of segments means the last backticks are opening a new block
-            return len(backtick_segments) > 1 and len(backtick_segments) % 2 == 0
-
         # Handle as a background task
         async def post_response_handler(response, events):
-            def serialize_content_blocks(content_blocks, raw=False):
-                content = ""
-
-                for block in content_blocks:
-                    if block["type"] == "text":
-                        content = f"{content}{block['content'].strip()}\n"
-                    elif block["type"] == "tool_calls":
-                        attributes = block.get("attributes", {})
-
-                        block_content = block.get("content", [])
-                        results = block.get("results", [])
-
-                        if results:
-
-                            result_display_content = ""
-
-                            for result in results:
-                                tool_call_id = result.get("tool_call_id", "")
-                                tool_name = ""
-
-                                for tool_call in block_content:
-                                    if tool_call.get("id", "") == tool_call_id:
-                                        tool_name = tool_call.get("function", {}).get(
-                                            "name", ""
-                                        )
-                                        break
-
-                                result_display_content = f"{result_display_content}\n> {tool_name}: {result.get('content', '')}"
-
-                            if not raw:
-                                content = f'{content}\n<details type="tool_calls" done="true" content="{html.escape(json.dumps(block_content))}" results="{html.escape(json.dumps(results))}">\n<summary>Tool Executed</summary>\n{result_display_content}\n</details>\n'
-                        else:
-                            tool_calls_display_content = ""
-
-                            for tool_call in block_content:
-                                tool_calls_display_content = f"{tool_calls_display_content}\n> Executing {tool_call.get('function', {}).get('name', '')}"
-
-                            if not raw:
-                                content = f'{content}\n<details type="tool_calls" done="false" content="{html.escape(json.dumps(block_content))}">\n<summary>Tool Executing...</summary>\n{tool_calls_display_content}\n</details>\n'
-
-                    elif block["type"] == "reasoning":
-                        reasoning_display_content = "\n".join(
-                            (f"> {line}" if not line.startswith(">") else line)
-                            for line in block["content"].splitlines()
-                        )
-
-                        reasoning_duration = block.get("duration", None)
-
-                        if reasoning_duration is not None:
-                            if raw:
-                                content = f'{content}\n<{block["tag"]}>{block["content"]}</{block["tag"]}>\n'
-                            else:
-                                content = f'{content}\n<details type="reasoning" done="true" duration="{reasoning_duration}">\n<summary>Thought for {reasoning_duration} seconds</summary>\n{reasoning_display_content}\n</details>\n'
-                        else:
-                            if raw:
-                                content = f'{content}\n<{block["tag"]}>{block["content"]}</{block["tag"]}>\n'
-                            else:
-                                content = f'{content}\n<details type="reasoning" done="false">\n<summary>Thinking…</summary>\n{reasoning_display_content}\n</details>\n'
-
-                    elif block["type"] == "code_interpreter":
-                        attributes = block.get("attributes", {})
-                        output = block.get("output", None)
-                        lang = attributes.get("lang", "")
-
-                        content_stripped, original_whitespace = (
-                            split_content_and_whitespace(content)
-                        )
-                        if is_opening_code_block(content_stripped):
-                            # Remove trailing backticks that would open a new block
-                            content = (
-                                content_stripped.rstrip("`").rstrip()
-                                + original_whitespace
-                            )
-                        else:
-                            # Keep content as is - either closing backticks or no backticks
-                            content = content_stripped + original_whitespace
-
-                        if output:
-                            output = html.escape(json.dumps(output))
-
-                            if raw:
-                                content = f'{content}\n<code_interpreter type="code" lang="{lang}">\n{block["content"]}\n</code_interpreter>\n```output\n{output}\n```\n'
-                            else:
-                                content = f'{content}\n<details type="code_interpreter" done="true" output="{output}">\n<summary>Analyzed</summary>\n```{lang}\n{block["content"]}\n```\n</details>\n'
-                        else:
-                            if raw:
-                                content = f'{content}\n<code_interpreter type="code" lang="{lang}">\n{block["content"]}\n</code_interpreter>\n'
-                            else:
-                                content = f'{content}\n<details type="code_interpreter" done="false">\n<summary>Analyzing...</summary>\n```{lang}\n{block["content"]}\n```\n</details>\n'
-
-                    else:
-                        block_content = str(block["content"]).strip()
-                        content = f"{content}{block['type']}: {block_content}\n"
-
-                return content.strip()
-
             def convert_content_blocks_to_messages(content_blocks):
                 messages = []
 
@@ -1213,153 +1138,11 @@ async def process_chat_response(
 
                 return messages
 
-            def tag_content_handler(content_type, tags, content, content_blocks):
-                end_flag = False
-
-                def extract_attributes(tag_content):
-                    """Extract attributes from a tag if they exist."""
-                    attributes = {}
-                    if not tag_content:  # Ensure tag_content is not None
-                        return attributes
-                    # Match attributes in the format: key="value" (ignores single quotes for simplicity)
-                    matches = re.findall(r'(\w+)\s*=\s*"([^"]+)"', tag_content)
-                    for key, value in matches:
-                        attributes[key] = value
-                    return attributes
-
-                if content_blocks[-1]["type"] == "text":
-                    for tag in tags:
-                        # Match start tag e.g., <tag> or <tag attr="value">
-                        start_tag_pattern = rf"<{tag}(\s.*?)?>"
-                        match = re.search(start_tag_pattern, content)
-                        if match:
-                            attr_content = (
-                                match.group(1) if match.group(1) else ""
-                            )  # Ensure it's not None
-                            attributes = extract_attributes(
-                                attr_content
-                            )  # Extract attributes safely
-
-                            # Capture everything before and after the matched tag
-                            before_tag = content[
-                                : match.start()
-                            ]  # Content before opening tag
-                            after_tag = content[
-                                match.end() :
-                            ]  # Content after opening tag
-
-                            # Remove the start tag and after from the currently handling text block
-                            content_blocks[-1]["content"] = content_blocks[-1][
-                                "content"
-                            ].replace(match.group(0) + after_tag, "")
-
-                            if before_tag:
-                                content_blocks[-1]["content"] = before_tag
-
-                            if not content_blocks[-1]["content"]:
-                                content_blocks.pop()
-
-                            # Append the new block
-                            content_blocks.append(
-                                {
-                                    "type": content_type,
-                                    "tag": tag,
-                                    "attributes": attributes,
-                                    "content": "",
-                                    "started_at": time.time(),
-                                }
-                            )
-
-                            if after_tag:
-                                content_blocks[-1]["content"] = after_tag
-
-                            break
-                elif content_blocks[-1]["type"] == content_type:
-                    tag = content_blocks[-1]["tag"]
-                    # Match end tag e.g., </tag>
-                    end_tag_pattern = rf"</{tag}>"
-
-                    # Check if the content has the end tag
-                    if re.search(end_tag_pattern, content):
-                        end_flag = True
-
-                        block_content = content_blocks[-1]["content"]
-                        # Strip start and end tags from the content
-                        start_tag_pattern = rf"<{tag}(.*?)>"
-                        block_content = re.sub(
-                            start_tag_pattern, "", block_content
-                        ).strip()
-
-                        end_tag_regex = re.compile(end_tag_pattern, re.DOTALL)
-                        split_content = end_tag_regex.split(block_content, maxsplit=1)
-
-                        # Content inside the tag
-                        block_content = (
-                            split_content[0].strip() if split_content else ""
-                        )
-
-                        # Leftover content (everything after `</tag>`)
-                        leftover_content = (
-                            split_content[1].strip() if len(split_content) > 1 else ""
-                        )
-
-                        if block_content:
-                            content_blocks[-1]["content"] = block_content
-                            content_blocks[-1]["ended_at"] = time.time()
-                            content_blocks[-1]["duration"] = int(
-                                content_blocks[-1]["ended_at"]
-                                - content_blocks[-1]["started_at"]
-                            )
-
-                            # Reset the content_blocks by appending a new text block
-                            if content_type != "code_interpreter":
-                                if leftover_content:
-
-                                    content_blocks.append(
-                                        {
-                                            "type": "text",
-                                            "content": leftover_content,
-                                        }
-                                    )
-                                else:
-                                    content_blocks.append(
-                                        {
-                                            "type": "text",
-                                            "content": "",
-                                        }
-                                    )
-
-                        else:
-                            # Remove the block if content is empty
-                            content_blocks.pop()
-
-                            if leftover_content:
-                                content_blocks.append(
-                                    {
-                                        "type": "text",
-                                        "content": leftover_content,
-                                    }
-                                )
-                            else:
-                                content_blocks.append(
-                                    {
-                                        "type": "text",
-                                        "content": "",
-                                    }
-                                )
-
-                        # Clean processed content
-                        content = re.sub(
-                            rf"<{tag}(.*?)>(.|\n)*?</{tag}>",
-                            "",
-                            content,
-                            flags=re.DOTALL,
-                        )
-
-                return content, content_blocks, end_flag
-
-            message = Chats.get_message_by_id_and_message_id(
-                metadata["chat_id"], metadata["message_id"]
+            message = await run_in_chat_executor(
+                metadata["chat_id"],
+                Chats.get_message_by_id_and_message_id,
+                metadata["chat_id"],
+                metadata["message_id"],
             )
 
             tool_calls = []
@@ -1379,28 +1162,24 @@ async def process_chat_response(
                 else last_assistant_message if last_assistant_message else ""
             )
 
-            content_blocks = [
-                {
-                    "type": "text",
-                    "content": content,
-                }
-            ]
-
             # We might want to disable this by default
             DETECT_REASONING = True
             DETECT_CODE_INTERPRETER = metadata.get("features", {}).get(
                 "code_interpreter", False
             )
 
-            reasoning_tags = [
-                "think",
-                "thinking",
-                "reason",
-                "reasoning",
-                "thought",
-                "Thought",
-            ]
-            code_interpreter_tags = ["code_interpreter"]
+            content_stream = ContentBlocksStream(
+                content,
+                detect_reasoning=DETECT_REASONING,
+                detect_code_interpreter=DETECT_CODE_INTERPRETER,
+            )
+            content_blocks = content_stream.content_blocks
+
+            chat_save_buffer = (
+                MessageWriteBuffer(metadata["chat_id"], metadata["message_id"])
+                if ENABLE_REALTIME_CHAT_SAVE
+                else None
+            )
 
             try:
                 for event in events:
@@ -1412,7 +1191,9 @@ async def process_chat_response(
                     )
 
                     # Save message in the database
-                    Chats.upsert_message_to_chat_by_id_and_message_id(
+                    await run_in_chat_executor(
+                        metadata["chat_id"],
+                        Chats.upsert_message_to_chat_by_id_and_message_id,
                         metadata["chat_id"],
                         metadata["message_id"],
                         {
@@ -1421,9 +1202,6 @@ async def process_chat_response(
                     )
 
                 async def stream_body_handler(response):
-                    nonlocal content
-                    nonlocal content_blocks
-
                     response_tool_calls = []
 
                     async for line in response.body_iterator:
@@ -1446,7 +1224,9 @@ async def process_chat_response(
 
                             if "selected_model_id" in data:
                                 model_id = data["selected_model_id"]
-                                Chats.upsert_message_to_chat_by_id_and_message_id(
+                                await run_in_chat_executor(
+                                    metadata["chat_id"],
+                                    Chats.upsert_message_to_chat_by_id_and_message_id,
                                     metadata["chat_id"],
                                     metadata["message_id"],
                                     {
@@ -1496,59 +1276,19 @@ async def process_chat_response(
                                 value = delta.get("content")
 
                                 if value:
-                                    content = f"{content}{value}"
+                                    if content_stream.append(value):
+                                        break
 
-                                    if not content_blocks:
-                                        content_blocks.append(
+                                    if chat_save_buffer:
+                                        # Save message in the database (write-behind)
+                                        await chat_save_buffer.update(
                                             {
-                                                "type": "text",
-                                                "content": "",
+                                                "content": content_stream.serialize,
                                             }
                                         )
-
-                                    content_blocks[-1]["content"] = (
-                                        content_blocks[-1]["content"] + value
-                                    )
-
-                                    if DETECT_REASONING:
-                                        content, content_blocks, _ = (
-                                            tag_content_handler(
-                                                "reasoning",
-                                                reasoning_tags,
-                                                content,
-                                                content_blocks,
-                                            )
-                                        )
-
-                                    if DETECT_CODE_INTERPRETER:
-                                        content, content_blocks, end = (
-                                            tag_content_handler(
-                                                "code_interpreter",
-                                                code_interpreter_tags,
-                                                content,
-                                                content_blocks,
-                                            )
-                                        )
-
-                                        if end:
-                                            break
-
-                                    if ENABLE_REALTIME_CHAT_SAVE:
-                                        # Save message in the database
-                                        Chats.upsert_message_to_chat_by_id_and_message_id(
-                                            metadata["chat_id"],
-                                            metadata["message_id"],
-                                            {
-                                                "content": serialize_content_blocks(
-                                                    content_blocks
-                                                ),
-                                            },
-                                        )
                                     else:
                                         data = {
-                                            "content": serialize_content_blocks(
-                                                content_blocks
-                                            ),
+                                            "content": content_stream.serialize(),
                                         }
 
                             await event_emitter(
@@ -1610,7 +1350,7 @@ async def process_chat_response(
                         {
                             "type": "chat:completion",
                             "data": {
-                                "content": serialize_content_blocks(content_blocks),
+                                "content": content_stream.serialize(),
                             },
                         }
                     )
@@ -1673,7 +1413,7 @@ async def process_chat_response(
                         {
                             "type": "chat:completion",
                             "data": {
-                                "content": serialize_content_blocks(content_blocks),
+                                "content": content_stream.serialize(),
                             },
                         }
                     )
@@ -1713,7 +1453,7 @@ async def process_chat_response(
                             {
                                 "type": "chat:completion",
                                 "data": {
-                                    "content": serialize_content_blocks(content_blocks),
+                                    "content": content_stream.serialize(),
                                 },
                             }
                         )
@@ -1850,12 +1590,12 @@ async def process_chat_response(
                             {
                                 "type": "chat:completion",
                                 "data": {
-                                    "content": serialize_content_blocks(content_blocks),
+                                    "content": content_stream.serialize(),
                                 },
                             }
                         )
 
-                        print(content_blocks, serialize_content_blocks(content_blocks))
+                        print(content_blocks, content_stream.serialize())
 
                         try:
                             res = await generate_chat_completion(
@@ -1884,34 +1624,45 @@ async def process_chat_response(
                             log.debug(e)
                             break
 
-                title = Chats.get_chat_title_by_id(metadata["chat_id"])
+                title = await run_in_chat_executor(
+                    metadata["chat_id"], Chats.get_chat_title_by_id, metadata["chat_id"]
+                )
                 data = {
                     "done": True,
-                    "content": serialize_content_blocks(content_blocks),
+                    "content": content_stream.serialize(),
                     "title": title,
                 }
 
-                if not ENABLE_REALTIME_CHAT_SAVE:
+                if chat_save_buffer:
+                    await chat_save_buffer.update(
+                        {
+                            "content": content_stream.serialize(),
+                        }
+                    )
+                    await chat_save_buffer.close()
+                else:
                     # Save message in the database
-                    Chats.upsert_message_to_chat_by_id_and_message_id(
+                    await run_in_chat_executor(
+                        metadata["chat_id"],
+                        Chats.upsert_message_to_chat_by_id_and_message_id,
                         metadata["chat_id"],
                         metadata["message_id"],
                         {
-                            "content": serialize_content_blocks(content_blocks),
+                            "content": content_stream.serialize(),
                         },
                     )
 
                 # Send a webhook notification if the user is not active
-                if get_active_status_by_user_id(user.id) is None:
+                if await get_active_status_by_user_id(user.id) is None:
                     webhook_url = Users.get_user_webhook_url_by_id(user.id)
                     if webhook_url:
                         post_webhook(
                             request.app.state.WEBUI_NAME,
                             webhook_url,
-                            f"{title} - {request.app.state.config.WEBUI_URL}/c/{metadata['chat_id']}\n\n{content}",
+                            f"{title} - {request.app.state.config.WEBUI_URL}/c/{metadata['chat_id']}\n\n{content_stream.content}",
                             {
                                 "action": "chat",
-                                "message": content,
+                                "message": content_stream.content,
                                 "title": title,
                                 "url": f"{request.app.state.config.WEBUI_URL}/c/{metadata['chat_id']}",
                             },
@@ -1929,15 +1680,27 @@ async def process_chat_response(
                 print("Task was cancelled!")
                 await event_emitter({"type": "task-cancelled"})
 
-                if not ENABLE_REALTIME_CHAT_SAVE:
+                if chat_save_buffer:
+                    await chat_save_buffer.update(
+                        {
+                            "content": content_stream.serialize(),
+                        }
+                    )
+                else:
                     # Save message in the database
-                    Chats.upsert_message_to_chat_by_id_and_message_id(
+                    await run_in_chat_executor(
+                        metadata["chat_id"],
+                        Chats.upsert_message_to_chat_by_id_and_message_id,
                         metadata["chat_id"],
                         metadata["message_id"],
                         {
-                            "content": serialize_content_blocks(content_blocks),
+                            "content": content_stream.serialize(),
                         },
                     )
+            finally:
+                # Flush whatever is still buffered on completion, cancel or error
+                if chat_save_buffer:
+                    await chat_save_buffer.close()
 
             if response.background is not None:
                 await response.background()
@@ -0,0 +1,248 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import aiofiles
+from fastapi.concurrency import run_in_threadpool
+
+from open_webui.config import AUDIO_TTS_CACHE_MAX_SIZE, CACHE_DIR
+from open_webui.env import SRC_LOG_LEVELS
+
+log = logging.getLogger(__name__)
+log.setLevel(SRC_LOG_LEVELS["AUDIO"])
+
+SPEECH_CACHE_DIR = Path(CACHE_DIR).joinpath("./audio/speech/")
+SPEECH_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+# Fraction of the max size the cache is brought back to when it's exceeded, so
+# that every new clip doesn't trigger an eviction
+EVICTION_TARGET = 0.9
+
+# Age in seconds after which an incomplete clip can't still be being written
+STALE_TMP_FILE_AGE = 60 * 60
+
+
+class SpeechCache:
+    """
+    On-disk cache of synthesized speech, bounded by size.
+
+    Clips are keyed by what determines the audio (engine, model, voice, text and
+    output options), not by the raw request body. A SQLite index next to them keeps
+    their size and last access, so eviction and stats don't scan the directory.
+    """
+
+    def __init__(self, cache_dir: Path, max_size: int):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.index_path = cache_dir.joinpath("index.db")
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._init_index()
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def _init_index(self):
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS speech (
+                    key TEXT PRIMARY KEY,
+                    engine TEXT,
+                    model TEXT,
+                    voice TEXT,
+                    content_type TEXT,
+                    size INTEGER,
+                    hits INTEGER DEFAULT 0,
+                    created_at INTEGER,
+                    last_accessed REAL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS speech_last_accessed ON speech (last_accessed)"
+            )
+            indexed = {row[0] for row in conn.execute("SELECT key FROM speech")}
+
+            # Clips cached before the index existed are indexed by their mtime, so
+            # they are the first to be evicted. Their request bodies aren't used.
+            for path in self.cache_dir.glob("*.mp3"):
+                if path.stem not in indexed:
+                    stat = path.stat()
+                    conn.execute(
+                        "INSERT OR IGNORE INTO speech (key, content_type, size, created_at, last_accessed) VALUES (?, ?, ?, ?, ?)",
+                        (
+                            path.stem,
+                            "audio/mpeg",
+                            stat.st_size,
+                            int(stat.st_mtime),
+                            stat.st_mtime,
+                        ),
+                    )
+            for path in self.cache_dir.glob("*.json"):
+                path.unlink(missing_ok=True)
+
+        # Leftovers of clips that were being written when a worker stopped
+        for path in self.cache_dir.glob("*.tmp"):
+            if path.stat().st_mtime < time.time() - STALE_TMP_FILE_AGE:
+                path.unlink(missing_ok=True)
+
+    def get_key(self, engine: str, model: str, voice: str, text: str, **options) -> str:
+        """Returns the key of a clip, ignoring whitespace differences in its text."""
+        return hashlib.sha256(
+            json.dumps(
+                [engine, model, voice, " ".join(text.split()), sorted(options.items())]
+            ).encode("utf-8")
+        ).hexdigest()
+
+    def get_file_path(self, key: str) -> Path:
+        return self.cache_dir.joinpath(f"{key}.mp3")
+
+    def get_file(self, key: str) -> Optional[tuple[Path, str]]:
+        """Returns the path and content type of a cached clip, if there is one."""
+        file_path = self.get_file_path(key)
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT content_type FROM speech WHERE key = ?", (key,)
+            ).fetchone()
+            if row and file_path.is_file():
+                conn.execute(
+                    "UPDATE speech SET hits = hits + 1, last_accessed = ? WHERE key = ?",
+                    (time.time(), key),
+                )
+                with self._lock:
+                    self.hits += 1
+                return file_path, row[0]
+
+            if row:
+                conn.execute("DELETE FROM speech WHERE key = ?", (key,))
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def add_file(
+        self,
+        key: str,
+        content_type: str,
+        engine: str = "",
+        model: str = "",
+        voice: str = "",
+    ):
+        """Indexes a clip written to `get_file_path(key)`, then enforces the max size."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO speech (key, engine, model, voice, content_type, size, hits, created_at, last_accessed) VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                (
+                    key,
+                    engine,
+                    model,
+                    voice,
+                    content_type,
+                    self.get_file_path(key).stat().st_size,
+                    int(now),
+                    now,
+                ),
+            )
+        self.evict(keep=key)
+
+    def evict(self, keep: Optional[str] = None):
+        """Deletes the least recently played clips once the cache exceeds its max size."""
+        with self._connect() as conn:
+            total_size = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM speech"
+            ).fetchone()[0]
+            if total_size <= self.max_size:
+                return
+
+            target_size = self.max_size * EVICTION_TARGET
+            rows = conn.execute(
+                "SELECT key, size FROM speech ORDER BY last_accessed"
+            ).fetchall()
+            for key, size in rows:
+                if total_size <= target_size:
+                    break
+                if key == keep:
+                    continue
+
+                self.get_file_path(key).unlink(missing_ok=True)
+                conn.execute("DELETE FROM speech WHERE key = ?", (key,))
+                total_size -= size or 0
+                with self._lock:
+                    self.evictions += 1
+
+    async def stream_to_file(
+        self,
+        key: str,
+        chunks: AsyncIterator[bytes],
+        content_type: str,
+        **meta,
+    ) -> AsyncIterator[bytes]:
+        """
+        Yields `chunks` while writing them to the cache, so a clip can be played
+        while it is still being synthesized. It is only cached once complete.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        completed = False
+        try:
+            async with aiofiles.open(tmp_path, "wb") as f:
+                async for chunk in chunks:
+                    await f.write(chunk)
+                    yield chunk
+            completed = True
+        finally:
+            if completed:
+                os.replace(tmp_path, self.get_file_path(key))
+                try:
+                    await run_in_threadpool(self.add_file, key, content_type, **meta)
+                except Exception as e:
+                    log.warning(f"Failed to index speech {key}: {e}")
+            else:
+                # The client went away or the TTS engine failed mid-response
+                os.remove(tmp_path)
+
+    def get_stats(self) -> dict:
+        with self._connect() as conn:
+            count, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM speech"
+            ).fetchone()
+            engines = dict(
+                conn.execute(
+                    "SELECT COALESCE(engine, ''), COUNT(*) FROM speech GROUP BY engine"
+                ).fetchall()
+            )
+
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "count": count,
+            "size": size,
+            "max_size": self.max_size,
+            "engines": engines,
+        }
+
+
+SPEECH_CACHE = SpeechCache(SPEECH_CACHE_DIR, AUDIO_TTS_CACHE_MAX_SIZE * 1024 * 1024)